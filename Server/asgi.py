@@ -13,4 +13,6 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Server.settings')
 
+# Strumień zdarzeń /api/events/ (SSE) trzyma połączenie otwarte - uruchamiaj przez serwer ASGI,
+# np. uvicorn Server.asgi:application (pod WSGI widok oddaje tylko zaległe zdarzenia i kończy odpowiedź)
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,13 +56,18 @@ INTERNAL_IPS = [
 ]
 
 MIDDLEWARE = [
+    'fleet_core.log.RequestIdMiddleware', # <-- X-Request-ID (korelacja logów)
     'django.middleware.security.SecurityMiddleware',
+    'fleet_core.compression.CompressionMiddleware', # <-- br/gzip wg Accept-Encoding (też odpowiedzi strumieniowe)
+    'fleet_core.middleware.MetricsMiddleware', # <-- Metryki Prometheusa (/metrics)
+    'fleet_core.middleware.QueryStatsMiddleware', # <-- Liczba i czas zapytań SQL (X-DB-Queries / X-DB-Time)
     'debug_toolbar.middleware.DebugToolbarMiddleware', # <-- DODAJ TUTAJ
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware', # <-- Ważne dla REST
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'fleet_core.db_router.ReplicaRoutingMiddleware', # <-- GET-y do repliki, read-your-writes po zapisie
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -106,6 +112,67 @@ DATABASES = {
     }
 }
 
+# Profil bazy: 'dev' (domyślny, jak dotąd) albo 'production' - FLEET_DB_PROFILE=production.
+# Produkcyjny MySQL (mysql-connector) włączamy przez FLEET_DB_ENGINE=mysql i zmienne FLEET_DB_*.
+FLEET_DB_PROFILE = os.environ.get('FLEET_DB_PROFILE', 'dev')
+
+if os.environ.get('FLEET_DB_ENGINE') == 'mysql':
+    DATABASES['default'] = {
+        'ENGINE': 'mysql.connector.django',
+        'NAME': os.environ.get('FLEET_DB_NAME', 'fleet_management_db'),
+        'USER': os.environ.get('FLEET_DB_USER', 'root'),
+        'PASSWORD': os.environ.get('FLEET_DB_PASSWORD', ''),
+        'HOST': os.environ.get('FLEET_DB_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('FLEET_DB_PORT', '3306'),
+        'OPTIONS': {'charset': 'utf8mb4', 'autocommit': True},
+    }
+
+# PRAGMA ustawiane na każdym nowym połączeniu SQLite (fleet_core/db_profile.py, sygnał connection_created)
+FLEET_SQLITE_PRAGMAS = {}
+
+if FLEET_DB_PROFILE == 'production':
+    # Połączenia trwałe (zamiast nowego na każde żądanie) ze sprawdzeniem przed ponownym użyciem
+    DATABASES['default']['CONN_MAX_AGE'] = 300
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+        DATABASES['default']['OPTIONS'] = {
+            # BEGIN IMMEDIATE - zapis bierze blokadę od razu, bez zakleszczeń przy podnoszeniu blokady w WAL
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        }
+        FLEET_SQLITE_PRAGMAS = {
+            'journal_mode': 'WAL',          # czytelnicy nie blokują pisarzy i odwrotnie
+            'synchronous': 'NORMAL',        # w WAL bezpieczne przy awarii procesu, fsync tylko przy checkpoint
+            'busy_timeout': 5000,           # ms czekania na blokadę zamiast natychmiastowego "database is locked"
+            'mmap_size': 256 * 1024 * 1024,
+            'cache_size': -64 * 1024,       # ujemne = KiB (64 MiB na połączenie)
+            'temp_store': 'MEMORY',
+        }
+
+# Replika do odczytu (opcjonalna). Lokalnie: drugi plik SQLite odświeżany komendą sync_replica,
+# np. FLEET_DB_REPLICA=db_replica.sqlite3. Dla MySQL: drugi schemat/serwer (FLEET_DB_REPLICA_ENGINE=mysql).
+if os.environ.get('FLEET_DB_REPLICA'):
+    if os.environ.get('FLEET_DB_REPLICA_ENGINE') == 'mysql':
+        DATABASES['replica'] = {
+            'ENGINE': 'mysql.connector.django',
+            'NAME': os.environ['FLEET_DB_REPLICA'],
+            'USER': os.environ.get('FLEET_DB_REPLICA_USER', 'root'),
+            'PASSWORD': os.environ.get('FLEET_DB_REPLICA_PASSWORD', ''),
+            'HOST': os.environ.get('FLEET_DB_REPLICA_HOST', '127.0.0.1'),
+            'PORT': os.environ.get('FLEET_DB_REPLICA_PORT', '3306'),
+        }
+    else:
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / os.environ['FLEET_DB_REPLICA'],
+        }
+    # W testach replika wskazuje na tę samą bazę co default
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['fleet_core.db_router.ReplicaRouter']
+FLEET_REPLICA_ALIAS = 'replica'
+FLEET_REPLICA_STICKY_SECONDS = 10  # tyle sekund po zapisie użytkownik czyta z bazy głównej
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -165,13 +232,24 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWT z claimami roli - bez zapytania o użytkownika przy każdym żądaniu
+        'fleet_core.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Wybór po nagłówku Accept: JSON przez orjson, przeglądarka API, MessagePack (mobile)
+    'DEFAULT_RENDERER_CLASSES': [
+        'fleet_core.renderers.OrjsonRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# MessagePack (msgpack w requirements.txt) - warunek tylko dla okrojonych środowisk bez pakietu
+from importlib.util import find_spec
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('fleet_core.renderers.MessagePackRenderer')
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=30),  # Token ważny 30 dni (żeby nie wylogowywało na telefonie)
@@ -179,4 +257,124 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
-}
\ No newline at end of file
+}
+FLEET_JWT_DENYLIST_REFRESH = 30  # co ile sekund proces przeładowuje listę unieważnionych tokenów
+
+# Cache odpowiedzi GET (list/retrieve) w pamięci workera, unieważniany zapisami modeli (fleet_core/response_cache.py).
+# Wersje modeli trzymane są w CACHES['default'] - przy wielu workerach ustaw cache współdzielony (Redis/Memcached).
+FLEET_RESPONSE_CACHE_ROLES = ('ADMIN', 'LOGISTYKA', 'SERWIS', 'KSIĘGOWOŚĆ', 'DRIVER', 'USER')
+FLEET_RESPONSE_CACHE_ENTRIES = 1000
+FLEET_RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+FLEET_RESPONSE_CACHE_TTL = 300  # s - zabezpieczenie na zapisy omijające sygnały (np. queryset.update())
+
+# Kompresja odpowiedzi (fleet_core/compression.py): br (brotli z requirements.txt) lub gzip
+FLEET_COMPRESS_MIN_BYTES = 1024
+FLEET_GZIP_LEVEL = 6
+FLEET_BROTLI_QUALITY = 5  # 4-6: dobry stosunek kompresji do CPU przy odpowiedziach generowanych na bieżąco
+
+# Cache serializacji pojedynczych obiektów po row_version (fleet_core/object_cache.py)
+FLEET_OBJECT_CACHE_ENABLED = True
+FLEET_OBJECT_CACHE_ENTRIES = 20000
+
+# Podpowiedzi (/api/autocomplete/): co ile sekund worker przebudowuje indeks w pamięci (zmiany z innych procesów)
+FLEET_AUTOCOMPLETE_REFRESH = 300
+# Ile sekund trzymamy w cache pojazdy kierowcy (rezerwacje, wydania) zawężające jego podpowiedzi
+FLEET_AUTOCOMPLETE_SCOPE_TTL = 30
+
+# Synchronizacja przyrostowa aplikacji mobilnej (/api/sync/, fleet_core/sync.py)
+FLEET_SYNC_SAFETY_SECONDS = 5     # token cofnięty o tyle - zapisy z transakcji zatwierdzonych z opóźnieniem
+FLEET_SYNC_TOMBSTONE_DAYS = 30    # starszy token -> pełna synchronizacja (reset); prune_sync_tombstones czyści ślady
+
+# Dziennik odczytów licznika (/api/vehicles/mileage/): średnia dzienna powyżej limitu -> over_limit
+FLEET_ODOMETER_DAILY_LIMIT_KM = 400
+
+# Panel admina: dokładny COUNT(*) list tylko do tylu wierszy, powyżej - szacunek (fleet_core/admin.py)
+FLEET_ADMIN_EXACT_COUNT = 10000
+
+# Przeliczanie rozliczeń wydań wg stawek (/api/handovers/reprice/, reprice_handovers)
+FLEET_REPRICE_BATCH = 500  # wydania na jeden bulk_update
+FLEET_REPRICE_MAX_CHANGES = 200  # szczegóły zmian w raporcie (reszta tylko w licznikach i sumach)
+
+# Archiwum historii (archive_history): zamknięte wydania i zakończone rezerwacje starsze niż N dni
+FLEET_ARCHIVE_AFTER_DAYS = 365
+FLEET_ARCHIVE_BATCH = 1000  # wiersze przenoszone w jednej transakcji
+
+# Powiadomienia push (/api/events/, Server-Sent Events - pełny strumień wymaga ASGI, np. uvicorn Server.asgi:application)
+FLEET_EVENTS_BACKEND = 'fleet_core.events.LocalBackend'  # przy wielu workerach: backend pub/sub z tym samym interfejsem
+FLEET_EVENTS_BUFFER = 1000      # ostatnie zdarzenia do wznowienia po Last-Event-ID
+FLEET_EVENTS_QUEUE = 100        # kolejka na połączenie; przepełnienie -> zdarzenie 'resync'
+FLEET_EVENTS_HEARTBEAT = 15     # s - komentarz utrzymujący połączenie przez proxy
+FLEET_EVENTS_RETRY_MS = 3000    # po ilu ms EventSource łączy się ponownie
+
+# Logowanie: pula wątków do haszowania haseł (None = liczba rdzeni), kolejka i Retry-After przy 503
+FLEET_LOGIN_WORKERS = None
+FLEET_LOGIN_QUEUE = None  # None = 4 x FLEET_LOGIN_WORKERS
+FLEET_LOGIN_RETRY_AFTER = 2
+FLEET_ONBOARD_PROCESSES = None  # procesy do haszowania haseł przy masowym imporcie (None = liczba rdzeni)
+
+# --- MONITORING ZAPYTAŃ SQL (fleet_core.middleware.QueryStatsMiddleware) ---
+FLEET_SLOW_QUERY_MS = 200          # zapytania wolniejsze niż to trafiają do logs/slow_queries.log
+FLEET_SLOW_QUERY_TOP = 5           # ile najwolniejszych zapytań na żądanie zapamiętywać
+FLEET_EXPLAIN_THRESHOLD_MS = None  # np. 500 -> dołącz EXPLAIN do wpisu w logu (None = wyłączone)
+
+# --- METRYKI PROMETHEUSA (/metrics) ---
+# Katalog współdzielony przez workery (gunicorn/uwsgi) - każdy proces zapisuje tu swój snapshot
+FLEET_METRICS_MULTIPROC_DIR = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+FLEET_METRICS_FLUSH_SECONDS = 5
+FLEET_METRICS_TOKEN = os.environ.get('FLEET_METRICS_TOKEN')  # None = bez autoryzacji
+
+LOG_DIR = BASE_DIR / 'logs'
+os.makedirs(LOG_DIR, exist_ok=True)
+
+# --- LOGI STRUKTURALNE fleet_core (JSON przez QueueHandler/QueueListener, fleet_core/log.py) ---
+FLEET_LOG_LEVEL = os.environ.get('FLEET_LOG_LEVEL', 'INFO')  # DEBUG włącza diagnostykę rezerwacji
+FLEET_LOG_SAMPLING = {
+    # 'fleet_core.views': 0.1,  # przykład: 10% rekordów DEBUG/INFO z widoków
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '{asctime} {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'filters': {
+        'request_id': {
+            '()': 'fleet_core.log.RequestIdFilter',
+        },
+        'sampling': {
+            '()': 'fleet_core.log.SamplingFilter',
+            'rates': FLEET_LOG_SAMPLING,
+        },
+    },
+    'handlers': {
+        'fleet_json': {
+            '()': 'fleet_core.log.QueueingHandler',
+            'stream': 'ext://sys.stdout',
+            'filters': ['request_id', 'sampling'],
+        },
+        'slow_queries_file': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': LOG_DIR / 'slow_queries.log',
+            'maxBytes': 5 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'fleet_core': {
+            'handlers': ['fleet_json'],
+            'level': FLEET_LOG_LEVEL,
+            'propagate': False,
+        },
+        'fleet_core.slow_queries': {
+            'handlers': ['slow_queries_file'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
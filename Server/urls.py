@@ -4,10 +4,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings # <-- DODAJ IMPORT!
 from django.conf.urls.static import static
+from fleet_core.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('fleet_core.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Dodaj to na samym dole pliku
@@ -1,39 +1,180 @@
 # Master/Server/fleet_core/admin.py
 
+import datetime
+
+from django.conf import settings
 from django.contrib import admin
-from .models import FleetCompany, Vehicle, CustomUser, Driver, ServiceEvent, DamageEvent, InsurancePolicy, VehicleHandover
+from django.core.paginator import Paginator
+from django.db import connections, DatabaseError
+from django.utils.functional import cached_property
+
+from .models import FleetCompany, Vehicle, CustomUser, Driver, ServiceEvent, DamageEvent, InsurancePolicy, VehicleHandover, \
+    OdometerReading, RateTier, ArchivedHandover, ArchivedReservation
+from .odometer import record_reading, SOURCE_MANUAL
+
+
+# --- DUŻE TABELE: LICZNIKI BEZ PEŁNEGO COUNT(*) ---
+
+def estimated_row_count(model, using='default'):
+    """Szacunkowa liczba wierszy ze statystyk bazy (bez skanowania tabeli) albo None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table]),
+        'mysql': ("SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() "
+                  "AND TABLE_NAME = %s", [table]),
+        # Statystyki po ANALYZE: pierwsza liczba w 'stat' to liczba wierszy tabeli
+        'sqlite': ("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(*queries[connection.vendor])
+            row = cursor.fetchone()
+    except DatabaseError:  # np. brak sqlite_stat1 przed pierwszym ANALYZE
+        return None
+    if not row or row[0] is None:
+        return None
+    value = int(str(row[0]).split()[0])
+    return value if value >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator listy w panelu: dokładny COUNT(*) tylko do FLEET_ADMIN_EXACT_COUNT wierszy.
+    Bez filtrów - szacunek ze statystyk bazy; z filtrem/wyszukiwaniem - licznik z LIMIT (co najwyżej
+    FLEET_ADMIN_EXACT_COUNT), więc koszt strony nie rośnie z rozmiarem tabeli.
+    """
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'FLEET_ADMIN_EXACT_COUNT', 10000)
+        queryset = self.object_list
+        # Bez ORDER BY - sortowanie całej tabeli tylko po to, żeby policzyć wiersze
+        capped = queryset.order_by()[:limit + 1].count()
+        if capped <= limit:
+            return capped
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return limit
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Panel dla tabel rosnących bez końca: szacunkowe liczniki, bez drugiego COUNT(*) całej tabeli."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+# --- REJESTRACJE ---
+# Pola FK przez autocomplete_fields (wyszukiwarka AJAX zamiast <select> z całą tabelą), wyszukiwanie po
+# prefiksie ('^' -> istartswith, korzysta z indeksu), list_select_related - __str__ bez zapytań per wiersz.
 
 @admin.register(InsurancePolicy)
-class InsurancePolicyAdmin(admin.ModelAdmin):
+class InsurancePolicyAdmin(LargeTableAdmin):
     list_display = ('numer_polisy', 'pojazd', 'ubezpieczyciel', 'data_waznosci_oc')
     list_filter = ('ubezpieczyciel', 'data_waznosci_oc')
+    list_select_related = ('pojazd',)
+    autocomplete_fields = ('pojazd',)
+    search_fields = ('^numer_polisy', '^pojazd__registration_number')
+    date_hierarchy = 'data_waznosci_oc'
 
 @admin.register(FleetCompany)
 class FleetCompanyAdmin(admin.ModelAdmin):
     list_display = ('nazwa', 'nip')
+    search_fields = ('nazwa', 'nip')
 
 @admin.register(Vehicle)
-class VehicleAdmin(admin.ModelAdmin):
+class VehicleAdmin(LargeTableAdmin):
     list_display = ('registration_number', 'vin', 'przebieg', 'company', 'is_active')
     list_filter = ('is_active', 'company')
-    search_fields = ('registration_number', 'vin')
+    list_select_related = ('company',)
+    autocomplete_fields = ('company', 'assigned_user')
+    search_fields = ('^registration_number', '^vin')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'przebieg' in form.changed_data:
+            record_reading(obj.pk, datetime.date.today(), obj.przebieg, SOURCE_MANUAL)
 
 @admin.register(CustomUser)
-class CustomUserAdmin(admin.ModelAdmin):
+class CustomUserAdmin(LargeTableAdmin):
     list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff', 'rola')
+    list_filter = ('rola',)
+    search_fields = ('^username', '^last_name', '^email')
 
 @admin.register(Driver)
-class DriverAdmin(admin.ModelAdmin):
+class DriverAdmin(LargeTableAdmin):
     list_display = ('user', 'numer_prawa_jazdy', 'aktywny')
-    search_fields = ('user__username', 'numer_prawa_jazdy')
+    list_filter = ('aktywny',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user', 'company')
+    search_fields = ('^user__username', '^user__last_name', '^numer_prawa_jazdy')
 
 @admin.register(DamageEvent)
-class DamageEventAdmin(admin.ModelAdmin):
+class DamageEventAdmin(LargeTableAdmin):
     list_display = ('pojazd', 'data_zdarzenia', 'status_naprawy', 'szacowany_koszt')
     list_filter = ('status_naprawy', 'zgloszony_do_ubezpieczyciela')
+    list_select_related = ('pojazd',)
+    autocomplete_fields = ('pojazd',)
+    search_fields = ('^pojazd__registration_number',)
+    date_hierarchy = 'data_zdarzenia'
 
 @admin.register(VehicleHandover)
-class VehicleHandoverAdmin(admin.ModelAdmin):
+class VehicleHandoverAdmin(LargeTableAdmin):
     list_display = ('pojazd', 'kierowca', 'data_wydania', 'data_zwrotu')
     list_filter = ('data_wydania', 'data_zwrotu')
-    search_fields = ('pojazd__registration_number', 'kierowca__user__last_name', 'kierowca__user__first_name')
\ No newline at end of file
+    list_select_related = ('pojazd', 'kierowca__user')
+    autocomplete_fields = ('pojazd', 'kierowca')
+    raw_id_fields = ('reservation',)  # rezerwacje nie mają własnego panelu
+    search_fields = ('^pojazd__registration_number', '^kierowca__user__last_name', '^kierowca__user__first_name')
+    date_hierarchy = 'data_wydania'
+
+@admin.register(OdometerReading)
+class OdometerReadingAdmin(LargeTableAdmin):
+    list_display = ('pojazd', 'data_odczytu', 'przebieg', 'zrodlo')
+    list_filter = ('zrodlo',)
+    list_select_related = ('pojazd',)
+    search_fields = ('^pojazd__registration_number',)
+    date_hierarchy = 'data_odczytu'
+
+    # Dziennik tylko do dopisywania - w panelu wyłącznie podgląd
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(RateTier)
+class RateTierAdmin(admin.ModelAdmin):
+    list_display = ('typ_pojazdu', 'fuel_type', 'stawka_za_km', 'oplata_za_paliwo')
+    list_filter = ('typ_pojazdu', 'fuel_type')
+
+
+class ArchiveAdmin(LargeTableAdmin):
+    """Archiwum (archive_history) - tylko podgląd, wiersze przenosi wyłącznie komenda."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedHandover)
+class ArchivedHandoverAdmin(ArchiveAdmin):
+    list_display = ('id', 'pojazd', 'kierowca', 'data_wydania', 'data_zwrotu', 'archived_at')
+    list_select_related = ('pojazd', 'kierowca__user')
+    search_fields = ('^pojazd__registration_number', '^kierowca__user__last_name')
+    date_hierarchy = 'data_wydania'
+
+@admin.register(ArchivedReservation)
+class ArchivedReservationAdmin(ArchiveAdmin):
+    list_display = ('id', 'assigned_vehicle', 'driver', 'date_from', 'date_to', 'status', 'archived_at')
+    list_filter = ('status',)
+    list_select_related = ('assigned_vehicle', 'driver__user')
+    search_fields = ('^assigned_vehicle__registration_number', '^driver__user__last_name')
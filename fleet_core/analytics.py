@@ -0,0 +1,158 @@
+# fleet_core/analytics.py
+
+import datetime
+
+import numpy as np
+import pandas as pd
+from django.db.models import CharField
+from django.db.models.functions import Cast
+
+from .archive import HANDOVER_MODELS, RESERVATION_MODELS
+from .models import Vehicle
+
+GROUP_BY_CHOICES = ('typ_pojazdu', 'company', 'vehicle')
+
+
+def day_offsets(dates, start):
+    """Daty 'RRRR-MM-DD' (None = brak) -> numery dni od start jako int64 (brak -> -1) + maska braków."""
+    values = np.array(dates, dtype='datetime64[D]')
+    missing = np.isnat(values)
+    offsets = (values - np.datetime64(start, 'D')).astype('int64')
+    offsets[missing] = -1
+    return offsets, missing
+
+
+def _as_text(field):
+    # Data jako tekst ISO prosto z bazy - numpy parsuje ją ~50x szybciej niż obiekty date,
+    # a Django nie buduje obiektu date dla każdego wiersza
+    return Cast(field, output_field=CharField())
+
+
+def occupancy_matrix(rows, starts, ends, n_vehicles, days):
+    """
+    Zajętość dzień po dniu: tablica bool (n_vehicles, days). Przedział [start, end] (włącznie, numery dni)
+    to +1 w dniu start i -1 dzień po end w tablicy różnic; cumsum po dniach daje liczbę nakładających się
+    przedziałów. Wszystko wektorowo - bincount na spłaszczonych indeksach zamiast pętli po wierszach.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    starts = np.clip(np.asarray(starts, dtype=np.int64), 0, days)
+    stops = np.clip(np.asarray(ends, dtype=np.int64) + 1, 0, days)  # koniec wyłączny
+    valid = starts < stops  # przedziały poza okresem po przycięciu są puste
+    rows, starts, stops = rows[valid], starts[valid], stops[valid]
+
+    width = days + 1
+    size = n_vehicles * width
+    diff = np.bincount(rows * width + starts, minlength=size) - np.bincount(rows * width + stops, minlength=size)
+    return diff.reshape(n_vehicles, width)[:, :days].cumsum(axis=1) > 0
+
+
+def month_bounds(start, end):
+    """Pierwsze dni miesięcy okresu jako numery dni od start + etykiety 'RRRR-MM' i liczby dni w okresie."""
+    months = pd.date_range(start, end, freq='MS')
+    if len(months) == 0 or months[0].date() != start:
+        months = months.insert(0, pd.Timestamp(start))
+    offsets = np.array([(m.date() - start).days for m in months], dtype=np.int64)
+    lengths = np.diff(np.append(offsets, (end - start).days + 1))
+    return offsets, [m.strftime('%Y-%m') for m in months], lengths
+
+
+def _vehicle_intervals(vehicle_ids, start, end):
+    """
+    Przedziały wydań i rezerwacji nachodzące na okres: (wiersze macierzy, start, koniec) jako tablice.
+    Tabele bieżące i archiwum (fleet_core/archive.py) - te same kolumny.
+    """
+    records = []
+    for model in HANDOVER_MODELS:
+        records.extend(
+            model.objects.filter(data_wydania__lte=end)
+            .exclude(data_zwrotu__lt=start)
+            .values_list('pojazd_id', _as_text('data_wydania'), _as_text('data_zwrotu'))
+        )
+    # Jak w VehicleViewSet.availability: zajmuje każda rezerwacja poza odrzuconymi
+    for model in RESERVATION_MODELS:
+        records.extend(
+            model.objects.filter(assigned_vehicle__isnull=False, date_from__lte=end, date_to__gte=start)
+            .exclude(status='ODRZUCONE')
+            .values_list('assigned_vehicle_id', _as_text('date_from'), _as_text('date_to'))
+        )
+    if not records:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    pojazd_ids, date_from, date_to = zip(*records)
+    starts, _ = day_offsets(date_from, start)
+    ends, open_ended = day_offsets(date_to, start)
+    ends[open_ended] = (end - start).days  # wydanie bez zwrotu trwa do końca okresu
+
+    pojazd_ids = np.array(pojazd_ids, dtype=np.int64)
+    positions = np.searchsorted(vehicle_ids, pojazd_ids).clip(0, len(vehicle_ids) - 1)
+    known = vehicle_ids[positions] == pojazd_ids
+    return positions[known], starts[known], ends[known]
+
+
+def utilization_report(year, group_by='typ_pojazdu', today=None):
+    """
+    Wykorzystanie floty w roku: procent dni, w których pojazd był wydany lub zarezerwowany,
+    per miesiąc i per grupa (typ pojazdu, firma albo pojedynczy pojazd). Bieżący rok - do dziś.
+    """
+    today = today or datetime.date.today()
+    start = datetime.date(year, 1, 1)
+    end = min(datetime.date(year, 12, 31), today)
+    if end < start:
+        return {'year': year, 'group_by': group_by, 'months': [], 'total': None, 'groups': []}
+
+    vehicles = pd.DataFrame.from_records(
+        list(Vehicle.objects.order_by('id').values_list('id', 'registration_number', 'typ_pojazdu',
+                                                          'company__nazwa')),
+        columns=['id', 'registration_number', 'typ_pojazdu', 'company'],
+    )
+    days = (end - start).days + 1
+    vehicle_ids = vehicles['id'].to_numpy(dtype=np.int64)
+    rows, starts, ends = _vehicle_intervals(vehicle_ids, start, end)
+    occupied = occupancy_matrix(rows, starts, ends, len(vehicles), days)
+
+    offsets, labels, lengths = month_bounds(start, end)
+    # Zajęte dni pojazdu w każdym miesiącu: (pojazdy, miesiące)
+    if len(vehicles):
+        busy_days = np.add.reduceat(occupied, offsets, axis=1, dtype=np.int64)
+    else:
+        busy_days = np.zeros((0, len(offsets)), dtype=np.int64)
+
+    if group_by == 'vehicle':
+        keys = vehicles['id'].to_numpy()
+        names = dict(zip(keys, vehicles['registration_number']))
+    elif group_by == 'company':
+        keys = vehicles['company'].fillna('').to_numpy()
+        names = {key: key or 'Bez firmy' for key in keys}
+    else:
+        keys = vehicles['typ_pojazdu'].to_numpy()
+        names = dict(Vehicle.TYPE_CHOICES)
+    codes, uniques = pd.factorize(keys)
+
+    # Sumy zajętych dni i liczby pojazdów per grupa: bincount z wagami, po jednym na miesiąc
+    group_days = np.zeros((len(uniques), len(offsets)))
+    for month in range(len(offsets)):
+        group_days[:, month] = np.bincount(codes, weights=busy_days[:, month], minlength=len(uniques))
+    group_sizes = np.bincount(codes, minlength=len(uniques))
+
+    def percent(busy, vehicle_count, month_days):
+        capacity = vehicle_count * month_days
+        return np.round(np.divide(busy * 100.0, capacity, out=np.zeros_like(busy, dtype=float),
+                                  where=capacity > 0), 1)
+
+    monthly = percent(group_days, group_sizes[:, None], lengths[None, :])
+    yearly = percent(group_days.sum(axis=1), group_sizes, days)
+    groups = [
+        {'key': key.item() if hasattr(key, 'item') else key, 'label': names.get(key, key),
+         'vehicles': int(group_sizes[i]), 'utilization': monthly[i].tolist(), 'year': float(yearly[i])}
+        for i, key in enumerate(uniques)
+    ]
+    groups.sort(key=lambda g: -g['year'])
+    total_days = busy_days.sum(axis=0)
+    total = {
+        'vehicles': len(vehicles),
+        'utilization': percent(total_days, len(vehicles), lengths).tolist(),
+        'year': float(percent(np.array(total_days.sum()), len(vehicles), days)),
+    }
+    return {'year': year, 'group_by': group_by, 'period': [start, end], 'months': labels,
+            'total': total, 'groups': groups}
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class FleetCoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'fleet_core'
+
+    def ready(self):
+        # Rejestracja sygnałów (liczniki, synchronizacja danych pochodnych)
+        from . import signals  # noqa: F401
+
+        # PRAGMA dla SQLite z profilu bazy (FLEET_DB_PROFILE)
+        from django.db.backends.signals import connection_created
+        from .db_profile import apply_sqlite_pragmas
+        connection_created.connect(apply_sqlite_pragmas, dispatch_uid='fleet_sqlite_pragmas')
@@ -0,0 +1,131 @@
+# fleet_core/archive.py
+
+import datetime
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import search, sync
+from .models import (
+    VehicleHandover, Reservation, ReservationFile, ArchivedHandover, ArchivedReservation, ArchivedReservationFile,
+    SyncTombstone, Vehicle,
+)
+from .response_cache import response_cache
+from .signals import bump_vehicle_row_version
+
+# Tabela bieżąca + archiwum - historia i raporty iterują po obu (te same nazwy kolumn)
+HANDOVER_MODELS = (VehicleHandover, ArchivedHandover)
+RESERVATION_MODELS = (Reservation, ArchivedReservation)
+
+FINISHED_RESERVATION_STATUSES = ('PRZYJETE', 'ZATWIERDZONE')
+
+
+def archive_cutoff(today=None):
+    return (today or datetime.date.today()) - datetime.timedelta(days=getattr(settings, 'FLEET_ARCHIVE_AFTER_DAYS', 365))
+
+
+def closed_handovers(cutoff):
+    """Wydania zwrócone przed dniem cutoff."""
+    return VehicleHandover.objects.filter(data_zwrotu__lt=cutoff)
+
+
+def finished_reservations(cutoff, blocking=None):
+    """
+    Rezerwacje zakończone przed cutoff (przyjęte/zatwierdzone) i odrzucone, które nie są już w grze.
+    Bez rezerwacji, na które wskazuje wydanie z tabeli bieżącej - blocking (FK ustawiłby się na NULL).
+    """
+    blocking = VehicleHandover.objects.all() if blocking is None else blocking
+    cutoff_moment = timezone.make_aware(datetime.datetime.combine(cutoff, datetime.time.min))
+    finished = Q(status__in=FINISHED_RESERVATION_STATUSES, date_to__lt=cutoff)
+    rejected = Q(status='ODRZUCONE') & (Q(date_to__lt=cutoff) | Q(date_to__isnull=True, created_at__lt=cutoff_moment))
+    return Reservation.objects.filter(finished | rejected).exclude(
+        pk__in=blocking.filter(reservation__isnull=False).values('reservation_id')
+    )
+
+
+def _copied_fields(archive_model):
+    return [f.attname for f in archive_model._meta.concrete_fields if f.name != 'archived_at']
+
+
+def _delete_rows(model, ids):
+    # Surowy DELETE - queryset.delete() wysłałby sygnały (zdarzenia SSE, zapytania per wiersz) dla każdego
+    # wiersza; ślady dla /api/sync/ i wersje pojazdów zapisujemy zbiorczo w _leave_hot_table
+    table = connection.ops.quote_name(model._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", ids)
+
+
+def _copy_rows(model, archive_model, ids, now):
+    fields = _copied_fields(archive_model)
+    rows = model.objects.filter(pk__in=ids).values(*fields)
+    archive_model.objects.bulk_create([archive_model(**row, archived_at=now) for row in rows])
+
+
+def _leave_hot_table(model, ids):
+    """
+    Dla telefonów wiersz znika jak przy usunięciu - ślady dla /api/sync/ (jedno zapytanie + bulk_create).
+    Zwraca pojazdy przeniesionych wierszy (ich row_version - VehicleDto czyta wydania i rezerwacje).
+    """
+    tombstones = sync.tombstones_for_ids(model, ids)
+    SyncTombstone.objects.bulk_create(tombstones)
+    return {t.vehicle_id for t in tombstones}
+
+
+def _archive_handovers(ids, now):
+    _copy_rows(VehicleHandover, ArchivedHandover, ids, now)
+    vehicle_ids = _leave_hot_table(VehicleHandover, ids)
+    _delete_rows(VehicleHandover, ids)
+    bump_vehicle_row_version(*vehicle_ids)
+    search.remove_documents(search.ENTITY_HANDOVER, ids)
+
+
+def _archive_reservations(ids, now):
+    _copy_rows(Reservation, ArchivedReservation, ids, now)
+    vehicle_ids = _leave_hot_table(Reservation, ids)
+    file_ids = list(ReservationFile.objects.filter(reservation_id__in=ids).values_list('id', flat=True))
+    if file_ids:
+        archive_fields = _copied_fields(ArchivedReservationFile)
+        ArchivedReservationFile.objects.bulk_create([
+            ArchivedReservationFile(**row)
+            for row in ReservationFile.objects.filter(pk__in=file_ids).values(*archive_fields)
+        ])
+        _delete_rows(ReservationFile, file_ids)
+    _delete_rows(Reservation, ids)
+    bump_vehicle_row_version(*vehicle_ids)
+    search.remove_documents(search.ENTITY_RESERVATION, ids)
+
+
+def _move_in_batches(candidates, move, batch_size):
+    """Paczki po batch_size id, każda w osobnej transakcji (krótkie blokady, postęp przetrwa przerwanie)."""
+    moved = 0
+    while True:
+        with transaction.atomic():
+            ids = list(candidates.select_for_update().order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            move(ids, timezone.now())
+        moved += len(ids)
+    return moved
+
+
+def archive_history(cutoff=None, batch_size=None, dry_run=False):
+    """
+    Przenosi zamknięte wydania i zakończone/odrzucone rezerwacje sprzed cutoff do tabel archiwum.
+    Najpierw wydania - zwalniają odwołania do rezerwacji. Zwraca {'handovers': n, 'reservations': n}.
+    """
+    cutoff = cutoff or archive_cutoff()
+    batch_size = batch_size or getattr(settings, 'FLEET_ARCHIVE_BATCH', 1000)
+    if dry_run:
+        # Rezerwacje blokują tylko wydania, które zostaną w tabeli bieżącej
+        remaining = VehicleHandover.objects.exclude(data_zwrotu__lt=cutoff)
+        return {'handovers': closed_handovers(cutoff).count(),
+                'reservations': finished_reservations(cutoff, blocking=remaining).count()}
+
+    handovers = _move_in_batches(closed_handovers(cutoff), _archive_handovers, batch_size)
+    reservations = _move_in_batches(finished_reservations(cutoff), _archive_reservations, batch_size)
+    if handovers or reservations:
+        response_cache.invalidate_on_commit(VehicleHandover, Reservation, ReservationFile, Vehicle, SyncTombstone)
+    return {'handovers': handovers, 'reservations': reservations}
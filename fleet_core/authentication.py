@@ -0,0 +1,141 @@
+# fleet_core/authentication.py
+
+import datetime
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import RevokedToken
+
+# Claimy kopiowane z CustomUser do tokenu przy logowaniu
+USER_CLAIMS = ('rola', 'username', 'first_name', 'last_name', 'is_staff', 'is_superuser')
+# Czas wydania z dokładnością do mikrosekund - 'iat' simplejwt jest w pełnych sekundach
+ISSUED_AT_CLAIM = 'iat_us'
+
+
+class FleetRefreshToken(RefreshToken):
+    """Refresh/access token z rolą i danymi użytkownika (access token dziedziczy claimy)."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        token[ISSUED_AT_CLAIM] = time.time_ns() // 1000
+        return token
+
+
+class ClaimsUser(TokenUser):
+    """
+    Lekki użytkownik zbudowany z claimów tokenu - bez zapytania do bazy.
+    Widoki filtrują po user.id (np. driver__user_id=user.id), nie po obiekcie modelu.
+    """
+
+    @property
+    def id(self):
+        return self.token[api_settings.USER_ID_CLAIM]
+
+    @property
+    def rola(self):
+        return self.token.get('rola')
+
+    @property
+    def first_name(self):
+        return self.token.get('first_name', '')
+
+    @property
+    def last_name(self):
+        return self.token.get('last_name', '')
+
+
+class _DenyList:
+    """
+    Kopia tabeli RevokedToken w pamięci procesu, odświeżana co FLEET_JWT_DENYLIST_REFRESH sekund.
+    Jedno zapytanie na okres odświeżania zamiast zapytania o użytkownika przy każdym żądaniu.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self.jtis = frozenset()
+        self.users = {}  # str(user_id) -> znacznik czasu unieważnienia (epoch w mikrosekundach)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _refresh_if_stale(self):
+        ttl = getattr(settings, 'FLEET_JWT_DENYLIST_REFRESH', 30)
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < ttl:
+            return
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < ttl:
+                return
+            jtis, users = set(), {}
+            rows = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list(
+                'jti', 'user_pk', 'revoked_at'
+            )
+            for jti, user_id, revoked_at in rows:
+                if jti:
+                    jtis.add(jti)
+                elif user_id:
+                    # Claim user_id bywa tekstem ('1') - klucze trzymamy jako str
+                    key = str(user_id)
+                    revoked_us = round(revoked_at.timestamp() * 1_000_000)
+                    users[key] = max(users.get(key, 0), revoked_us)
+            self.jtis, self.users = frozenset(jtis), users
+            self._loaded_at = time.monotonic()
+
+    def is_revoked(self, token):
+        self._refresh_if_stale()
+        if token.get(api_settings.JTI_CLAIM) in self.jtis:
+            return True
+        revoked_us = self.users.get(str(token.get(api_settings.USER_ID_CLAIM)))
+        if revoked_us is None:
+            return False
+        issued_us = token.get(ISSUED_AT_CLAIM)
+        if issued_us is not None:
+            return issued_us <= revoked_us
+        # Token bez claimu mikrosekund: 'iat' jest w pełnych sekundach, więc porównujemy z sekundą
+        # unieważnienia ściśle - token wydany w tej samej sekundzie po unieważnieniu pozostaje ważny
+        return token.get('iat', 0) < revoked_us // 1_000_000
+
+
+deny_list = _DenyList()
+
+
+def revoke_user_tokens(user_id):
+    """Unieważnia wszystkie tokeny użytkownika wydane do teraz (zmiana roli, hasła, blokada, usunięcie)."""
+    RevokedToken.objects.create(
+        user_pk=user_id, expires_at=timezone.now() + api_settings.REFRESH_TOKEN_LIFETIME
+    )
+    deny_list.invalidate()
+
+
+def revoke_token(token):
+    """Unieważnia jeden token (po jti), np. przy wylogowaniu."""
+    RevokedToken.objects.create(
+        user_pk=token.get(api_settings.USER_ID_CLAIM), jti=token[api_settings.JTI_CLAIM],
+        expires_at=datetime.datetime.fromtimestamp(token['exp'], tz=datetime.timezone.utc),
+    )
+    deny_list.invalidate()
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Uwierzytelnianie JWT bez zapytania o CustomUser: rola, id i imię/nazwisko pochodzą z claimów
+    (FleetRefreshToken). Stare tokeny bez claimu 'rola' obsługujemy jak dotąd - przez bazę.
+    """
+
+    def get_user(self, validated_token):
+        if deny_list.is_revoked(validated_token):
+            raise AuthenticationFailed("Token został unieważniony.", code='token_revoked')
+        if 'rola' not in validated_token or api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
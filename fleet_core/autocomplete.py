@@ -0,0 +1,171 @@
+# fleet_core/autocomplete.py
+
+import bisect
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+
+from .models import Vehicle, Driver
+
+ENTITY_VEHICLE = 'vehicle'
+ENTITY_DRIVER = 'driver'
+
+# Role, które w podpowiedziach widzą tylko swoje obiekty: pojazdy, które mają teraz
+# (jak VehicleViewSet - get_driver_vehicle_ids), i własny profil kierowcy
+OWN_SCOPE_ROLES = ('DRIVER',)
+
+
+def normalize(text):
+    """Klucz indeksu: małe litery, bez spacji/myślników i polskich znaków ("WA 123-45" -> "wa12345")."""
+    text = unicodedata.normalize('NFKD', str(text).replace('ł', 'l').replace('Ł', 'L'))
+    return ''.join(ch for ch in text.lower() if ch.isalnum())
+
+
+def vehicle_entry(v):
+    keys = {normalize(v.registration_number), normalize(v.vin)}
+    label = ' '.join(p for p in (v.registration_number, v.marka, v.model) if p)
+    # Bez właściciela - zakres pojazdów kierowcy (rezerwacje, wydania) podaje widok, patrz complete()
+    return ENTITY_VEHICLE, v.pk, label, keys, None
+
+
+def driver_entry(d):
+    user = d.user
+    label = ' '.join(p for p in (user.first_name, user.last_name) if p) or user.username
+    keys = {normalize(user.username), normalize(f"{user.first_name}{user.last_name}"),
+            normalize(f"{user.last_name}{user.first_name}"), normalize(user.first_name), normalize(user.last_name)}
+    return ENTITY_DRIVER, d.pk, label, keys, d.user_id
+
+
+class PrefixIndex:
+    """
+    Posortowane listy kluczy (klucz, id) per typ + bisect - wyszukiwanie prefiksu w O(log n) bez bazy.
+    Budowana leniwie przy pierwszym zapytaniu, aktualizowana przyrostowo z sygnałów
+    i przeładowywana co FLEET_AUTOCOMPLETE_REFRESH sekund (zmiany z innych workerów).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._keys = {ENTITY_VEHICLE: [], ENTITY_DRIVER: []}  # typ -> posortowane (klucz, id)
+        self._entries = {}   # (typ, id) -> (etykieta, klucze, id właściciela)
+        self._by_owner = {}  # str(id użytkownika) -> {(typ, id)}
+
+    # --- BUDOWA ---
+
+    def _load(self):
+        self._keys = {ENTITY_VEHICLE: [], ENTITY_DRIVER: []}
+        self._entries, self._by_owner = {}, {}
+        vehicles = Vehicle.objects.only('id', 'registration_number', 'vin', 'marka', 'model')
+        drivers = Driver.objects.select_related('user').only(
+            'id', 'user_id', 'user__username', 'user__first_name', 'user__last_name'
+        )
+        for entry in [vehicle_entry(v) for v in vehicles.iterator()] + [driver_entry(d) for d in drivers.iterator()]:
+            self._add(entry, sort=False)
+        for keys in self._keys.values():
+            keys.sort()
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        ttl = getattr(settings, 'FLEET_AUTOCOMPLETE_REFRESH', 300)
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < ttl:
+            return
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= ttl:
+                self._load()
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+            self._keys = {ENTITY_VEHICLE: [], ENTITY_DRIVER: []}
+            self._entries, self._by_owner = {}, {}
+
+    # --- AKTUALIZACJA PRZYROSTOWA ---
+
+    def upsert(self, entry):
+        with self._lock:
+            if not self.loaded:
+                return  # indeks zbuduje się od zera przy pierwszym zapytaniu
+            self._remove_keys(entry[0], entry[1])
+            self._add(entry, sort=True)
+
+    def remove(self, entity, pk):
+        with self._lock:
+            if self.loaded:
+                self._remove_keys(entity, pk)
+
+    def _add(self, entry, sort):
+        entity, pk, label, entry_keys, owner = entry
+        self._entries[(entity, pk)] = (label, entry_keys, owner)
+        if owner is not None:
+            self._by_owner.setdefault(str(owner), set()).add((entity, pk))
+        keys = self._keys[entity]
+        for key in entry_keys:
+            if not key:
+                continue
+            if sort:
+                bisect.insort(keys, (key, pk))
+            else:
+                keys.append((key, pk))
+
+    def _remove_keys(self, entity, pk):
+        previous = self._entries.pop((entity, pk), None)
+        if not previous:
+            return
+        if previous[2] is not None:
+            self._by_owner.get(str(previous[2]), set()).discard((entity, pk))
+        keys = self._keys[entity]
+        for key in previous[1]:
+            i = bisect.bisect_left(keys, (key, pk))
+            if i < len(keys) and keys[i] == (key, pk):
+                del keys[i]
+
+    # --- ZAPYTANIA ---
+
+    def complete(self, prefix, entity=None, limit=10, owner_id=None, vehicle_ids=None):
+        """
+        Do `limit` podpowiedzi [(typ, id, etykieta)] dla prefiksu (pojazdy przed kierowcami).
+        owner_id / vehicle_ids ograniczają wyniki do obiektów użytkownika: własnego profilu kierowcy
+        i podanych pojazdów.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self._ensure_loaded()
+        entities = (entity,) if entity else (ENTITY_VEHICLE, ENTITY_DRIVER)
+        with self._lock:
+            if owner_id is not None or vehicle_ids is not None:
+                return self._complete_owned(prefix, entities, limit, owner_id, vehicle_ids)
+            results = []
+            for current in entities:
+                keys, seen = self._keys[current], set()
+                i = bisect.bisect_left(keys, (prefix,))
+                while i < len(keys) and len(results) < limit:
+                    key, pk = keys[i]
+                    i += 1
+                    if not key.startswith(prefix):
+                        break
+                    if pk not in seen:
+                        seen.add(pk)
+                        results.append((current, pk, self._entries[(current, pk)][0]))
+            return results
+
+    def _complete_owned(self, prefix, entities, limit, owner_id, vehicle_ids):
+        # Użytkownik ma kilka obiektów - przeglądamy je wprost zamiast całego zakresu prefiksu
+        candidates = set(self._by_owner.get(str(owner_id), ())) if owner_id is not None else set()
+        candidates.update((ENTITY_VEHICLE, pk) for pk in vehicle_ids or ())
+        owned = sorted(
+            (entities.index(entity), self._entries[(entity, pk)][0], entity, pk)
+            for entity, pk in candidates
+            if entity in entities and (entity, pk) in self._entries
+            and any(k.startswith(prefix) for k in self._entries[(entity, pk)][1])
+        )
+        return [(entity, pk, label) for _, label, entity, pk in owned[:limit]]
+
+
+index = PrefixIndex()
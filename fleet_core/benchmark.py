@@ -0,0 +1,92 @@
+# fleet_core/benchmark.py
+
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+
+def percentiles(samples_ms):
+    """p50/p95/p99 (w ms) z listy pomiarów."""
+    if not samples_ms:
+        return {'p50': None, 'p95': None, 'p99': None}
+    if len(samples_ms) == 1:
+        value = round(samples_ms[0], 3)
+        return {'p50': value, 'p95': value, 'p99': value}
+    cuts = statistics.quantiles(samples_ms, n=100, method='inclusive')
+    return {'p50': round(cuts[49], 3), 'p95': round(cuts[94], 3), 'p99': round(cuts[98], 3)}
+
+
+def measure(func, iterations, warmup=1):
+    """
+    Wywołuje func() `iterations` razy. Zwraca czasy (ms), szczytową pamięć (KiB)
+    i wynik ostatniego wywołania. Pamięć mierzona w osobnym przebiegu (tracemalloc spowalnia).
+    """
+    result = None
+    for _ in range(warmup):
+        result = func()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return samples, round(peak / 1024, 1), result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _measured(row, metric):
+    # Starsze raporty trzymały też odpowiedzi spoza 2xx (np. 403) - ich czasy nie są porównywalne
+    return row is not None and row.get(metric) is not None and 200 <= row.get('status', 200) < 300
+
+
+def compare_reports(old, new, metric='p95'):
+    """Różnice między dwoma raportami benchmarku (te same klucze tras, tylko odpowiedzi 2xx)."""
+    rows = []
+    for name, current in new.get('routes', {}).items():
+        previous = old.get('routes', {}).get(name)
+        if not _measured(previous, metric) or not _measured(current, metric):
+            continue
+        change = (current[metric] - previous[metric]) / previous[metric] * 100 if previous[metric] else 0.0
+        rows.append({
+            'route': name, 'old': previous[metric], 'new': current[metric], 'change_pct': round(change, 1),
+            'queries_old': previous.get('queries'), 'queries_new': current.get('queries'),
+        })
+    return rows
+
+
+def run_concurrently(func, threads, iterations):
+    """
+    Uruchamia func() w `threads` wątkach, każdy `iterations` razy.
+    Zwraca listę (czas_ms, wynik) ze wszystkich wywołań.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from django.db import connections
+
+    def worker():
+        samples = []
+        try:
+            for _ in range(iterations):
+                start = time.perf_counter()
+                result = func()
+                samples.append(((time.perf_counter() - start) * 1000, result))
+        finally:
+            connections.close_all()
+        return samples
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [pool.submit(worker) for _ in range(threads)]
+        return [sample for future in futures for sample in future.result()]
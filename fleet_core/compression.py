@@ -0,0 +1,150 @@
+# fleet_core/compression.py
+
+import re
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+# brotli z requirements.txt - bez pakietu (okrojone środowisko) zostaje sam gzip
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+_ENCODING_RE = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*')
+
+# Typy już skompresowane (skany PDF/JPEG, archiwa) - druga kompresja tylko kosztuje CPU
+INCOMPRESSIBLE_TYPES = ('image/', 'video/', 'audio/', 'application/pdf', 'application/zip',
+                        'application/gzip', 'application/x-7z-compressed', 'font/woff')
+
+
+def accepted_encodings(header):
+    """Wagi z Accept-Encoding, np. {'gzip': 1.0, 'br': 0.8, 'identity': 0.0} (q=0 oznacza odmowę)."""
+    result = {}
+    for part in (header or '').split(','):
+        match = _ENCODING_RE.fullmatch(part)
+        if not match:
+            continue
+        try:
+            q = float(match.group(2)) if match.group(2) is not None else 1.0
+        except ValueError:
+            continue
+        result[match.group(1).lower()] = q
+    return result
+
+
+def choose_encoding(header):
+    """Brotli (gdy dostępny), potem gzip - według wag q klienta."""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get('*', 0)
+    candidates = []
+    if brotli is not None:
+        candidates.append(('br', accepted.get('br', wildcard)))
+    candidates.append(('gzip', accepted.get('gzip', wildcard)))
+    name, q = max(candidates, key=lambda item: item[1])  # max() zostawia pierwszy przy remisie -> br
+    return name if q > 0 else None
+
+
+class _Compressor:
+    """Wspólny interfejs dla gzip i brotli: process(chunk) + flush() (do strumieni) i finish()."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._impl = brotli.Compressor(quality=getattr(settings, 'FLEET_BROTLI_QUALITY', 5))
+        else:
+            # wbits=31 -> format gzip (nagłówek + CRC), nie surowy deflate
+            self._impl = zlib.compressobj(getattr(settings, 'FLEET_GZIP_LEVEL', 6), zlib.DEFLATED, 31)
+
+    def process(self, data):
+        if self.encoding == 'br':
+            return self._impl.process(data)
+        return self._impl.compress(data)
+
+    def flush(self):
+        if self.encoding == 'br':
+            return self._impl.flush()
+        return self._impl.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._impl.finish()
+        return self._impl.flush(zlib.Z_FINISH)
+
+
+def compress_bytes(data, encoding):
+    compressor = _Compressor(encoding)
+    return compressor.process(data) + compressor.finish()
+
+
+def compress_stream(chunks, encoding):
+    """Kompresja przyrostowa: każdy fragment wychodzi od razu (flush), klient nie czeka na całość."""
+    compressor = _Compressor(encoding)
+    for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+async def compress_async_stream(chunks, encoding):
+    compressor = _Compressor(encoding)
+    async for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    Kompresja odpowiedzi (br/gzip) wg Accept-Encoding, także dla StreamingHttpResponse (eksporty, listy
+    strumieniowane). Pomija odpowiedzi mniejsze niż FLEET_COMPRESS_MIN_BYTES, już zakodowane i typy
+    skompresowane z natury. Silny ETag zamieniamy na słaby (W/) - treść po kompresji nie jest już
+    bajt w bajt tą samą reprezentacją, ale nadal jest semantycznie równoważna (jak GZipMiddleware Django).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_bytes = getattr(settings, 'FLEET_COMPRESS_MIN_BYTES', 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not self._compressible(response):
+            return response
+
+        # Odpowiedź zależy od Accept-Encoding - także gdy tym razem nie kompresujemy
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compress_async_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compress_stream(response.streaming_content, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            if len(response.content) < self.min_bytes:
+                return response
+            compressed = compress_bytes(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def _compressible(response):
+        if response.has_header('Content-Encoding') or response.status_code in (204, 304):
+            return False
+        content_type = response.get('Content-Type', '').lower()
+        # text/event-stream: proxy buforują skompresowane SSE, a zdarzenia są małe
+        return not (content_type.startswith(INCOMPRESSIBLE_TYPES) or content_type.startswith('text/event-stream'))
@@ -0,0 +1,26 @@
+# fleet_core/db_profile.py
+
+from django.conf import settings
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Odbiornik connection_created: ustawia FLEET_SQLITE_PRAGMAS na nowym połączeniu SQLite
+    (profil produkcyjny: WAL, synchronous=NORMAL, busy_timeout, mmap_size, cache_size).
+    """
+    pragmas = getattr(settings, 'FLEET_SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def sqlite_pragma(connection, name):
+    """Bieżąca wartość PRAGMA (np. journal_mode) - do raportów benchmarku."""
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA {name}")
+        row = cursor.fetchone()
+    return row[0] if row else None
@@ -0,0 +1,118 @@
+# fleet_core/db_router.py
+
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Stan bieżącego żądania / bloku: None = baza główna, obiekt _ReadState = odczyty z repliki
+_read_state = contextvars.ContextVar('fleet_read_state', default=None)
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_KEY = 'fleet_core:replica_pin:{}'
+
+
+class _ReadState:
+    def __init__(self):
+        self.pinned = False  # po pierwszym zapisie w tym kontekście czytamy już z bazy głównej
+
+
+def replica_alias():
+    """Alias repliki albo None, gdy replika nie jest skonfigurowana."""
+    alias = getattr(settings, 'FLEET_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def read_from_replica():
+    """Odczyty w bloku idą do repliki (raporty, eksporty, komendy) - zapis przełącza z powrotem na główną."""
+    token = _read_state.set(_ReadState())
+    try:
+        yield
+    finally:
+        _read_state.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Odczyty -> replika tylko wewnątrz read_from_replica() (np. bezpieczne GET-y z ReplicaRoutingMiddleware),
+    wszystko inne -> 'default'. Otwarta transakcja albo zapis w tym samym kontekście wymusza bazę główną.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _read_state.get()
+        alias = replica_alias()
+        if state is None or state.pinned or alias is None:
+            return 'default'
+        if connections['default'].in_atomic_block:
+            return 'default'
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _read_state.get()
+        if state is not None:
+            state.pinned = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replika to kopia 'default' - obiekty z obu baz mogą się do siebie odwoływać
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != replica_alias()
+
+
+# --- READ-YOUR-WRITES (przypięcie użytkownika do bazy głównej po zapisie) ---
+
+def _user_key(request):
+    """Identyfikator użytkownika bez zapytania do bazy: claim z JWT albo id z sesji (panel admina)."""
+    if 'HTTP_AUTHORIZATION' in request.META:
+        from .authentication import ClaimsJWTAuthentication
+        auth = ClaimsJWTAuthentication()
+        try:
+            raw = auth.get_raw_token(auth.get_header(request))
+            if raw is not None:
+                return str(auth.get_validated_token(raw).get('user_id'))
+        except Exception:
+            return None
+    session = getattr(request, 'session', None)
+    return session.get('_auth_user_id') if session is not None else None
+
+
+def pin_to_primary(user_key):
+    seconds = getattr(settings, 'FLEET_REPLICA_STICKY_SECONDS', 10)
+    cache.set(PIN_KEY.format(user_key), True, seconds)
+
+
+def is_pinned(user_key):
+    return bool(cache.get(PIN_KEY.format(user_key)))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Bezpieczne żądania (GET/HEAD/OPTIONS) czytają z repliki, zapisy idą do bazy głównej.
+    Po zapisie użytkownik przez FLEET_REPLICA_STICKY_SECONDS czyta z głównej (read-your-writes),
+    żeby nie zobaczyć stanu sprzed własnej zmiany, zanim replika ją dogoni.
+    Przypięcia trzymamy w cache Django - przy wielu workerach musi to być cache współdzielony.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if replica_alias() is None:
+            return self.get_response(request)
+
+        user_key = _user_key(request)
+        if request.method in SAFE_METHODS and not (user_key and is_pinned(user_key)):
+            with read_from_replica():
+                response = self.get_response(request)
+                wrote = _read_state.get().pinned  # GET, który jednak coś zapisał (np. get_or_create)
+        else:
+            response = self.get_response(request)
+            wrote = request.method not in SAFE_METHODS
+        if user_key and wrote:
+            pin_to_primary(user_key)
+        return response
@@ -0,0 +1,241 @@
+# fleet_core/events.py
+
+import asyncio
+import json
+import threading
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Rodzaje zdarzeń (pole 'type') i ścieżki API, z których klient pobiera zmieniony wiersz
+EVENT_RESERVATION = 'reservation'
+EVENT_HANDOVER = 'handover'
+EVENT_DAMAGE = 'damage_event'
+DETAIL_PATHS = {
+    EVENT_RESERVATION: '/api/reservations/{}/',
+    EVENT_HANDOVER: '/api/handovers/{}/',
+    EVENT_DAMAGE: '/api/damage_events/{}/',
+}
+
+# id - numer kolejny (Last-Event-ID); roles / user_ids - kto może zdarzenie dostać
+Event = namedtuple('Event', 'id payload roles user_ids')
+
+
+class Subscription:
+    """Kolejka zdarzeń jednego połączenia SSE (żyje w pętli asyncio tego połączenia)."""
+
+    def __init__(self, role, user_id, loop, max_queue):
+        self.role = role
+        self.user_id = str(user_id) if user_id is not None else None
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+        self.start_id = 0  # numer ostatniego zdarzenia w chwili subskrypcji
+        self._held = None  # zdarzenia na żywo wstrzymane, dopóki subscribe() nie wstawi zaległych
+        self._held_lock = threading.Lock()
+
+    def matches(self, event):
+        return self.role in event.roles or (self.user_id is not None and self.user_id in event.user_ids)
+
+    def _put(self, event):
+        # Wywoływane w pętli subskrybenta (call_soon_threadsafe)
+        with self._held_lock:
+            if self._held is not None:
+                self._held.append(event)
+            else:
+                self._enqueue(event)
+
+    def _release(self, missed, complete):
+        """Zaległe zdarzenia z bufora, po nich wstrzymane na żywo - kolejność jak przy publikacji."""
+        with self._held_lock:
+            self.overflowed = not complete
+            for event in missed + self._held:
+                self._enqueue(event)
+            self._held = None
+
+    def _enqueue(self, event):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Klient nie nadąża - zamiast gubić zdarzenia po cichu każemy mu odświeżyć listy
+            self.overflowed = True
+
+
+class LazyUserIds:
+    """
+    Konta-odbiorcy liczone dopiero przy pierwszym sprawdzeniu (np. zapytania do bazy) i zapamiętane.
+    Zdarzenie dopasowane po roli nie sprawdza kont - bez słuchających kierowców lista nic nie kosztuje.
+    Może pytać bazę, więc w kodzie async sprawdzać przez sync_to_async.
+    """
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+        self._ids = None
+
+    def _get(self):
+        if self._ids is None:
+            self._ids = frozenset(str(pk) for pk in self._resolve() if pk)
+        return self._ids
+
+    def __contains__(self, user_id):
+        return user_id in self._get()
+
+    def __iter__(self):
+        return iter(self._get())
+
+
+class LocalBackend:
+    """
+    Rozsyłanie tylko w obrębie procesu. Przy wielu workerach zastępuje je backend z tym samym interfejsem
+    (np. Redis pub/sub): publish(event) wysyła do wszystkich procesów, a każdy proces woła deliver(event).
+    """
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, event):
+        self.deliver(event)
+
+
+class Broadcaster:
+    """
+    Fan-out zdarzeń o zmianach do połączeń SSE (/api/events/). Publikacja jest synchroniczna (sygnały,
+    po commicie), odbiór - w pętlach asyncio połączeń. Ostatnie zdarzenia trzymamy w buforze, żeby
+    klient po zerwaniu połączenia dostał to, co go ominęło (nagłówek Last-Event-ID).
+    """
+
+    def __init__(self, backend=None):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._recent = deque(maxlen=getattr(settings, 'FLEET_EVENTS_BUFFER', 1000))
+        self._last_id = 0
+        self._backend = backend
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            backend_class = import_string(getattr(settings, 'FLEET_EVENTS_BACKEND', 'fleet_core.events.LocalBackend'))
+            self._backend = backend_class(self.deliver)
+        return self._backend
+
+    def publish(self, kind, object_id, action, roles=(), user_ids=(), **extra):
+        """user_ids - lista id kont albo funkcja, która ją zwróci (liczona leniwie, LazyUserIds)."""
+        payload = {'type': kind, 'id': object_id, 'action': action, 'url': DETAIL_PATHS[kind].format(object_id),
+                   **extra}
+        with self._lock:
+            self._last_id += 1
+            event_id = self._last_id
+        if callable(user_ids):
+            user_ids = LazyUserIds(user_ids)
+            # Backend spoza procesu (np. Redis) wysyła zdarzenie dalej - odbiorców trzeba znać od razu
+            if not isinstance(self.backend, LocalBackend):
+                user_ids = frozenset(user_ids)
+        else:
+            user_ids = frozenset(str(pk) for pk in user_ids if pk)
+        event = Event(event_id, payload, frozenset(roles), user_ids)
+        self.backend.publish(event)
+        return event
+
+    def deliver(self, event):
+        with self._lock:
+            self._recent.append(event)
+            subscribers = list(self._subscribers)
+        # Dopasowanie poza blokadą - LazyUserIds może pytać bazę
+        for subscription in subscribers:
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._put, event)
+            except RuntimeError:  # pętla połączenia już zamknięta
+                self.unsubscribe(subscription)
+
+    def subscribe(self, role, user_id, last_event_id=None, loop=None):
+        """Nowa subskrypcja; z last_event_id - od razu z zaległymi zdarzeniami z bufora."""
+        subscription = Subscription(role, user_id, loop or asyncio.get_running_loop(),
+                                    getattr(settings, 'FLEET_EVENTS_QUEUE', 100))
+        with self._lock:
+            subscription.start_id = self._last_id
+            if last_event_id is not None:
+                subscription._held = []
+                recent, last_id = list(self._recent), self._last_id
+            self._subscribers.add(subscription)
+        if last_event_id is not None:
+            # Dopasowanie poza blokadą (jak w deliver) - LazyUserIds może pytać bazę, a publish czeka na blokadę
+            subscription._release(*self._missed(subscription, last_event_id, recent, last_id))
+        return subscription
+
+    def replay(self, role, user_id, last_event_id):
+        """Zaległe zdarzenia bez subskrypcji: (lista, czy bufor je wszystkie jeszcze miał)."""
+        with self._lock:
+            recent, last_id = list(self._recent), self._last_id
+        return self._missed(Subscription(role, user_id, None, 0), last_event_id, recent, last_id)
+
+    @staticmethod
+    def _missed(subscription, last_event_id, recent, last_id):
+        """Filtr migawki bufora (recent, last_id) zrobionej pod blokadą - samo dopasowanie już bez niej."""
+        missed = [e for e in recent if e.id > last_event_id and subscription.matches(e)]
+        # Najstarsze zdarzenie w buforze nowsze niż następne po last_event_id - część wypadła;
+        # id większe niż ostatnie wydane - proces został zrestartowany (numeracja od nowa)
+        complete = last_event_id <= last_id and (not recent or recent[0].id <= last_event_id + 1)
+        return missed, complete
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+
+broadcaster = Broadcaster()
+
+
+def format_sse(event=None, name=None, data=None, comment=None):
+    """Jedna wiadomość w formacie text/event-stream."""
+    if comment is not None:
+        return f": {comment}\n\n".encode()
+    lines = []
+    if event is not None:
+        lines.append(f"id: {event.id}")
+        name, data = event.payload['type'], event.payload
+    lines.append(f"event: {name}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+def format_preamble(last_id=None):
+    """Czas ponownego połączenia i bieżący numer zdarzenia - EventSource odeśle go w Last-Event-ID."""
+    retry = f"retry: {getattr(settings, 'FLEET_EVENTS_RETRY_MS', 3000)}\n"
+    return (retry + (f"id: {last_id}\n" if last_id is not None else '') + '\n').encode()
+
+
+RESYNC = {'detail': 'Zdarzenia pominięte - odśwież listy.'}
+
+
+async def stream(subscription, resumed=False, heartbeat=None):
+    """Strumień SSE dla subskrypcji: zdarzenia, co heartbeat sekund komentarz (proxy nie zamyka połączenia)."""
+    heartbeat = heartbeat or getattr(settings, 'FLEET_EVENTS_HEARTBEAT', 15)
+    try:
+        # Przy wznowieniu numer przyjdzie z zaległymi zdarzeniami
+        yield format_preamble(None if resumed else subscription.start_id)
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                subscription.overflowed = False
+                yield format_sse(name='resync', data=RESYNC)
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield format_sse(comment='ping')
+                continue
+            yield format_sse(event)
+    finally:
+        # Rozłączenie klienta (anulowanie generatora przez serwer ASGI)
+        broadcaster.unsubscribe(subscription)
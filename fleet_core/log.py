@@ -0,0 +1,125 @@
+# fleet_core/log.py
+
+import atexit
+import contextvars
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import uuid
+
+# Identyfikator bieżącego żądania (ustawiany przez RequestIdMiddleware)
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Standardowe atrybuty LogRecord - wszystko inne traktujemy jako pola z `extra`
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestIdFilter(logging.Filter):
+    """Dokleja request_id do każdego rekordu (korelacja logów jednego żądania)."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Próbkowanie per logger: rates={'fleet_core.views': 0.1} przepuszcza ~10% rekordów
+    tego loggera (i jego dzieci). WARNING i wyżej przechodzą zawsze.
+    """
+
+    def __init__(self, rates=None, default=1.0):
+        super().__init__()
+        self.rates = sorted((rates or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.default = default
+
+    def rate_for(self, name):
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + '.'):
+                return rate
+        return self.default
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """Jeden rekord = jedna linia JSON (czas, poziom, logger, wiadomość, request_id, pola z extra)."""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.datetime.fromtimestamp(record.created, tz=datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class QueueingHandler(logging.handlers.QueueHandler):
+    """
+    Handler nieblokujący: wątek żądania tylko wrzuca rekord do kolejki,
+    a zapis (stdout / plik) wykonuje QueueListener w osobnym wątku.
+    """
+
+    def __init__(self, stream=None, filename=None, max_bytes=10 * 1024 * 1024, backup_count=5, maxsize=10000):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        if filename:
+            target = logging.handlers.RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count,
+                                                          encoding='utf-8')
+        else:
+            target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JsonFormatter())
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.listener.stop)
+
+    def prepare(self, record):
+        # Wiadomość i wyjątek formatujemy tutaj - args/exc_info mogą nie przetrwać przekazania do wątku
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Przepełniona kolejka nie może blokować żądania - rekord przepada
+            pass
+
+
+class RequestIdMiddleware:
+    """Ustawia request_id (z nagłówka X-Request-ID lub nowy) i odsyła go w odpowiedzi."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_id = (request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64]
+        token = request_id_var.set(request_id)
+        try:
+            request.request_id = request_id
+            response = self.get_response(request)
+        finally:
+            request_id_var.reset(token)
+        response['X-Request-ID'] = request_id
+        return response
@@ -0,0 +1,31 @@
+# fleet_core/management/commands/archive_history.py
+
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from fleet_core.archive import archive_history, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = (
+        "Przenosi zamknięte wydania i zakończone/odrzucone rezerwacje starsze niż FLEET_ARCHIVE_AFTER_DAYS "
+        "do tabel archiwum (uruchamiać np. raz w tygodniu z crona)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Nadpisuje FLEET_ARCHIVE_AFTER_DAYS.")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--dry-run', action='store_true', help="Tylko policz wiersze do przeniesienia.")
+
+    def handle(self, *args, **opts):
+        if opts['days'] is None:
+            cutoff = archive_cutoff()
+        else:
+            cutoff = datetime.date.today() - datetime.timedelta(days=opts['days'])
+        result = archive_history(cutoff=cutoff, batch_size=opts['batch_size'], dry_run=opts['dry_run'])
+        summary = f"wydania: {result['handovers']}, rezerwacje: {result['reservations']} (sprzed {cutoff})."
+        if opts['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Próba - do archiwum trafiłyby {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Przeniesiono do archiwum {summary}"))
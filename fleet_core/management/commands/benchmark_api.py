@@ -0,0 +1,158 @@
+# fleet_core/management/commands/benchmark_api.py
+
+import datetime
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from fleet_core.authentication import FleetRefreshToken
+from fleet_core.benchmark import measure, percentiles, git_revision, compare_reports
+from fleet_core.models import CustomUser
+from fleet_core.urls import router
+
+BENCH_USERNAME = 'bench_{role}'
+BENCH_PASSWORD = 'bench-password'
+
+# Trasy pominięte, bo zmieniają dane przy każdym wywołaniu
+SKIPPED_ROUTES = {'register'}
+
+# Akcje POST mierzone bez zapisu: (parametry url, dane). Pozostałe metody zapisujące są pomijane.
+SAFE_POST_ACTIONS = {
+    'driver-onboard': ('?dry_run=1', {'rows': [{'username': 'bench_onboard', 'password': BENCH_PASSWORD}]}),
+    'handover-reprice': ('', {}),  # bez ?apply=1 tylko raport różnic
+    'reservation-auto-assign': ('', {}),  # bez ?apply=1 tylko propozycja
+}
+
+
+def bench_user(role):
+    user, created = CustomUser.objects.get_or_create(
+        username=BENCH_USERNAME.format(role=role.lower()), defaults={'rola': role}
+    )
+    if created or not user.check_password(BENCH_PASSWORD):
+        user.set_password(BENCH_PASSWORD)
+        user.save()
+    return user
+
+
+def collect_routes(today):
+    """
+    Lista (nazwa, metoda, url, dane) dla każdej trasy z fleet_core/urls.py i /metrics:
+    list/detail z routera, akcje @action (metody z ich mapowania) oraz ścieżki spoza routera.
+    Dane - parametry GET albo ciało POST; login dostaje dane logowania w Command.
+    """
+    params = {
+        'availability': {'start': today.isoformat(), 'end': (today + datetime.timedelta(days=7)).isoformat()},
+    }
+    routes = []
+    for prefix, viewset, basename in router.registry:
+        model = viewset.serializer_class.Meta.model
+        sample_pk = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+        routes.append((f"{basename}-list", 'get', reverse(f"{basename}-list"), None))
+        if sample_pk is not None:
+            routes.append((f"{basename}-detail", 'get', reverse(f"{basename}-detail", args=[sample_pk]), None))
+        for extra in viewset.get_extra_actions():
+            name = f"{basename}-{extra.url_name}"
+            if extra.detail:
+                if sample_pk is None:
+                    continue
+                url = reverse(name, args=[sample_pk])
+            else:
+                url = reverse(name)
+            if 'get' in extra.mapping:
+                routes.append((name, 'get', url, params.get(extra.url_path)))
+            elif 'post' in extra.mapping and name in SAFE_POST_ACTIONS:
+                query, payload = SAFE_POST_ACTIONS[name]
+                routes.append((name, 'post', url + query, payload))
+
+    routes.append(('login', 'post', reverse('login'), None))
+    routes.append(('mobile-app', 'get', reverse('mobile-app'), None))
+    routes.append(('search', 'get', reverse('search'), {'q': 'Nowak'}))
+    routes.append(('autocomplete', 'get', reverse('autocomplete'), {'q': 'SY0'}))
+    routes.append(('sync', 'get', reverse('sync'), None))
+    routes.append(('events', 'get', reverse('events'), None))
+    routes.append(('metrics', 'get', reverse('metrics'), None))
+    return routes
+
+
+class Command(BaseCommand):
+    help = "Benchmark wszystkich tras fleet_core (p50/p95/p99, liczba zapytań, pamięć) -> JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        # ADMIN ma dostęp do wszystkich tras - przy węższej roli trasy z odmową trafiają do 'failed'
+        parser.add_argument('--role', default='ADMIN', choices=[r for r, _ in CustomUser.ROLA_CHOICES])
+        parser.add_argument('--only', nargs='*', help="Nazwy tras do uruchomienia (np. vehicle-list).")
+        parser.add_argument('--output', default='bench_output.json')
+        parser.add_argument('--compare', help="Poprzedni raport JSON do porównania.")
+
+    def handle(self, *args, **opts):
+        user = bench_user(opts['role'])
+        client = APIClient()
+        client.force_authenticate(user)
+        login_payload = {'username': user.username, 'password': BENCH_PASSWORD, 'pin_2fa': '1234'}
+        # Widoki spoza DRF nie widzą force_authenticate: /api/events/ - token JWT, /metrics - FLEET_METRICS_TOKEN
+        headers = {'events': {'HTTP_AUTHORIZATION': f"Bearer {FleetRefreshToken.for_user(user).access_token}"}}
+        if getattr(settings, 'FLEET_METRICS_TOKEN', None):
+            headers['metrics'] = {'HTTP_AUTHORIZATION': f"Bearer {settings.FLEET_METRICS_TOKEN}"}
+
+        report = {
+            'revision': git_revision(),
+            'created_at': timezone.now().isoformat(),
+            'role': opts['role'],
+            'iterations': opts['iterations'],
+            'routes': {},
+            'failed': {},  # trasy z odpowiedzią spoza 2xx - bez czasów, żeby nie mieszać ich z pomiarami
+        }
+
+        for name, method, url, data in collect_routes(datetime.date.today()):
+            if name in SKIPPED_ROUTES or (opts['only'] and name not in opts['only']):
+                continue
+            if method == 'post':
+                payload = login_payload if name == 'login' else data
+                call = lambda url=url, payload=payload: client.post(url, payload, format='json')
+            else:
+                call = lambda url=url, data=data, extra=headers.get(name, {}): client.get(url, data, **extra)
+
+            samples, peak_kib, response = measure(call, opts['iterations'])
+            if not 200 <= response.status_code < 300:
+                report['failed'][name] = {'url': url, 'method': method.upper(), 'status': response.status_code}
+                self.stdout.write(self.style.WARNING(
+                    f"{name:40} {response.status_code}  pominięto - odpowiedź spoza 2xx (rola {opts['role']})"
+                ))
+                continue
+            report['routes'][name] = {
+                'url': url, 'method': method.upper(), 'status': response.status_code,
+                **percentiles(samples),
+                'queries': int(response['X-DB-Queries']) if response.has_header('X-DB-Queries') else None,
+                'db_time_ms': float(response['X-DB-Time']) if response.has_header('X-DB-Time') else None,
+                'bytes': len(response.content) if not response.streaming else None,
+                'peak_memory_kib': peak_kib,
+            }
+            row = report['routes'][name]
+            self.stdout.write(
+                f"{name:40} {row['status']}  p50={row['p50']:>9.2f} ms  p95={row['p95']:>9.2f} ms  "
+                f"p99={row['p99']:>9.2f} ms  q={row['queries']}  mem={peak_kib} KiB"
+            )
+
+        with open(opts['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Raport zapisany: {opts['output']}"))
+
+        if opts['compare']:
+            try:
+                with open(opts['compare'], encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Nie można wczytać raportu {opts['compare']}: {e}")
+            self.stdout.write(f"\nPorównanie z {previous.get('revision')} (p95):")
+            for row in compare_reports(previous, report):
+                self.stdout.write(
+                    f"{row['route']:40} {row['old']:>9.2f} -> {row['new']:>9.2f} ms ({row['change_pct']:+.1f}%)  "
+                    f"q {row['queries_old']} -> {row['queries_new']}"
+                )
+            if report['failed']:
+                self.stdout.write(f"Bez porównania (odpowiedź spoza 2xx): {', '.join(report['failed'])}")
@@ -0,0 +1,150 @@
+# fleet_core/management/commands/benchmark_db.py
+
+import json
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction, OperationalError
+from django.utils import timezone
+
+from fleet_core.benchmark import percentiles, git_revision, compare_reports
+from fleet_core.db_profile import sqlite_pragma
+from fleet_core.models import Vehicle
+
+BENCH_VIN_PREFIX = 'BENCHDB'
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark bazy: równoległe odczyty i zapisy przez zadany czas (operacje/s, p95, błędy blokad) -> JSON. "
+        "Porównanie profili: FLEET_DB_PROFILE=dev ... --output a.json, potem "
+        "FLEET_DB_PROFILE=production ... --compare a.json"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=10.0)
+        parser.add_argument('--vehicles', type=int, default=200,
+                            help=f"Liczba pojazdów testowych ({BENCH_VIN_PREFIX}...), usuwanych po pomiarze.")
+        parser.add_argument('--reset-journal', action='store_true',
+                            help="SQLite: przed startem wróć do journal_mode=DELETE (punkt odniesienia).")
+        parser.add_argument('--output', default='bench_db.json')
+        parser.add_argument('--compare', help="Poprzedni raport JSON do porównania.")
+
+    def handle(self, *args, **opts):
+        if opts['reset_journal'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode = DELETE")
+        vehicle_ids = self._create_vehicles(opts['vehicles'])
+        try:
+            report = self._run(vehicle_ids, opts)
+        finally:
+            self._delete_vehicles()
+
+        with open(opts['output'], 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS(f"Raport zapisany: {opts['output']}"))
+
+        if opts['compare']:
+            try:
+                with open(opts['compare'], encoding='utf-8') as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Nie można wczytać raportu {opts['compare']}: {e}")
+            self.stdout.write(f"\nPorównanie z profilem {previous.get('profile')} ({previous.get('journal_mode')}):")
+            for metric in ('ops_per_s', 'p95'):
+                for row in compare_reports(previous, report, metric=metric):
+                    self.stdout.write(
+                        f"{row['route']:6} {metric:9} {row['old']:>9} -> {row['new']:>9} ({row['change_pct']:+.1f}%)"
+                    )
+
+    def _run(self, vehicle_ids, opts):
+        connections.close_all()  # wątki i tak otwierają własne połączenia - startujemy z czystym stanem
+
+        stop = threading.Event()
+        results = {'read': [], 'write': []}
+        errors = {'read': 0, 'write': 0}
+        lock = threading.Lock()
+
+        # Tylko pojazdy testowe - pomiar nie dotyka danych użytkowników (uwagi, row_version, cache)
+        bench = Vehicle.objects.filter(vin__startswith=BENCH_VIN_PREFIX)
+
+        def read():
+            list(bench.select_related('company').order_by('id').values(
+                'id', 'registration_number', 'status', 'company__nazwa'
+            )[:50])
+
+        def write(rng):
+            with transaction.atomic():
+                bench.filter(pk=rng.choice(vehicle_ids)).update(uwagi=f"benchmark {time.time()}")
+
+        def worker(kind, seed):
+            rng = random.Random(seed)
+            samples, failed = [], 0
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    try:
+                        read() if kind == 'read' else write(rng)
+                    except OperationalError:
+                        failed += 1  # "database is locked"
+                        continue
+                    samples.append((time.perf_counter() - start) * 1000)
+            finally:
+                connections.close_all()
+            with lock:
+                results[kind].extend(samples)
+                errors[kind] += failed
+
+        threads = [threading.Thread(target=worker, args=('read', i)) for i in range(opts['readers'])]
+        threads += [threading.Thread(target=worker, args=('write', 1000 + i)) for i in range(opts['writers'])]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(opts['seconds'])
+        stop.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        report = {
+            'revision': git_revision(),
+            'created_at': timezone.now().isoformat(),
+            'profile': getattr(settings, 'FLEET_DB_PROFILE', 'dev'),
+            'vendor': connection.vendor,
+            'journal_mode': sqlite_pragma(connection, 'journal_mode'),
+            'readers': opts['readers'], 'writers': opts['writers'], 'seconds': round(elapsed, 2),
+            'routes': {},
+        }
+        for kind in ('read', 'write'):
+            samples = results[kind]
+            report['routes'][kind] = {
+                'ops': len(samples), 'ops_per_s': round(len(samples) / elapsed, 1), 'errors': errors[kind],
+                **percentiles(samples),
+            }
+            row = report['routes'][kind]
+            self.stdout.write(
+                f"{kind:6} {row['ops_per_s']:>9.1f} op/s  p50={row['p50']} ms  p95={row['p95']} ms  "
+                f"p99={row['p99']} ms  błędy={row['errors']}"
+            )
+        self.stdout.write(f"profil={report['profile']}  journal_mode={report['journal_mode']}")
+        return report
+
+    def _create_vehicles(self, count):
+        self._delete_vehicles()  # pozostałości po przerwanym przebiegu
+        Vehicle.objects.bulk_create(
+            Vehicle(vin=f"{BENCH_VIN_PREFIX}{i:010d}", registration_number=f"BD{i:05d}") for i in range(count)
+        )
+        self.stdout.write(f"Dodano {count} pojazdów testowych ({BENCH_VIN_PREFIX}...).")
+        # MySQL nie zwraca kluczy z bulk_create - identyfikatory czytamy ponownie
+        return list(Vehicle.objects.filter(vin__startswith=BENCH_VIN_PREFIX).values_list('id', flat=True))
+
+    def _delete_vehicles(self):
+        # delete() przez model - sygnały zostawiają tombstone'y sync i unieważniają cache odpowiedzi
+        deleted, _ = Vehicle.objects.filter(vin__startswith=BENCH_VIN_PREFIX).delete()
+        if deleted:
+            self.stdout.write(f"Usunięto pojazdy testowe ({BENCH_VIN_PREFIX}...).")
@@ -0,0 +1,66 @@
+# fleet_core/management/commands/benchmark_login.py
+
+import threading
+
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from fleet_core.benchmark import percentiles, run_concurrently
+from fleet_core.management.commands.benchmark_api import bench_user, BENCH_PASSWORD
+
+
+class Command(BaseCommand):
+    help = "Benchmark: równoległe logowania (PBKDF2 w puli) vs równoległe odczyty z tokenem."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=50, help="Liczba wątków logujących.")
+        parser.add_argument('--readers', type=int, default=8, help="Liczba wątków czytających.")
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--read-route', default='reservation-list')
+
+    def handle(self, *args, **opts):
+        user = bench_user('LOGISTYKA')
+        token = APIClient().post(
+            reverse('login'), {'username': user.username, 'password': BENCH_PASSWORD, 'pin_2fa': '1234'},
+            format='json',
+        ).json()['access']
+        read_url = reverse(opts['read_route'])
+        local = threading.local()
+
+        def read():
+            if not hasattr(local, 'client'):
+                local.client = APIClient(HTTP_AUTHORIZATION=f"Bearer {token}")
+            return local.client.get(read_url).status_code
+
+        def login():
+            return APIClient().post(
+                reverse('login'), {'username': user.username, 'password': BENCH_PASSWORD, 'pin_2fa': '1234'},
+                format='json',
+            ).status_code
+
+        self.stdout.write("1) Same odczyty (bez logowań)")
+        baseline = run_concurrently(read, opts['readers'], opts['iterations'])
+        self._report('odczyty', baseline)
+
+        self.stdout.write(f"2) Odczyty w trakcie {opts['logins']} równoległych logowań")
+        results = {}
+        storm = threading.Thread(
+            target=lambda: results.setdefault('logins', run_concurrently(login, opts['logins'], opts['iterations']))
+        )
+        storm.start()
+        results['reads'] = run_concurrently(read, opts['readers'], opts['iterations'])
+        storm.join()
+        self._report('odczyty', results['reads'])
+        self._report('logowania', results['logins'])
+
+    def _report(self, label, samples):
+        times = [t for t, _ in samples]
+        statuses = {}
+        for _, status in samples:
+            statuses[status] = statuses.get(status, 0) + 1
+        p = percentiles(times)
+        self.stdout.write(
+            f"   {label:10} n={len(samples):5}  p50={p['p50']} ms  p95={p['p95']} ms  p99={p['p99']} ms  "
+            f"statusy={statuses}"
+        )
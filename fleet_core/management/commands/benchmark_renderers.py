@@ -0,0 +1,53 @@
+# fleet_core/management/commands/benchmark_renderers.py
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from fleet_core.benchmark import measure, percentiles
+from fleet_core.models import Vehicle, VehicleHandover
+from fleet_core.renderers import OrjsonRenderer, MessagePackRenderer, orjson, msgpack
+from fleet_core.serializers import VehicleDto, VehicleHandoverDto
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark rendererów (DRF JSONRenderer vs orjson vs MessagePack) na dużych listach "
+        "VehicleDto/VehicleHandoverDto - dane z seed_fleet."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=5000, help="Maksymalna liczba wierszy na listę.")
+
+    def handle(self, *args, **opts):
+        lists = {
+            'vehicles': VehicleDto(Vehicle.objects.select_related('company')[:opts['limit']], many=True).data,
+            'handovers': VehicleHandoverDto(
+                VehicleHandover.objects.select_related('kierowca__user', 'kierowca__company', 'pojazd')[:opts['limit']],
+                many=True,
+            ).data,
+        }
+        if not any(lists.values()):
+            raise CommandError("Brak danych - uruchom najpierw: manage.py seed_fleet")
+
+        renderers = [('drf-json', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', OrjsonRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING("orjson nie jest zainstalowany - pomijam."))
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING("msgpack nie jest zainstalowany - pomijam."))
+
+        for name, data in lists.items():
+            self.stdout.write(f"{name} ({len(data)} wierszy)")
+            baseline = None
+            for label, renderer in renderers:
+                samples, peak_kib, body = measure(lambda: renderer.render(data), opts['iterations'])
+                p = percentiles(samples)
+                baseline = baseline or p['p50']
+                self.stdout.write(
+                    f"   {label:9} p50={p['p50']:>9.2f} ms  p95={p['p95']:>9.2f} ms  "
+                    f"x{baseline / p['p50']:.1f}  rozmiar={len(body) / 1024:.0f} KiB  mem={peak_kib} KiB"
+                )
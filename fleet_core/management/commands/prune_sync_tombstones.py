@@ -0,0 +1,16 @@
+# fleet_core/management/commands/prune_sync_tombstones.py
+
+from django.core.management.base import BaseCommand
+
+from fleet_core.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = (
+        "Usuwa ślady usuniętych obiektów starsze niż FLEET_SYNC_TOMBSTONE_DAYS "
+        "(klient z tak starym tokenem i tak dostaje pełną synchronizację). Do uruchamiania z crona."
+    )
+
+    def handle(self, *args, **opts):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Usunięto śladów: {deleted}."))
@@ -0,0 +1,19 @@
+# fleet_core/management/commands/rebuild_search_index.py
+
+from django.core.management.base import BaseCommand
+
+from fleet_core.search import rebuild_index, ENTITIES
+
+
+class Command(BaseCommand):
+    help = "Przebudowuje indeks wyszukiwarki (FTS5 / MySQL FULLTEXT) - np. po imporcie bulk_create."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity', nargs='*', choices=ENTITIES, default=list(ENTITIES))
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **opts):
+        counts = rebuild_index(batch_size=opts['batch_size'], entities=opts['entity'])
+        for entity, total in counts.items():
+            self.stdout.write(f"  {entity}: {total}")
+        self.stdout.write(self.style.SUCCESS("Indeks wyszukiwarki przebudowany."))
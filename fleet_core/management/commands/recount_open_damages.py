@@ -0,0 +1,63 @@
+# fleet_core/management/commands/recount_open_damages.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from fleet_core.models import Vehicle, DamageEvent, OPEN_DAMAGE_STATUSES, next_row_version
+from fleet_core.response_cache import response_cache
+from fleet_core.signals import vehicle_status_expression
+
+
+def stale_status_ids():
+    """Id pojazdów, których status nie zgadza się z licznikiem szkód (np. NIESPRAWNY przy zerze)."""
+    return list(
+        Vehicle.objects.annotate(expected_status=vehicle_status_expression())
+        .exclude(status=F('expected_status'))
+        .values_list('id', flat=True)
+    )
+
+
+def recount_open_damages(batch_size=1000):
+    """
+    Przelicza Vehicle.open_damage_count jednym zapytaniem grupującym po szkodach i zapisuje tylko
+    pojazdy, w których licznik się rozjechał, a potem status pojazdów, które nie zgadzają się z licznikiem.
+    Zwraca liczbę poprawionych pojazdów.
+    """
+    counts = dict(
+        DamageEvent.objects.filter(status_naprawy__in=OPEN_DAMAGE_STATUSES)
+        .values_list('pojazd_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+
+    drifted = []
+    for vehicle in Vehicle.objects.only('id', 'open_damage_count').iterator(chunk_size=batch_size):
+        expected = counts.get(vehicle.id, 0)
+        if vehicle.open_damage_count != expected:
+            vehicle.open_damage_count = expected
+            drifted.append(vehicle)
+
+    with transaction.atomic():
+        Vehicle.objects.bulk_update(drifted, ['open_damage_count'], batch_size=batch_size)
+        # Po poprawie liczników - status także tam, gdzie licznik był dobry, a status nie
+        repaired = sorted({v.id for v in drifted} | set(stale_status_ids()))
+        for start in range(0, len(repaired), batch_size):
+            Vehicle.objects.filter(id__in=repaired[start:start + batch_size]).update(
+                status=vehicle_status_expression(), row_version=next_row_version(), updated_at=timezone.now()
+            )
+        if repaired:
+            response_cache.invalidate_on_commit(Vehicle)
+    return len(repaired)
+
+
+class Command(BaseCommand):
+    help = "Naprawia zdenormalizowany licznik otwartych szkód (Vehicle.open_damage_count) i status pojazdów."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fixed = recount_open_damages(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Poprawiono liczniki szkód i statusy: {fixed} pojazdów."))
@@ -0,0 +1,49 @@
+# fleet_core/management/commands/reprice_handovers.py
+
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from fleet_core.pricing import reprice, select_handovers
+
+
+class Command(BaseCommand):
+    help = (
+        "Przelicza stawki i koszty wydań wg bieżących stawek (GlobalSettings + RateTier). "
+        "Domyślnie tylko raport różnic - zapis z --apply."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--open', action='store_true', help="Tylko wydania bez zwrotu.")
+        parser.add_argument('--from', dest='date_from', type=datetime.date.fromisoformat,
+                            help="Wydane od dnia (RRRR-MM-DD).")
+        parser.add_argument('--to', dest='date_to', type=datetime.date.fromisoformat,
+                            help="Wydane do dnia (RRRR-MM-DD).")
+        parser.add_argument('--vehicle', dest='vehicle_ids', type=int, action='append',
+                            help="Id pojazdu (można podać kilka razy).")
+        parser.add_argument('--fuel', action='store_true', help="Przelicz też dopłatę za brakujące paliwo.")
+        parser.add_argument('--apply', action='store_true', help="Zapisz zmiany (bez tego - próba).")
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--max-changes', type=int, default=None,
+                            help="Ile zmian wypisać (domyślnie FLEET_REPRICE_MAX_CHANGES).")
+
+    def handle(self, *args, **opts):
+        handovers = select_handovers(open_only=opts['open'], date_from=opts['date_from'], date_to=opts['date_to'],
+                                     vehicle_ids=opts['vehicle_ids'])
+        report = reprice(handovers, dry_run=not opts['apply'], fuel=opts['fuel'], batch_size=opts['batch_size'],
+                         max_changes=opts['max_changes'])
+        for change in report['changes']:
+            before, after = change['before'], change['after']
+            self.stdout.write(
+                f"#{change['id']} {change['registration_number']}: stawka {before['stawka_za_km']} -> "
+                f"{after['stawka_za_km']}, koszt {before['calkowity_koszt']} -> {after['calkowity_koszt']} "
+                f"({change['delta']:+})"
+            )
+        if report['changes_truncated']:
+            self.stdout.write(f"... i {report['changed'] - len(report['changes'])} kolejnych zmian.")
+        summary = (f"Sprawdzono {report['checked']}, do zmiany {report['changed']}, "
+                   f"suma {report['total_before']} -> {report['total_after']} PLN ({report['delta']:+}).")
+        if report['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Próba (bez zapisu). {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Zapisano. {summary}"))
@@ -0,0 +1,290 @@
+# fleet_core/management/commands/seed_fleet.py
+
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from fleet_core.models import (
+    FleetCompany, CustomUser, Vehicle, Driver, VehicleHandover, Reservation,
+    DamageEvent, ServiceEvent, InsurancePolicy, VehicleDocument, OdometerReading, FUEL_TYPES
+)
+from fleet_core.management.commands.recount_open_damages import recount_open_damages
+from fleet_core.search import rebuild_index
+
+# Prefiksy, po których rozpoznajemy dane syntetyczne (--flush usuwa tylko je)
+SYNTHETIC_USER_PREFIX = 'syn_'
+SYNTHETIC_VIN_PREFIX = 'SYN'
+SYNTHETIC_COMPANY_PREFIX = 'SYN '
+SYNTHETIC_PASSWORD = 'synthetic'
+
+MARKI = [
+    ('Toyota', ['Corolla', 'Yaris', 'RAV4', 'Proace']),
+    ('Skoda', ['Octavia', 'Superb', 'Fabia', 'Kodiaq']),
+    ('Volkswagen', ['Golf', 'Passat', 'Crafter', 'Transporter']),
+    ('Ford', ['Focus', 'Transit', 'Mondeo', 'Kuga']),
+    ('Mercedes', ['Sprinter', 'Actros', 'Vito', 'Citaro']),
+]
+IMIONA = ['Jan', 'Anna', 'Piotr', 'Katarzyna', 'Marek', 'Ewa', 'Tomasz', 'Agnieszka', 'Paweł', 'Magda']
+NAZWISKA = ['Nowak', 'Kowalski', 'Wiśniewski', 'Wójcik', 'Kamiński', 'Lewandowski', 'Zieliński', 'Szymański']
+UBEZPIECZYCIELE = ['PZU', 'Warta', 'Allianz', 'Ergo Hestia', 'Generali']
+
+
+class Command(BaseCommand):
+    help = "Generuje powtarzalną, syntetyczną flotę (bulk_create) do testów wydajności."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--companies', type=int, default=50)
+        parser.add_argument('--vehicles', type=int, default=10_000)
+        parser.add_argument('--drivers', type=int, default=50_000)
+        parser.add_argument('--handovers', type=int, default=1_000_000)
+        parser.add_argument('--reservations', type=int, default=500_000)
+        parser.add_argument('--damages', type=int, default=50_000)
+        parser.add_argument('--services', type=int, default=50_000)
+        parser.add_argument('--policies', type=int, default=20_000)
+        parser.add_argument('--documents', type=int, default=20_000)
+        parser.add_argument('--readings', type=int, default=200_000, help="Odczyty licznika (OdometerReading).")
+        parser.add_argument('--days', type=int, default=3 * 365, help="Zakres dat wstecz od dzisiaj.")
+        parser.add_argument('--batch-size', type=int, default=5_000)
+        parser.add_argument('--flush', action='store_true', help="Usuń wcześniejsze dane syntetyczne.")
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts['seed'])
+        self.batch_size = opts['batch_size']
+        self.today = datetime.date.today()
+        self.days = opts['days']
+
+        if opts['flush']:
+            self.flush()
+
+        company_ids = self.seed_companies(opts['companies'])
+        vehicle_ids = self.seed_vehicles(opts['vehicles'], company_ids)
+        driver_ids = self.seed_drivers(opts['drivers'], company_ids)
+        self.seed_handovers(opts['handovers'], vehicle_ids, driver_ids)
+        self.seed_reservations(opts['reservations'], vehicle_ids, driver_ids)
+        self.seed_damages(opts['damages'], vehicle_ids)
+        self.seed_services(opts['services'], vehicle_ids)
+        self.seed_policies(opts['policies'], vehicle_ids)
+        self.seed_documents(opts['documents'], vehicle_ids)
+        self.seed_readings(opts['readings'], vehicle_ids)
+
+        # bulk_create omija sygnały - liczniki szkód przeliczamy na końcu
+        recount_open_damages()
+        # bulk_create omija sygnały - indeks wyszukiwarki budujemy od zera
+        rebuild_index(batch_size=self.batch_size)
+        self.stdout.write(self.style.SUCCESS("Syntetyczna flota gotowa."))
+
+    # --- POMOCNICZE ---
+
+    def _bulk(self, model, rows, total):
+        """Zapisuje obiekty z generatora partiami, każda partia w osobnej transakcji."""
+        batch = []
+        done = 0
+        for obj in rows:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                done += self._flush_batch(model, batch)
+                batch = []
+                self.stdout.write(f"  {model.__name__}: {done}/{total}", ending='\r')
+        if batch:
+            done += self._flush_batch(model, batch)
+        self.stdout.write(f"  {model.__name__}: {done}/{total}")
+
+    @staticmethod
+    def _flush_batch(model, batch):
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        return len(batch)
+
+    def _random_date(self):
+        return self.today - datetime.timedelta(days=self.rng.randrange(self.days))
+
+    def flush(self):
+        self.stdout.write("Usuwanie poprzednich danych syntetycznych...")
+        Vehicle.objects.filter(vin__startswith=SYNTHETIC_VIN_PREFIX).delete()
+        CustomUser.objects.filter(username__startswith=SYNTHETIC_USER_PREFIX).delete()
+        Reservation.objects.filter(company__startswith=SYNTHETIC_COMPANY_PREFIX).delete()
+        FleetCompany.objects.filter(nazwa__startswith=SYNTHETIC_COMPANY_PREFIX).delete()
+
+    # --- GENERATORY ---
+
+    def seed_companies(self, count):
+        self._bulk(FleetCompany, (
+            FleetCompany(nazwa=f"{SYNTHETIC_COMPANY_PREFIX}Firma {i:04d}", nip=f"{i:010d}") for i in range(count)
+        ), count)
+        return list(FleetCompany.objects.filter(nazwa__startswith=SYNTHETIC_COMPANY_PREFIX)
+                    .order_by('id').values_list('id', flat=True))
+
+    def seed_vehicles(self, count, company_ids):
+        rng = self.rng
+        types = [t for t, _ in Vehicle.TYPE_CHOICES]
+        fuels = [f for f, _ in FUEL_TYPES]
+
+        def rows():
+            for i in range(count):
+                marka, modele = rng.choice(MARKI)
+                yield Vehicle(
+                    vin=f"{SYNTHETIC_VIN_PREFIX}{i:014d}",
+                    registration_number=f"SY{i:07d}",
+                    marka=marka, model=rng.choice(modele),
+                    data_pierwszej_rejestracji=self._random_date() - datetime.timedelta(days=365 * rng.randrange(8)),
+                    typ_pojazdu=rng.choice(types), fuel_type=rng.choice(fuels),
+                    przebieg=float(rng.randrange(5_000, 400_000)),
+                    company_id=rng.choice(company_ids) if company_ids else None,
+                    uwagi=rng.choice(['', 'Hak holowniczy', 'Zimowe opony w magazynie', 'Klimatyzacja do serwisu']),
+                )
+
+        self._bulk(Vehicle, rows(), count)
+        return list(Vehicle.objects.filter(vin__startswith=SYNTHETIC_VIN_PREFIX)
+                    .order_by('id').values_list('id', flat=True))
+
+    def seed_drivers(self, count, company_ids):
+        rng = self.rng
+        # Jeden hash dla wszystkich kont - PBKDF2 per wiersz trwałby godzinami
+        password = make_password(SYNTHETIC_PASSWORD)
+
+        self._bulk(CustomUser, (
+            CustomUser(
+                username=f"{SYNTHETIC_USER_PREFIX}{i:07d}", password=password, rola='DRIVER',
+                first_name=rng.choice(IMIONA), last_name=rng.choice(NAZWISKA),
+                email=f"{SYNTHETIC_USER_PREFIX}{i:07d}@example.com",
+            ) for i in range(count)
+        ), count)
+        user_ids = (CustomUser.objects.filter(username__startswith=SYNTHETIC_USER_PREFIX)
+                    .order_by('id').values_list('id', flat=True).iterator(chunk_size=self.batch_size))
+
+        self._bulk(Driver, (
+            Driver(
+                user_id=user_id, numer_prawa_jazdy=f"PJ/{user_id:08d}",
+                company_id=rng.choice(company_ids) if company_ids else None,
+                kategorie_prawa_jazdy=rng.choice(['B', 'B, C', 'B, C, CE', 'B, D']),
+                data_waznosci_prawa_jazdy=self.today + datetime.timedelta(days=rng.randrange(-60, 3650)),
+                data_waznosci_badan=self.today + datetime.timedelta(days=rng.randrange(-60, 1800)),
+            ) for user_id in user_ids
+        ), count)
+        return list(Driver.objects.filter(user__username__startswith=SYNTHETIC_USER_PREFIX)
+                    .order_by('id').values_list('id', flat=True))
+
+    def seed_handovers(self, count, vehicle_ids, driver_ids):
+        if not vehicle_ids or not driver_ids:
+            return
+        rng = self.rng
+        fuel_levels = [f for f, _ in VehicleHandover.FUEL_LEVELS]
+
+        def rows():
+            for _ in range(count):
+                data_wydania = self._random_date()
+                # ~2% wydań jest wciąż otwartych
+                is_open = rng.random() < 0.02
+                start = rng.randrange(5_000, 400_000)
+                stop = None if is_open else start + rng.randrange(10, 3_000)
+                stawka = Decimal(rng.choice(['0.50', '0.80', '1.20']))
+                doplata = Decimal(rng.choice(['0.00', '0.00', '50.00']))
+                yield VehicleHandover(
+                    kierowca_id=rng.choice(driver_ids), pojazd_id=rng.choice(vehicle_ids),
+                    data_wydania=data_wydania,
+                    data_zwrotu=None if is_open else data_wydania + datetime.timedelta(days=rng.randrange(1, 30)),
+                    przebieg_start=start, przebieg_stop=stop,
+                    paliwo_start='100', paliwo_stop=None if is_open else rng.choice(fuel_levels),
+                    stawka_za_km=stawka, koszt_brakujacego_paliwa=doplata,
+                    calkowity_koszt=(stawka * (stop - start) + doplata) if stop else Decimal('0.00'),
+                )
+
+        self._bulk(VehicleHandover, rows(), count)
+
+    def seed_reservations(self, count, vehicle_ids, driver_ids):
+        rng = self.rng
+        types = [t for t, _ in Vehicle.TYPE_CHOICES]
+        statuses = [s for s, _ in Reservation.STATUS_CHOICES]
+
+        def rows():
+            for i in range(count):
+                date_from = self._random_date() + datetime.timedelta(days=rng.randrange(60))
+                yield Reservation(
+                    first_name=rng.choice(IMIONA), last_name=rng.choice(NAZWISKA),
+                    company=f"{SYNTHETIC_COMPANY_PREFIX}Klient {i % 500:03d}",
+                    date_from=date_from, date_to=date_from + datetime.timedelta(days=rng.randrange(1, 14)),
+                    vehicle_type=rng.choice(types), status=rng.choice(statuses),
+                    assigned_vehicle_id=rng.choice(vehicle_ids) if vehicle_ids and rng.random() < 0.8 else None,
+                    driver_id=rng.choice(driver_ids) if driver_ids and rng.random() < 0.7 else None,
+                )
+
+        self._bulk(Reservation, rows(), count)
+
+    def seed_damages(self, count, vehicle_ids):
+        if not vehicle_ids:
+            return
+        rng = self.rng
+        statuses = ['ZGLOSZONA', 'WYCENIANA', 'W_NAPRAWIE', 'ZAMKNIETA', 'ZAMKNIETA', 'ZAMKNIETA']
+        self._bulk(DamageEvent, (
+            DamageEvent(
+                pojazd_id=rng.choice(vehicle_ids), opis=rng.choice(['Rysa na drzwiach', 'Pęknięta szyba',
+                                                                   'Wgniecenie zderzaka', 'Uszkodzone lusterko']),
+                data_zdarzenia=self._random_date(), szacowany_koszt=Decimal(rng.randrange(100, 20_000)),
+                zgloszony_do_ubezpieczyciela=rng.random() < 0.4, status_naprawy=rng.choice(statuses),
+            ) for _ in range(count)
+        ), count)
+
+    def seed_services(self, count, vehicle_ids):
+        if not vehicle_ids:
+            return
+        rng = self.rng
+        types = ['INSPEKCJA', 'NAPRAWA', 'PRZEGLAD', 'BADANIE_TECH', 'LEGALIZACJA']
+        self._bulk(ServiceEvent, (
+            ServiceEvent(
+                pojazd_id=rng.choice(vehicle_ids), opis='Serwis syntetyczny', data_serwisu=self._random_date(),
+                koszt=Decimal(rng.randrange(100, 8_000)), typ_zdarzenia=rng.choice(types),
+            ) for _ in range(count)
+        ), count)
+
+    def seed_policies(self, count, vehicle_ids):
+        if not vehicle_ids:
+            return
+        rng = self.rng
+        self._bulk(InsurancePolicy, (
+            InsurancePolicy(
+                pojazd_id=rng.choice(vehicle_ids), numer_polisy=f"SYN/{i:08d}",
+                ubezpieczyciel=rng.choice(UBEZPIECZYCIELE),
+                data_waznosci_oc=self.today + datetime.timedelta(days=rng.randrange(-30, 365)),
+                data_waznosci_ac=self.today + datetime.timedelta(days=rng.randrange(-30, 365)),
+                koszt=Decimal(rng.randrange(800, 6_000)),
+            ) for i in range(count)
+        ), count)
+
+    def seed_documents(self, count, vehicle_ids):
+        if not vehicle_ids:
+            return
+        rng = self.rng
+        # Pliki nie istnieją fizycznie - wystarczy ścieżka w bazie
+        self._bulk(VehicleDocument, (
+            VehicleDocument(
+                vehicle_id=rng.choice(vehicle_ids), title=rng.choice(['Dowód rejestracyjny', 'SZKODA - zdjęcie',
+                                                                      'Umowa leasingu', 'Faktura']),
+                file=f"pojazdy_docs/syn_{i:08d}.pdf", description='Dokument syntetyczny',
+            ) for i in range(count)
+        ), count)
+
+    def seed_readings(self, count, vehicle_ids):
+        if not vehicle_ids:
+            return
+        rng = self.rng
+        sources = [s for s, _ in OdometerReading.SOURCE_CHOICES]
+
+        def rows():
+            # Per pojazd rosnący przebieg w kolejnych dniach - jak prawdziwy dziennik (raporty /mileage/)
+            per_vehicle, extra = divmod(count, len(vehicle_ids))
+            for i, vehicle_id in enumerate(vehicle_ids):
+                n = per_vehicle + (1 if i < extra else 0)
+                km = rng.randrange(5_000, 200_000)
+                days = sorted(rng.randrange(self.days) for _ in range(n))
+                for day in reversed(days):
+                    km += rng.randrange(0, 400)
+                    yield OdometerReading(pojazd_id=vehicle_id, data_odczytu=self.today - datetime.timedelta(days=day),
+                                          przebieg=km, zrodlo=rng.choice(sources))
+
+        self._bulk(OdometerReading, rows(), count)
+
@@ -0,0 +1,30 @@
+# fleet_core/management/commands/sync_replica.py
+
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from fleet_core.db_router import replica_alias
+
+
+class Command(BaseCommand):
+    help = "Kopiuje bazę główną do repliki SQLite (lokalne testy routingu odczytów; MySQL ma własną replikację)."
+
+    def handle(self, *args, **opts):
+        alias = replica_alias()
+        if alias is None:
+            raise CommandError("Replika nie jest skonfigurowana (ustaw FLEET_DB_REPLICA).")
+        primary, replica = connections['default'], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("sync_replica obsługuje tylko SQLite - dla MySQL skonfiguruj replikację serwera.")
+
+        replica.close()
+        primary.ensure_connection()
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            # Backup API SQLite: spójna kopia bez blokowania zapisów na dłużej niż pojedyncza strona
+            primary.connection.backup(target, pages=1024)
+        finally:
+            target.close()
+        self.stdout.write(self.style.SUCCESS(f"Replika '{alias}' zsynchronizowana z bazą główną."))
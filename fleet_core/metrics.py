@@ -0,0 +1,183 @@
+# fleet_core/metrics.py
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+# --- DEFINICJE METRYK ---
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+COUNTERS = {
+    'fleet_http_requests_total': "Liczba żądań do endpointów fleet_core.",
+}
+HISTOGRAMS = {
+    'fleet_http_request_duration_seconds': ("Czas obsługi żądania (s).", LATENCY_BUCKETS),
+    'fleet_http_response_size_bytes': ("Rozmiar odpowiedzi (bajty).", SIZE_BUCKETS),
+    'fleet_http_db_queries': ("Liczba zapytań SQL na żądanie.", QUERY_BUCKETS),
+}
+
+
+class _Shard:
+    """
+    Metryki jednego wątku. Każdy wątek pisze wyłącznie do swojego shardu,
+    więc inkrementacje nie potrzebują blokad - shardy są sumowane dopiero przy eksporcie.
+    """
+
+    def __init__(self):
+        self.counters = {}    # (nazwa, etykiety) -> wartość
+        self.histograms = {}  # (nazwa, etykiety) -> [kubełki..., suma, liczba]
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        buckets = HISTOGRAMS[name][1]
+        row = self.histograms.get(key)
+        if row is None:
+            row = self.histograms[key] = [0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        row[-2] += value
+        row[-1] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()  # tylko przy rejestracji nowego wątku
+        self._last_flush = 0.0
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name, value=1, **labels):
+        self._shard().inc(name, tuple(sorted(labels.items())), value)
+
+    def observe(self, name, value, **labels):
+        self._shard().observe(name, tuple(sorted(labels.items())), value)
+
+    def snapshot(self):
+        """Suma wszystkich shardów procesu w formacie JSON-owalnym."""
+        counters, histograms = {}, {}
+        for shard in list(self._shards):
+            for (name, labels), value in list(shard.counters.items()):
+                key = json.dumps([name, labels])
+                counters[key] = counters.get(key, 0) + value
+            for (name, labels), row in list(shard.histograms.items()):
+                key = json.dumps([name, labels])
+                total = histograms.setdefault(key, [0] * len(row))
+                for i, value in enumerate(row):
+                    total[i] += value
+        return {'counters': counters, 'histograms': histograms}
+
+    # --- TRYB WIELOPROCESOWY ---
+
+    def flush(self, force=False):
+        """
+        Zapisuje snapshot procesu do katalogu współdzielonego (FLEET_METRICS_MULTIPROC_DIR).
+        Zapis atomowy (plik tymczasowy + os.replace), nie częściej niż co FLEET_METRICS_FLUSH_SECONDS.
+        """
+        directory = getattr(settings, 'FLEET_METRICS_MULTIPROC_DIR', None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < getattr(settings, 'FLEET_METRICS_FLUSH_SECONDS', 5):
+            return
+        self._last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, os.path.join(directory, f"metrics_{os.getpid()}.json"))
+
+    def collect(self):
+        """Snapshot tego procesu + pliki pozostałych workerów z katalogu współdzielonego."""
+        snapshots = [self.snapshot()]
+        directory = getattr(settings, 'FLEET_METRICS_MULTIPROC_DIR', None)
+        if directory:
+            own_file = os.path.join(directory, f"metrics_{os.getpid()}.json")
+            for path in glob.glob(os.path.join(directory, 'metrics_*.json')):
+                if path == own_file:
+                    continue
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return merge_snapshots(snapshots)
+
+
+def merge_snapshots(snapshots):
+    merged = {'counters': {}, 'histograms': {}}
+    for snap in snapshots:
+        for key, value in snap.get('counters', {}).items():
+            merged['counters'][key] = merged['counters'].get(key, 0) + value
+        for key, row in snap.get('histograms', {}).items():
+            total = merged['histograms'].setdefault(key, [0] * len(row))
+            for i, value in enumerate(row):
+                total[i] += value
+    return merged
+
+
+def _format_labels(labels, extra=None):
+    pairs = [tuple(pair) for pair in labels] + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_text(snapshot):
+    """Format tekstowy Prometheusa (text exposition format 0.0.4)."""
+    lines = []
+    by_name = {}
+    for key, value in snapshot['counters'].items():
+        name, labels = json.loads(key)
+        by_name.setdefault(name, []).append((labels, value))
+    for name, help_text in COUNTERS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for labels, value in sorted(by_name.get(name, [])):
+            lines.append(f"{name}{_format_labels(labels)} {_format_number(value)}")
+
+    by_name = {}
+    for key, row in snapshot['histograms'].items():
+        name, labels = json.loads(key)
+        by_name.setdefault(name, []).append((labels, row))
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, row in sorted(by_name.get(name, []), key=lambda item: item[0]):
+            cumulative = 0
+            for bound, count in zip(buckets, row):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', bound))} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {row[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_number(row[-2])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {row[-1]}")
+    return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
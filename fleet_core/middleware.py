@@ -0,0 +1,154 @@
+# fleet_core/middleware.py
+
+import heapq
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry as metrics_registry
+
+slow_query_logger = logging.getLogger('fleet_core.slow_queries')
+
+
+def is_fleet_core_request(request):
+    """Czy żądanie trafiło do widoku z aplikacji fleet_core (API, login, mobile)."""
+    match = getattr(request, 'resolver_match', None)
+    return bool(match) and getattr(match.func, '__module__', '').startswith('fleet_core')
+
+
+class QueryStats:
+    """
+    Licznik zapytań SQL podpinany przez connection.execute_wrapper.
+    Zbiera liczbę zapytań, łączny czas i N najwolniejszych zapytań (bez DEBUG).
+    """
+
+    def __init__(self, keep_slowest=5):
+        self.count = 0
+        self.total_time = 0.0
+        self.keep_slowest = keep_slowest
+        self._slowest = []  # kopiec (czas, nr, alias, sql, params)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.total_time += duration
+            entry = (duration, self.count, context['connection'].alias, sql, None if many else params)
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, entry)
+            else:
+                heapq.heappushpop(self._slowest, entry)
+
+    @property
+    def slowest(self):
+        return [
+            {'time_ms': round(d * 1000, 2), 'alias': alias, 'sql': sql, 'params': params}
+            for d, _, alias, sql, params in sorted(self._slowest, reverse=True)
+        ]
+
+    def capture(self):
+        """Podpina licznik pod wszystkie skonfigurowane bazy (default + ewentualne repliki)."""
+        stack = ExitStack()
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(self))
+        return stack
+
+
+def explain_query(alias, sql, params):
+    """Plan zapytania (EXPLAIN / EXPLAIN QUERY PLAN) - tylko dla SELECT."""
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}", params or ())
+            return [' '.join(str(col) for col in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN nieudany: {e}"]
+
+
+class QueryStatsMiddleware:
+    """
+    Budżet zapytań SQL dla endpointów fleet_core.
+    Dodaje nagłówki X-DB-Queries i X-DB-Time (ms), a zapytania wolniejsze niż
+    FLEET_SLOW_QUERY_MS zapisuje do logu 'fleet_core.slow_queries' (opcjonalnie z EXPLAIN).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_query_ms = getattr(settings, 'FLEET_SLOW_QUERY_MS', 200)
+        self.keep_slowest = getattr(settings, 'FLEET_SLOW_QUERY_TOP', 5)
+        self.explain_ms = getattr(settings, 'FLEET_EXPLAIN_THRESHOLD_MS', None)
+
+    def __call__(self, request):
+        stats = QueryStats(keep_slowest=self.keep_slowest)
+        with stats.capture():
+            response = self.get_response(request)
+
+        if not is_fleet_core_request(request):
+            return response
+
+        request.db_stats = stats
+        response['X-DB-Queries'] = str(stats.count)
+        response['X-DB-Time'] = f"{stats.total_time * 1000:.2f}"
+        self._log_slow_queries(request, response, stats)
+        return response
+
+    def _log_slow_queries(self, request, response, stats):
+        for query in stats.slowest:
+            if query['time_ms'] < self.slow_query_ms:
+                break
+            extra = {
+                'path': request.path, 'method': request.method, 'status': response.status_code,
+                'time_ms': query['time_ms'], 'queries': stats.count,
+            }
+            plan = None
+            if self.explain_ms is not None and query['time_ms'] >= self.explain_ms:
+                plan = explain_query(query['alias'], query['sql'], query['params'])
+            slow_query_logger.warning(
+                "Wolne zapytanie %.2f ms (%s %s, %s zapytań): %s%s",
+                query['time_ms'], request.method, request.path, stats.count, query['sql'],
+                f"\nEXPLAIN: {plan}" if plan else '',
+                extra=extra,
+            )
+
+
+class MetricsMiddleware:
+    """
+    Metryki Prometheusa dla endpointów fleet_core (fleet_core/metrics.py):
+    liczba żądań, histogram czasu, rozmiaru odpowiedzi i liczby zapytań SQL,
+    z etykietą route (nazwa z DefaultRoutera, np. 'vehicle-availability') i status.
+    Musi stać PRZED QueryStatsMiddleware, żeby widzieć request.db_stats.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.registry = metrics_registry
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        if not is_fleet_core_request(request):
+            return response
+        route = request.resolver_match.url_name or 'unnamed'
+        if route == 'metrics':
+            return response
+
+        method = request.method
+        self.registry.inc('fleet_http_requests_total', route=route, method=method, status=str(response.status_code))
+        self.registry.observe('fleet_http_request_duration_seconds', duration, route=route, method=method)
+        if not response.streaming:
+            self.registry.observe('fleet_http_response_size_bytes', len(response.content), route=route)
+        stats = getattr(request, 'db_stats', None)
+        if stats is not None:
+            self.registry.observe('fleet_http_db_queries', stats.count, route=route)
+        self.registry.flush()
+        return response
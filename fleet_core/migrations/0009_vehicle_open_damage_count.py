@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 13:11
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_open_damage_count(apps, schema_editor):
+    Vehicle = apps.get_model('fleet_core', 'Vehicle')
+    DamageEvent = apps.get_model('fleet_core', 'DamageEvent')
+    counts = (
+        DamageEvent.objects.filter(status_naprawy__in=['ZGLOSZONA', 'W_NAPRAWIE'])
+        .values_list('pojazd_id')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for vehicle_id, n in counts:
+        Vehicle.objects.filter(pk=vehicle_id).update(open_damage_count=n)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0008_alter_customuser_rola'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vehicle',
+            name='open_damage_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Liczba otwartych szkód'),
+        ),
+        migrations.RunPython(fill_open_damage_count, migrations.RunPython.noop),
+    ]
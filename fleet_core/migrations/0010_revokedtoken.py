@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-19 13:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0009_vehicle_open_damage_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevokedToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_pk', models.BigIntegerField(blank=True, db_index=True, null=True)),
+                ('jti', models.CharField(blank=True, db_index=True, max_length=255, null=True)),
+                ('revoked_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Ważne do (potem wpis można usunąć)')),
+            ],
+            options={
+                'verbose_name': 'Unieważniony Token',
+                'verbose_name_plural': 'Unieważnione Tokeny',
+            },
+        ),
+    ]
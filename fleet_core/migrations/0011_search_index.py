@@ -0,0 +1,91 @@
+# Generated by Django 6.0 on 2026-10-19 13:40
+
+from django.db import migrations
+
+# Schemat i treść dokumentów jak w fleet_core/search.py z chwili tej migracji - migracja nie importuje kodu aplikacji
+SEARCH_TABLE = 'fleet_search'
+BATCH_SIZE = 2000  # wiersze na jedno executemany - bez trzymania całego indeksu w pamięci
+_FOLD = str.maketrans('łŁ', 'lL')
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "entity UNINDEXED, object_id UNINDEXED, title, body, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "entity VARCHAR(20) NOT NULL, object_id BIGINT NOT NULL, title VARCHAR(255) NOT NULL, body TEXT, "
+            "PRIMARY KEY (entity, object_id), FULLTEXT KEY fleet_search_ft (title, body)"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+        )
+    else:
+        schema_editor.execute(
+            f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+            "entity VARCHAR(20) NOT NULL, object_id BIGINT NOT NULL, title VARCHAR(255) NOT NULL, body TEXT, "
+            "PRIMARY KEY (entity, object_id))"
+        )
+
+
+def drop_search_table(apps, schema_editor):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def join(*parts):
+    return ' '.join(str(p) for p in parts if p)
+
+
+def index_row(entity, object_id, title, body):
+    """Tytuł przycięty do 255 znaków, treść uzupełniona o wersję bez "ł" (unicode61 jej nie rozkłada)."""
+    title, body = title or '', body or ''
+    folded = f"{title} {body}".translate(_FOLD)
+    if folded != f"{title} {body}":
+        body = f"{body} {folded}"
+    return entity, object_id, title[:255], body
+
+
+def fill_search_table(apps, schema_editor):
+    # Dane historyczne trafiają do indeksu na modelach historycznych (bez importu modeli aplikacji)
+    Vehicle = apps.get_model('fleet_core', 'Vehicle')
+    Driver = apps.get_model('fleet_core', 'Driver')
+    Reservation = apps.get_model('fleet_core', 'Reservation')
+    VehicleHandover = apps.get_model('fleet_core', 'VehicleHandover')
+
+    def documents():
+        for v in Vehicle.objects.all().iterator(chunk_size=BATCH_SIZE):
+            yield 'vehicle', v.pk, v.registration_number, join(v.vin, v.marka, v.model, v.uwagi)
+        for d in Driver.objects.select_related('user', 'company').iterator(chunk_size=BATCH_SIZE):
+            name = join(d.user.first_name, d.user.last_name) or d.user.username
+            yield 'driver', d.pk, name, join(d.user.username, d.numer_prawa_jazdy, d.company.nazwa if d.company else '')
+        for r in Reservation.objects.all().iterator(chunk_size=BATCH_SIZE):
+            yield 'reservation', r.pk, join(r.first_name, r.last_name), join(r.company, r.additional_info)
+        for h in VehicleHandover.objects.select_related('pojazd', 'kierowca__user').iterator(chunk_size=BATCH_SIZE):
+            driver = join(h.kierowca.user.first_name, h.kierowca.user.last_name) if h.kierowca_id else ''
+            yield 'handover', h.pk, join(h.pojazd.registration_number, driver), join(h.uwagi)
+
+    sql = f"INSERT INTO {SEARCH_TABLE} (entity, object_id, title, body) VALUES (%s, %s, %s, %s)"
+    with schema_editor.connection.cursor() as cursor:
+        batch = []
+        for document in documents():
+            batch.append(index_row(*document))
+            if len(batch) >= BATCH_SIZE:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0010_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+        migrations.RunPython(fill_search_table, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='damageevent',
+            name='row_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vehicle',
+            name='row_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vehiclehandover',
+            name='row_version',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
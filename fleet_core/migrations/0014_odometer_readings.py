@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-19 16:40
+
+import datetime
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_odometer_readings(apps, schema_editor):
+    # Historia z istniejących wydań (wydanie + zwrot) i bieżący licznik pojazdów jako wpis ręczny
+    VehicleHandover = apps.get_model('fleet_core', 'VehicleHandover')
+    Vehicle = apps.get_model('fleet_core', 'Vehicle')
+    OdometerReading = apps.get_model('fleet_core', 'OdometerReading')
+
+    readings = []
+    for h in VehicleHandover.objects.only('id', 'pojazd_id', 'data_wydania', 'data_zwrotu', 'przebieg_start',
+                                          'przebieg_stop').iterator():
+        if h.przebieg_start and h.przebieg_start > 0:
+            readings.append(OdometerReading(pojazd_id=h.pojazd_id, data_odczytu=h.data_wydania,
+                                            przebieg=h.przebieg_start, zrodlo='WYDANIE', zrodlo_id=h.pk))
+        if h.przebieg_stop and h.przebieg_stop > 0 and h.data_zwrotu:
+            readings.append(OdometerReading(pojazd_id=h.pojazd_id, data_odczytu=h.data_zwrotu,
+                                            przebieg=h.przebieg_stop, zrodlo='ZWROT', zrodlo_id=h.pk))
+    today = datetime.date.today()
+    for vehicle_id, km in Vehicle.objects.filter(przebieg__gt=0).values_list('id', 'przebieg').iterator():
+        readings.append(OdometerReading(pojazd_id=vehicle_id, data_odczytu=today, przebieg=int(km), zrodlo='RECZNY'))
+    OdometerReading.objects.bulk_create(readings, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0013_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='serviceevent',
+            name='przebieg',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Przebieg w dniu serwisu'),
+        ),
+        migrations.CreateModel(
+            name='OdometerReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_odczytu', models.DateField(verbose_name='Data odczytu')),
+                ('przebieg', models.PositiveIntegerField(verbose_name='Przebieg (km)')),
+                ('zrodlo', models.CharField(choices=[('WYDANIE', 'Wydanie pojazdu'), ('ZWROT', 'Zwrot pojazdu'), ('SERWIS', 'Serwis'), ('RECZNY', 'Wpis ręczny')], max_length=10, verbose_name='Źródło')),
+                ('zrodlo_id', models.BigIntegerField(blank=True, null=True)),
+                ('pojazd', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='odometer_readings', to='fleet_core.vehicle')),
+            ],
+            options={
+                'verbose_name': 'Odczyt Licznika',
+                'verbose_name_plural': 'Odczyty Licznika',
+                'indexes': [models.Index(fields=['pojazd', 'data_odczytu'], name='odometer_vehicle_date')],
+            },
+        ),
+        migrations.RunPython(fill_odometer_readings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0014_odometer_readings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateTier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('typ_pojazdu', models.CharField(blank=True, choices=[('OSOBOWE', 'Osobowe'), ('CIEZAROWE', 'Ciężarowe'), ('AUTOBUSY', 'Autobusy'), ('MOTOCYKLE', 'Motocykle'), ('SEDAN', 'Sedan'), ('SUV', 'SUV'), ('HATCHBACK', 'Hatchback'), ('KOMBI', 'Kombi'), ('COUPE', 'Coupé')], default='', max_length=30, verbose_name='Typ pojazdu (puste = każdy)')),
+                ('fuel_type', models.CharField(blank=True, choices=[('BENZYNA', 'Benzyna'), ('DIESEL', 'Diesel'), ('ELECTRIC', 'Elektryczny'), ('HYBRID', 'Hybryda'), ('PHEV', 'Hybryda Plug-in'), ('LPG', 'LPG'), ('CNG', 'CNG'), ('HYDROGEN', 'Wodorowy')], default='', max_length=20, verbose_name='Rodzaj paliwa (puste = każdy)')),
+                ('stawka_za_km', models.DecimalField(decimal_places=2, max_digits=6, verbose_name='Stawka za km (PLN)')),
+                ('oplata_za_paliwo', models.DecimalField(decimal_places=2, max_digits=6, verbose_name='Opłata za paliwo (PLN)')),
+            ],
+            options={
+                'verbose_name': 'Stawka Rozliczeniowa',
+                'verbose_name_plural': 'Stawki Rozliczeniowe',
+                'constraints': [models.UniqueConstraint(fields=('typ_pojazdu', 'fuel_type'), name='rate_tier_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-19 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0015_rate_tiers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='damageevent',
+            name='data_zdarzenia',
+            field=models.DateField(db_index=True, verbose_name='Data Zdarzenia'),
+        ),
+        migrations.AlterField(
+            model_name='damageevent',
+            name='status_naprawy',
+            field=models.CharField(choices=[('ZGLOSZONA', 'Zgłoszona'), ('WYCENIANA', 'Wyceniana'), ('W_NAPRAWIE', 'W naprawie'), ('ZAMKNIETA', 'Zamknięta')], db_index=True, default='ZGLOSZONA', max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='insurancepolicy',
+            name='data_waznosci_oc',
+            field=models.DateField(db_index=True, verbose_name='Ważność OC'),
+        ),
+        migrations.AlterField(
+            model_name='insurancepolicy',
+            name='ubezpieczyciel',
+            field=models.CharField(db_index=True, max_length=100, verbose_name='Towarzystwo Ubezpieczeniowe'),
+        ),
+        migrations.AlterField(
+            model_name='odometerreading',
+            name='data_odczytu',
+            field=models.DateField(db_index=True, verbose_name='Data odczytu'),
+        ),
+        migrations.AlterField(
+            model_name='vehiclehandover',
+            name='data_wydania',
+            field=models.DateField(db_index=True, verbose_name='Data Wydania'),
+        ),
+        migrations.AlterField(
+            model_name='vehiclehandover',
+            name='data_zwrotu',
+            field=models.DateField(blank=True, db_index=True, null=True, verbose_name='Data Zwrotu'),
+        ),
+    ]
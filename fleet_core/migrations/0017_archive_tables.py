@@ -0,0 +1,74 @@
+# Generated by Django 6.0 on 2026-10-19 18:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0016_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedHandover',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('reservation_id', models.BigIntegerField(blank=True, null=True)),
+                ('data_wydania', models.DateField(db_index=True, verbose_name='Data Wydania')),
+                ('data_zwrotu', models.DateField(blank=True, null=True, verbose_name='Data Zwrotu')),
+                ('uwagi', models.TextField(blank=True, null=True)),
+                ('scan_agreement', models.FileField(blank=True, null=True, upload_to='handovers/umowy/')),
+                ('scan_handover_protocol', models.FileField(blank=True, null=True, upload_to='handovers/protokoly_wydania/')),
+                ('scan_return_protocol', models.FileField(blank=True, null=True, upload_to='handovers/protokoly_zwrotu/')),
+                ('przebieg_start', models.IntegerField(default=0)),
+                ('przebieg_stop', models.IntegerField(blank=True, null=True)),
+                ('paliwo_start', models.CharField(choices=[('0', 'Rezerwa'), ('25', '1/4 baku'), ('50', '1/2 baku'), ('75', '3/4 baku'), ('100', 'Pełny bak')], default='100', max_length=10)),
+                ('paliwo_stop', models.CharField(blank=True, choices=[('0', 'Rezerwa'), ('25', '1/4 baku'), ('50', '1/2 baku'), ('75', '3/4 baku'), ('100', 'Pełny bak')], max_length=10, null=True)),
+                ('stawka_za_km', models.DecimalField(decimal_places=2, default=0.0, max_digits=6)),
+                ('koszt_brakujacego_paliwa', models.DecimalField(decimal_places=2, default=0.0, max_digits=8)),
+                ('calkowity_koszt', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('kierowca', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_handovers', to='fleet_core.driver')),
+                ('pojazd', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_handovers', to='fleet_core.vehicle')),
+            ],
+            options={
+                'verbose_name': 'Wydanie (Archiwum)',
+                'verbose_name_plural': 'Wydania (Archiwum)',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReservation',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('first_name', models.CharField(max_length=100, verbose_name='Imię Kierowcy')),
+                ('last_name', models.CharField(max_length=100, verbose_name='Nazwisko Kierowcy')),
+                ('company', models.CharField(max_length=200, verbose_name='Nazwa Firmy')),
+                ('date_from', models.DateField(blank=True, null=True)),
+                ('date_to', models.DateField(blank=True, db_index=True, null=True)),
+                ('vehicle_type', models.CharField(choices=[('OSOBOWE', 'Osobowe'), ('CIEZAROWE', 'Ciężarowe'), ('AUTOBUSY', 'Autobusy'), ('MOTOCYKLE', 'Motocykle'), ('SEDAN', 'Sedan'), ('SUV', 'SUV'), ('HATCHBACK', 'Hatchback'), ('KOMBI', 'Kombi'), ('COUPE', 'Coupé')], max_length=30)),
+                ('additional_info', models.TextField(blank=True, null=True)),
+                ('scan_agreement', models.FileField(blank=True, null=True, upload_to='umowy/')),
+                ('status', models.CharField(choices=[('OCZEKUJACE', 'Oczekujące'), ('PRZYJETE', 'Przyjęte'), ('ZATWIERDZONE', 'Zatwierdzone'), ('ODRZUCONE', 'Odrzucone')], max_length=20)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('assigned_vehicle', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_reservations', to='fleet_core.vehicle')),
+                ('driver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_reservations', to='fleet_core.driver')),
+            ],
+            options={
+                'verbose_name': 'Rezerwacja (Archiwum)',
+                'verbose_name_plural': 'Rezerwacje (Archiwum)',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedReservationFile',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('file', models.FileField(upload_to='umowy/')),
+                ('uploaded_at', models.DateTimeField()),
+                ('reservation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attachments', to='fleet_core.archivedreservation')),
+            ],
+        ),
+    ]
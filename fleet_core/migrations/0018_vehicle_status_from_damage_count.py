@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-19 19:05
+
+from django.db import migrations
+from django.db.models import Case, When, Value, F
+from django.utils import timezone
+
+
+def fix_vehicle_status(apps, schema_editor):
+    # 0009 wypełniła tylko licznik - status sprzed licznika mógł zostać nieaktualny (np. NIESPRAWNY bez szkód).
+    # Wyrażenie jak signals.vehicle_status_expression (migracja nie importuje kodu aplikacji)
+    Vehicle = apps.get_model('fleet_core', 'Vehicle')
+    expected = Case(
+        When(open_damage_count__gt=0, then=Value('NIESPRAWNY')),
+        When(assigned_user__isnull=False, then=Value('WYPOZYCZONY')),
+        default=Value('SPRAWNY'),
+    )
+    Vehicle.objects.annotate(expected_status=expected).exclude(status=F('expected_status')).update(
+        status=expected, row_version=F('row_version') + 1, updated_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0017_archive_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_vehicle_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-19 19:40
+
+from django.db import migrations
+
+# Jak search.document_rowid w chwili tej migracji: id obiektu * 8 + numer typu (migracja nie importuje kodu aplikacji)
+SEARCH_TABLE = 'fleet_search'
+ROWID_SQL = ("object_id * 8 + CASE entity WHEN 'vehicle' THEN 0 WHEN 'driver' THEN 1 "
+             "WHEN 'reservation' THEN 2 WHEN 'handover' THEN 3 END")
+
+
+def assign_document_rowids(apps, schema_editor):
+    # SQLite: przepisuje istniejące dokumenty na rowid liczony z klucza (indeksy sprzed tej zmiany)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"CREATE TEMP TABLE {SEARCH_TABLE}_copy AS SELECT entity, object_id, title, body "
+                          f"FROM {SEARCH_TABLE}")
+    schema_editor.execute(f"DELETE FROM {SEARCH_TABLE}")
+    schema_editor.execute(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, entity, object_id, title, body) "
+        f"SELECT {ROWID_SQL}, entity, object_id, title, body FROM {SEARCH_TABLE}_copy"
+    )
+    schema_editor.execute(f"DROP TABLE {SEARCH_TABLE}_copy")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet_core', '0018_vehicle_status_from_damage_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_document_rowids, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,15 @@
 # fleet_core/models.py
 
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
 from django.db import models
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
 
 # --- DEFINICJE STAŁYCH ---
 
@@ -18,9 +24,59 @@ FUEL_TYPES = [
     ('HYDROGEN', 'Wodorowy'),
 ]
 
+# Statusy szkód, które blokują pojazd (licznik Vehicle.open_damage_count)
+OPEN_DAMAGE_STATUSES = ('ZGLOSZONA', 'W_NAPRAWIE')
+
 
 # --- MODELE ---
 
+def next_row_version():
+    """
+    Nowa wersja wiersza liczona w bazie: max(poprzednia + 1, znacznik czasu w ns). Zawsze rośnie - także
+    przy dwóch zapisach w tym samym takcie zegara (UPDATE-y wiersza idą po kolei) i po cofnięciu zegara (NTP).
+    """
+    return Greatest(F('row_version') + 1, Value(time.time_ns()), output_field=models.BigIntegerField())
+
+
+class RowVersioned(models.Model):
+    """
+    Kolumna row_version zmieniana przy każdym save() - klucz cache serializacji (fleet_core/object_cache.py).
+    Zapisy przez queryset.update()/bulk_update() muszą ustawić row_version=next_row_version() same.
+    """
+    row_version = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        self.row_version = time.time_ns() if adding else next_row_version()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'row_version' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'row_version']
+        super().save(*args, **kwargs)
+        if not adding:
+            # Wartość zna tylko baza - pole odroczone, doczytane przy pierwszym użyciu
+            self.__dict__.pop('row_version', None)
+
+
+class SyncTracked(models.Model):
+    """
+    Znacznik ostatniej zmiany dla synchronizacji przyrostowej (fleet_core/sync.py, /api/sync/).
+    Zapisy przez queryset.update() muszą ustawić updated_at=timezone.now() same.
+    """
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'updated_at' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'updated_at']
+        super().save(*args, **kwargs)
+
+
 class FleetCompany(models.Model):
     nazwa = models.CharField(max_length=255)
     nip = models.CharField(max_length=10)
@@ -53,7 +109,7 @@ class CustomUser(AbstractUser):
     # Twoje istniejące pole PIN (zachowane bez zmian)
     pin_2fa = models.CharField(max_length=6, blank=True, null=True, verbose_name="PIN 2FA")
 
-class Vehicle(models.Model):
+class Vehicle(RowVersioned, SyncTracked):
     """
     Model reprezentujący fizyczny pojazd w bazie danych,
     zawierający logikę walidacyjną dla Panelu Admina.
@@ -104,6 +160,10 @@ class Vehicle(models.Model):
     przebieg = models.FloatField(default=0.0)
     company = models.ForeignKey(FleetCompany, on_delete=models.SET_NULL, null=True, blank=True)
 
+    # Zdenormalizowany licznik otwartych szkód (utrzymywany w fleet_core/signals.py)
+    open_damage_count = models.PositiveIntegerField(default=0, editable=False,
+                                                    verbose_name="Liczba otwartych szkód")
+
     scan_registration_card = models.FileField(upload_to='docs/dowody/', verbose_name="Skan Dowodu Rej.", null=True, blank=True)
     scan_policy_oc = models.FileField(upload_to='docs/oc/', verbose_name="Polisa OC", null=True, blank=True)
     scan_policy_ac = models.FileField(upload_to='docs/ac/', verbose_name="Polisa AC", null=True, blank=True)
@@ -114,6 +174,16 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.registration_number} ({self.vin})"
 
+    def save(self, *args, **kwargs):
+        # Licznik szkód zmieniamy tylko przez F() - zwykły zapis nie może nadpisać go starą wartością
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'open_damage_count' and f.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
     def clean(self):
         if self.przebieg < 0:
             raise ValidationError({
@@ -164,6 +234,7 @@ class ServiceEvent(models.Model):
     opis = models.TextField(verbose_name="Opis Serwisu/Naprawy")
     data_serwisu = models.DateField(verbose_name="Data Serwisu")
     koszt = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    przebieg = models.PositiveIntegerField(null=True, blank=True, verbose_name="Przebieg w dniu serwisu")
 
     typ_zdarzenia = models.CharField(
         max_length=50,
@@ -189,8 +260,8 @@ class ServiceEvent(models.Model):
 class InsurancePolicy(models.Model):
     pojazd = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='policies')
     numer_polisy = models.CharField(max_length=100, verbose_name="Numer Polisy")
-    ubezpieczyciel = models.CharField(max_length=100, verbose_name="Towarzystwo Ubezpieczeniowe")
-    data_waznosci_oc = models.DateField(verbose_name="Ważność OC")
+    ubezpieczyciel = models.CharField(max_length=100, verbose_name="Towarzystwo Ubezpieczeniowe", db_index=True)
+    data_waznosci_oc = models.DateField(verbose_name="Ważność OC", db_index=True)
     data_waznosci_ac = models.DateField(verbose_name="Ważność AC", null=True, blank=True)
     koszt = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
@@ -202,10 +273,10 @@ class InsurancePolicy(models.Model):
         verbose_name_plural = "Polisy Ubezpieczeniowe"
 
 
-class DamageEvent(models.Model):
+class DamageEvent(RowVersioned, SyncTracked):
     pojazd = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='damage_history')
     opis = models.TextField(verbose_name="Opis Szkody")
-    data_zdarzenia = models.DateField(verbose_name="Data Zdarzenia")
+    data_zdarzenia = models.DateField(verbose_name="Data Zdarzenia", db_index=True)
     szacowany_koszt = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     zgloszony_do_ubezpieczyciela = models.BooleanField(default=False)
 
@@ -217,9 +288,23 @@ class DamageEvent(models.Model):
             ('W_NAPRAWIE', 'W naprawie'),
             ('ZAMKNIETA', 'Zamknięta'),
         ],
-        default='ZGLOSZONA'
+        default='ZGLOSZONA',
+        db_index=True
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Zapamiętujemy stan z bazy, żeby przy zapisie wiedzieć, czy zmienił się licznik szkód
+        loaded = dict(zip(field_names, values))
+        if 'pojazd_id' in loaded and 'status_naprawy' in loaded:
+            instance._loaded_damage_state = (loaded['pojazd_id'], loaded['status_naprawy'])
+        return instance
+
+    @property
+    def is_open(self):
+        return self.status_naprawy in OPEN_DAMAGE_STATUSES
+
     def __str__(self):
         return f"Szkoda {self.pojazd.registration_number} z dnia {self.data_zdarzenia}"
 
@@ -228,7 +313,7 @@ class DamageEvent(models.Model):
         verbose_name_plural = "Zdarzenia Szkodowe"
 
 
-class VehicleHandover(models.Model):
+class VehicleHandover(RowVersioned, SyncTracked):
     kierowca = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='handovers')
     pojazd = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='handovers')
 
@@ -236,8 +321,9 @@ class VehicleHandover(models.Model):
     reservation = models.ForeignKey('Reservation', on_delete=models.SET_NULL, null=True, blank=True,
                                     verbose_name="Źródłowa Rezerwacja")
 
-    data_wydania = models.DateField(verbose_name="Data Wydania")
-    data_zwrotu = models.DateField(verbose_name="Data Zwrotu", null=True, blank=True)
+    # Indeksy - filtry i nawigacja po datach w panelu admina przy milionach wydań
+    data_wydania = models.DateField(verbose_name="Data Wydania", db_index=True)
+    data_zwrotu = models.DateField(verbose_name="Data Zwrotu", null=True, blank=True, db_index=True)
     uwagi = models.TextField(blank=True, null=True)
 
     # --- NOWE POLA: DOKUMENTY ---
@@ -269,13 +355,29 @@ class VehicleHandover(models.Model):
     # Pole obliczane (Suma)
     calkowity_koszt = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, blank=True)
 
+    def compute_total(self):
+        """Koszt rozliczenia: km x stawka + dopłata za paliwo, dokładnie na Decimal (zaokrąglenie do grosza)."""
+        dystans = max(self.przebieg_stop - self.przebieg_start, 0)
+        total = dystans * Decimal(str(self.stawka_za_km)) + Decimal(str(self.koszt_brakujacego_paliwa))
+        return total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    def is_return(self):
+        """Zapis zamyka wydanie: przebieg końcowy wpisany teraz (nowe wydanie albo dotąd otwarte)."""
+        if self.przebieg_stop is None:
+            return False
+        return self._state.adding or VehicleHandover.objects.filter(pk=self.pk, przebieg_stop__isnull=True).exists()
+
     def save(self, *args, **kwargs):
-        # 1. Automatyczne obliczanie kosztów (To już miałeś)
+        # 0. Stawki z RateTable, gdy klient ich nie podał - przy wydaniu i przy zwrocie
+        # (import w metodzie - pricing importuje modele)
+        returning = self.is_return()
+        if self._state.adding or returning:
+            from .pricing import apply_rate_table
+            apply_rate_table(self, returning)
+
+        # 1. Automatyczne obliczanie kosztów (masowo - fleet_core/pricing.py)
         if self.przebieg_stop and self.przebieg_start:
-            dystans = self.przebieg_stop - self.przebieg_start
-            if dystans < 0: dystans = 0
-            koszt_km = dystans * float(self.stawka_za_km)
-            self.calkowity_koszt = koszt_km + float(self.koszt_brakujacego_paliwa)
+            self.calkowity_koszt = self.compute_total()
 
         # 2. NOWOŚĆ: Automatyczna aktualizacja przebiegu w pojeździe
         # Działa tylko, gdy wpisano przebieg końcowy (zwrot)
@@ -295,7 +397,7 @@ class VehicleHandover(models.Model):
 # ----------------------------------------------------
 # MODEL REZERWACJI (NOWE)
 # ----------------------------------------------------
-class Reservation(models.Model):
+class Reservation(SyncTracked):
     first_name = models.CharField(max_length=100, verbose_name="Imię Kierowcy")
     last_name = models.CharField(max_length=100, verbose_name="Nazwisko Kierowcy")
 
@@ -375,7 +477,7 @@ class ReservationFile(models.Model):
     def __str__(self):
         return f"Plik {self.id} dla rezerwacji {self.reservation_id}"
 
-class VehicleDocument(models.Model):
+class VehicleDocument(SyncTracked):
     vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='documents', verbose_name="Pojazd")
     title = models.CharField(max_length=200, verbose_name="Nazwa Dokumentu")
     file = models.FileField(upload_to='pojazdy_docs/', verbose_name="Plik")
@@ -386,6 +488,39 @@ class VehicleDocument(models.Model):
         return f"{self.title} ({self.vehicle.registration_number})"
 
 
+class OdometerReading(models.Model):
+    """
+    Dziennik odczytów licznika (tylko dopisywanie): wydania, zwroty, serwisy i ręczne korekty.
+    Historia przebiegu bez przeglądania wydań - agregacje w fleet_core/odometer.py.
+    """
+    SOURCE_CHOICES = [
+        ('WYDANIE', 'Wydanie pojazdu'),
+        ('ZWROT', 'Zwrot pojazdu'),
+        ('SERWIS', 'Serwis'),
+        ('RECZNY', 'Wpis ręczny'),
+    ]
+
+    pojazd = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='odometer_readings')
+    data_odczytu = models.DateField(verbose_name="Data odczytu", db_index=True)
+    przebieg = models.PositiveIntegerField(verbose_name="Przebieg (km)")
+    zrodlo = models.CharField(max_length=10, choices=SOURCE_CHOICES, verbose_name="Źródło")
+    # Id wydania/serwisu, z którego pochodzi odczyt (zwykła liczba - wpis przetrwa usunięcie źródła)
+    zrodlo_id = models.BigIntegerField(null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Odczyty licznika można tylko dopisywać.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.pojazd_id}: {self.przebieg} km ({self.data_odczytu})"
+
+    class Meta:
+        verbose_name = "Odczyt Licznika"
+        verbose_name_plural = "Odczyty Licznika"
+        indexes = [models.Index(fields=['pojazd', 'data_odczytu'], name='odometer_vehicle_date')]
+
+
 class GlobalSettings(models.Model):
     # --- DANE FIRMY (DO WYDRUKÓW) ---
     company_name = models.CharField(max_length=200, verbose_name="Nazwa Twojej Firmy", default="Moja Flota Sp. z o.o.")
@@ -409,4 +544,136 @@ class GlobalSettings(models.Model):
         super(GlobalSettings, self).save(*args, **kwargs)
 
     def __str__(self):
-        return "Ustawienia Globalne Systemu"
\ No newline at end of file
+        return "Ustawienia Globalne Systemu"
+
+
+class RateTier(models.Model):
+    """
+    Stawka rozliczeniowa dla typu pojazdu i/lub rodzaju paliwa - nadpisuje domyślne stawki z GlobalSettings.
+    Puste pole pasuje do każdej wartości; wygrywa najbardziej szczegółowy wpis (fleet_core/pricing.py).
+    """
+    typ_pojazdu = models.CharField(max_length=30, choices=Vehicle.TYPE_CHOICES, blank=True, default='',
+                                   verbose_name="Typ pojazdu (puste = każdy)")
+    fuel_type = models.CharField(max_length=20, choices=FUEL_TYPES, blank=True, default='',
+                                 verbose_name="Rodzaj paliwa (puste = każdy)")
+    stawka_za_km = models.DecimalField(max_digits=6, decimal_places=2, verbose_name="Stawka za km (PLN)")
+    oplata_za_paliwo = models.DecimalField(max_digits=6, decimal_places=2, verbose_name="Opłata za paliwo (PLN)")
+
+    def __str__(self):
+        return f"{self.typ_pojazdu or 'Każdy typ'} / {self.fuel_type or 'każde paliwo'}: {self.stawka_za_km} PLN/km"
+
+    class Meta:
+        verbose_name = "Stawka Rozliczeniowa"
+        verbose_name_plural = "Stawki Rozliczeniowe"
+        constraints = [models.UniqueConstraint(fields=['typ_pojazdu', 'fuel_type'], name='rate_tier_unique')]
+
+
+class RevokedToken(models.Model):
+    """
+    Lista unieważnionych tokenów JWT (deny-list dla ClaimsJWTAuthentication).
+    jti - pojedynczy token; samo user_pk - wszystkie tokeny użytkownika wydane przed revoked_at.
+    """
+    # Zwykła liczba zamiast FK - wpis musi przetrwać usunięcie konta
+    user_pk = models.BigIntegerField(null=True, blank=True, db_index=True)
+    jti = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Ważne do (potem wpis można usunąć)")
+
+    def __str__(self):
+        return f"Unieważnienie {self.jti or f'wszystkich tokenów użytkownika {self.user_pk}'}"
+
+    class Meta:
+        verbose_name = "Unieważniony Token"
+        verbose_name_plural = "Unieważnione Tokeny"
+
+
+class SyncTombstone(models.Model):
+    """
+    Ślad po usuniętym obiekcie dla /api/sync/ - telefon usuwa go u siebie przy następnej synchronizacji.
+    vehicle_id / user_pk - zakres widoczności (kierowca dostaje tylko ślady swoich obiektów).
+    """
+    # Zwykłe liczby zamiast FK - obiekty już nie istnieją
+    entity = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    vehicle_id = models.BigIntegerField(null=True, blank=True)
+    user_pk = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Usunięto {self.entity} #{self.object_id}"
+
+    class Meta:
+        verbose_name = "Ślad Usunięcia"
+        verbose_name_plural = "Ślady Usunięć"
+
+
+# ----------------------------------------------------
+# ARCHIWUM (fleet_core/archive.py) - zamknięte wydania i zakończone rezerwacje starsze niż
+# FLEET_ARCHIVE_AFTER_DAYS. Te same nazwy kolumn i id co w tabelach bieżących; historia i raporty
+# czytają obie tabele.
+# ----------------------------------------------------
+class ArchivedHandover(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # id z VehicleHandover
+    kierowca = models.ForeignKey(Driver, on_delete=models.CASCADE, related_name='archived_handovers')
+    pojazd = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='archived_handovers')
+    # Zwykła liczba - rezerwacja też może trafić do archiwum
+    reservation_id = models.BigIntegerField(null=True, blank=True)
+
+    data_wydania = models.DateField(verbose_name="Data Wydania", db_index=True)
+    data_zwrotu = models.DateField(verbose_name="Data Zwrotu", null=True, blank=True)
+    uwagi = models.TextField(blank=True, null=True)
+
+    scan_agreement = models.FileField(upload_to='handovers/umowy/', null=True, blank=True)
+    scan_handover_protocol = models.FileField(upload_to='handovers/protokoly_wydania/', null=True, blank=True)
+    scan_return_protocol = models.FileField(upload_to='handovers/protokoly_zwrotu/', null=True, blank=True)
+
+    przebieg_start = models.IntegerField(default=0)
+    przebieg_stop = models.IntegerField(null=True, blank=True)
+    paliwo_start = models.CharField(max_length=10, choices=VehicleHandover.FUEL_LEVELS, default='100')
+    paliwo_stop = models.CharField(max_length=10, choices=VehicleHandover.FUEL_LEVELS, null=True, blank=True)
+    stawka_za_km = models.DecimalField(max_digits=6, decimal_places=2, default=0.00)
+    koszt_brakujacego_paliwa = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
+    calkowity_koszt = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.pojazd} -> {self.kierowca} ({self.data_wydania}, archiwum)"
+
+    class Meta:
+        verbose_name = "Wydanie (Archiwum)"
+        verbose_name_plural = "Wydania (Archiwum)"
+
+
+class ArchivedReservation(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # id z Reservation
+    first_name = models.CharField(max_length=100, verbose_name="Imię Kierowcy")
+    last_name = models.CharField(max_length=100, verbose_name="Nazwisko Kierowcy")
+    company = models.CharField(max_length=200, verbose_name="Nazwa Firmy")
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True, db_index=True)
+    vehicle_type = models.CharField(max_length=30, choices=Vehicle.TYPE_CHOICES)
+    assigned_vehicle = models.ForeignKey(Vehicle, on_delete=models.SET_NULL, null=True, blank=True,
+                                         related_name='archived_reservations')
+    driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, blank=True,
+                               related_name='archived_reservations')
+    additional_info = models.TextField(null=True, blank=True)
+    scan_agreement = models.FileField(upload_to='umowy/', null=True, blank=True)
+    status = models.CharField(max_length=20, choices=Reservation.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Rezerwacja: {self.first_name} {self.last_name} ({self.status}, archiwum)"
+
+    class Meta:
+        verbose_name = "Rezerwacja (Archiwum)"
+        verbose_name_plural = "Rezerwacje (Archiwum)"
+
+
+class ArchivedReservationFile(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # id z ReservationFile
+    reservation = models.ForeignKey(ArchivedReservation, on_delete=models.CASCADE, related_name='attachments')
+    file = models.FileField(upload_to='umowy/')
+    uploaded_at = models.DateTimeField()
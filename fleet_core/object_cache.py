@@ -0,0 +1,97 @@
+# fleet_core/object_cache.py
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models.manager import BaseManager
+from rest_framework import serializers
+
+from .response_cache import ResponseCache
+
+
+class RepresentationCache:
+    """LRU w pamięci procesu: (model, pk, wersja wiersza, ...) -> gotowy słownik z to_representation()."""
+
+    def __init__(self, max_entries=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.max_entries = max_entries
+        self.hits = self.misses = 0
+
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = value
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items):
+        limit = self.max_entries or getattr(settings, 'FLEET_OBJECT_CACHE_ENTRIES', 20000)
+        with self._lock:
+            for key, value in items:
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > limit:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+representation_cache = RepresentationCache()
+
+
+class VersionedListSerializer(serializers.ListSerializer):
+    """
+    Lista, która serializuje tylko zmienione wiersze - resztę bierze z representation_cache.
+    Klucz wiersza: model, pk, child.cache_version(obj), wersje modeli z cache_depends_on
+    (pobrane raz na listę) oraz host żądania (pola plików to absolutne URL-e).
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, BaseManager) else data
+        child = self.child
+        if not getattr(settings, 'FLEET_OBJECT_CACHE_ENABLED', True):
+            return [child.to_representation(item) for item in iterable]
+
+        request = self.context.get('request')
+        host = request.build_absolute_uri('/') if request is not None else ''
+        depends = ResponseCache.versions(m._meta.label_lower for m in child.cache_depends_on)
+        prefix = (type(child).__name__, host, tuple(sorted(depends.items())))
+
+        items = list(iterable)
+        keys = [(prefix, item.pk, child.cache_version(item)) for item in items]
+        cached = representation_cache.get_many(keys)
+        result, fresh = [], []
+        for key, item in zip(keys, items):
+            representation = cached.get(key)
+            if representation is None:
+                representation = child.to_representation(item)
+                fresh.append((key, representation))
+            result.append(representation)
+        if fresh:
+            representation_cache.set_many(fresh)
+        return result
+
+
+class RowVersionCacheMixin:
+    """
+    Dla ModelSerializerów modeli z row_version (models.RowVersioned), razem z
+    Meta.list_serializer_class = VersionedListSerializer.
+    cache_depends_on - modele czytane przez pola zagnieżdżone, których zapis nie zmienia row_version wiersza.
+    """
+
+    cache_depends_on = ()
+
+    def cache_version(self, obj):
+        return obj.row_version
@@ -0,0 +1,105 @@
+# fleet_core/odometer.py
+
+import datetime
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max, Min
+from django.db.models.functions import TruncMonth
+
+from .models import OdometerReading, Vehicle
+
+SOURCE_HANDOVER_START = 'WYDANIE'
+SOURCE_HANDOVER_STOP = 'ZWROT'
+SOURCE_SERVICE = 'SERWIS'
+SOURCE_MANUAL = 'RECZNY'
+
+
+def record_reading(vehicle_id, date, km, source, source_id=None):
+    """
+    Dopisuje odczyt licznika. Ponowny zapis tego samego wydania/serwisu z niezmienionym
+    przebiegiem i datą nie tworzy duplikatu. Zwraca nowy odczyt albo None.
+    """
+    if not vehicle_id or not km or km <= 0 or date is None:
+        return None
+    km = int(km)
+    if source_id is not None and OdometerReading.objects.filter(
+        pojazd_id=vehicle_id, zrodlo=source, zrodlo_id=source_id, przebieg=km, data_odczytu=date
+    ).exists():
+        return None
+    return OdometerReading.objects.create(pojazd_id=vehicle_id, data_odczytu=date, przebieg=km, zrodlo=source,
+                                          zrodlo_id=source_id)
+
+
+def record_manual_reading(vehicle, km, date=None):
+    """Ręczny odczyt + podbicie Vehicle.przebieg, jeśli licznik poszedł do przodu."""
+    reading = record_reading(vehicle.pk, date or datetime.date.today(), km, SOURCE_MANUAL)
+    if reading and km > vehicle.przebieg:
+        vehicle.przebieg = km
+        vehicle.save(update_fields=['przebieg'])
+    return reading
+
+
+def monthly_km(start, end, vehicle_ids=None):
+    """
+    Kilometry per pojazd i miesiąc: {vehicle_id: {'RRRR-MM': km}}.
+    Zapytanie grupujące (maks./min. odczyt w miesiącu) owinięte oknem LAG po miesiącach pojazdu - przejechane
+    km to maksimum miesiąca minus maksimum poprzedniego miesiąca z odczytami (dla pierwszego - minimum).
+    """
+    readings = OdometerReading.objects.filter(data_odczytu__lte=end)
+    if vehicle_ids is not None:
+        readings = readings.filter(pojazd_id__in=vehicle_ids)
+    grouped = (
+        readings.annotate(miesiac=TruncMonth('data_odczytu'))
+        .values('pojazd_id', 'miesiac')
+        .annotate(km_max=Max('przebieg'), km_min=Min('przebieg'))
+        .order_by()
+    )
+    # ORM wstawia okno nad agregatem do GROUP BY - okno liczymy piętro wyżej, nad zapytaniem grupującym
+    sql, params = grouped.query.sql_with_params()
+    with connections[grouped.db].cursor() as cursor:
+        cursor.execute(
+            "SELECT m.pojazd_id, m.miesiac, m.km_max, m.km_min, "
+            "LAG(m.km_max) OVER (PARTITION BY m.pojazd_id ORDER BY m.miesiac) "
+            f"FROM ({sql}) m ORDER BY m.pojazd_id, m.miesiac",
+            params,
+        )
+        rows = cursor.fetchall()
+
+    first_month = start.strftime('%Y-%m')
+    result = {}
+    for vehicle_id, month, km_max, km_min, km_previous in rows:
+        month = str(month)[:7]  # SQLite zwraca tekst, MySQL - datę
+        if month < first_month:
+            continue  # wcześniejsze miesiące tylko jako punkt odniesienia dla LAG
+        baseline = km_previous if km_previous is not None else km_min
+        result.setdefault(vehicle_id, {})[month] = max(km_max - baseline, 0)
+    return result
+
+
+def daily_average(start, end, vehicle_ids=None):
+    """
+    Średni dzienny przebieg per pojazd w okresie (pierwszy i ostatni odczyt w okresie),
+    posortowany malejąco; over_limit - powyżej FLEET_ODOMETER_DAILY_LIMIT_KM.
+    """
+    readings = OdometerReading.objects.filter(data_odczytu__range=(start, end))
+    if vehicle_ids is not None:
+        readings = readings.filter(pojazd_id__in=vehicle_ids)
+    rows = readings.values('pojazd_id').annotate(
+        km_min=Min('przebieg'), km_max=Max('przebieg'), od=Min('data_odczytu'), do=Max('data_odczytu'),
+    ).order_by()
+    registrations = dict(Vehicle.objects.filter(pk__in=[r['pojazd_id'] for r in rows])
+                         .values_list('id', 'registration_number'))
+    limit = getattr(settings, 'FLEET_ODOMETER_DAILY_LIMIT_KM', 400)
+    result = []
+    for row in rows:
+        days = (row['do'] - row['od']).days
+        km = row['km_max'] - row['km_min']
+        average = round(km / days, 1) if days > 0 else None
+        result.append({
+            'vehicle': row['pojazd_id'], 'registration_number': registrations.get(row['pojazd_id']),
+            'km': km, 'days': days, 'first_reading': row['od'], 'last_reading': row['do'],
+            'avg_daily_km': average, 'over_limit': average is not None and average > limit,
+        })
+    result.sort(key=lambda r: -(r['avg_daily_km'] or 0))
+    return result
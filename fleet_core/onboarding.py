@@ -0,0 +1,130 @@
+# fleet_core/onboarding.py
+
+from django.db import transaction
+
+from . import search
+from .autocomplete import index as autocomplete_index, driver_entry
+from .models import CustomUser, Driver, FleetCompany
+from .response_cache import response_cache
+from .pools import hash_passwords
+from .serializers import DriverOnboardingRowDto
+
+SPREADSHEET_CONTENT_TYPES = (
+    'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+)
+
+
+def rows_from_spreadsheet(uploaded_file):
+    """Wiersze z pierwszego arkusza .xlsx - pierwszy wiersz to nagłówki (nazwy pól)."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        headers = [str(h).strip() if h is not None else '' for h in next(rows, [])]
+        result = []
+        for values in rows:
+            if all(v is None or str(v).strip() == '' for v in values):
+                continue
+            result.append({
+                header: '' if value is None else str(value).strip()
+                for header, value in zip(headers, values) if header
+            })
+        return result
+    finally:
+        workbook.close()
+
+
+def validate_rows(rows):
+    """
+    Walidacja wszystkich wierszy: pola (DriverOnboardingRowDto), duplikaty w pliku
+    i loginy już istniejące w bazie (jedno zapytanie). Zwraca (poprawne, błędy).
+    """
+    valid, errors = [], []
+    seen = {}
+    for index, row in enumerate(rows, start=1):
+        serializer = DriverOnboardingRowDto(data=row)
+        if not serializer.is_valid():
+            errors.append({'row': index, 'errors': serializer.errors})
+            continue
+        data = serializer.validated_data
+        username = data['username']
+        if username in seen:
+            errors.append({'row': index, 'errors': {'username': [f"Duplikat loginu z wiersza {seen[username]}."]}})
+            continue
+        seen[username] = index
+        valid.append((index, data))
+
+    existing = set(
+        CustomUser.objects.filter(username__in=[data['username'] for _, data in valid])
+        .values_list('username', flat=True)
+    )
+    if existing:
+        errors.extend(
+            {'row': index, 'errors': {'username': ['Użytkownik istnieje.']}}
+            for index, data in valid if data['username'] in existing
+        )
+        valid = [(index, data) for index, data in valid if data['username'] not in existing]
+    errors.sort(key=lambda e: e['row'])
+    return valid, errors
+
+
+def resolve_companies(names):
+    """Nazwa firmy -> id: jedno zapytanie o istniejące + bulk_create brakujących."""
+    names = {name for name in names}
+    companies = {}
+    for company_id, nazwa in FleetCompany.objects.filter(nazwa__in=names).order_by('id').values_list('id', 'nazwa'):
+        companies.setdefault(nazwa, company_id)
+    missing = names - companies.keys()
+    if missing:
+        FleetCompany.objects.bulk_create([FleetCompany(nazwa=name, nip='') for name in missing])
+        for company_id, nazwa in FleetCompany.objects.filter(nazwa__in=missing).order_by('id').values_list('id', 'nazwa'):
+            companies.setdefault(nazwa, company_id)
+    return companies
+
+
+def onboard_drivers(rows, dry_run=False, batch_size=500):
+    """
+    Masowe zakładanie kont kierowców: walidacja, równoległe haszowanie haseł w procesach,
+    potem firmy, użytkownicy i kierowcy przez bulk_create w jednej transakcji.
+    Przy jakimkolwiek błędzie nic nie jest zapisywane.
+    """
+    valid, errors = validate_rows(rows)
+    report = {'rows': len(rows), 'valid': len(valid), 'created': 0, 'dry_run': dry_run, 'errors': errors}
+    if errors or dry_run or not valid:
+        return report
+
+    hashes = hash_passwords([data['password'] for _, data in valid])
+
+    with transaction.atomic():
+        companies = resolve_companies(data['company_name'] for _, data in valid)
+        CustomUser.objects.bulk_create([
+            CustomUser(
+                username=data['username'], password=password_hash, email=data['email'], rola='DRIVER',
+                first_name=data['first_name'], last_name=data['last_name'],
+            ) for (_, data), password_hash in zip(valid, hashes)
+        ], batch_size=batch_size)
+        user_ids = dict(
+            CustomUser.objects.filter(username__in=[data['username'] for _, data in valid])
+            .values_list('username', 'id')
+        )
+        Driver.objects.bulk_create([
+            Driver(
+                user_id=user_ids[data['username']], company_id=companies[data['company_name']], aktywny=True,
+                numer_prawa_jazdy=data['numer_prawa_jazdy'], kategorie_prawa_jazdy=data['kategorie_prawa_jazdy'] or 'B',
+            ) for _, data in valid
+        ], batch_size=batch_size)
+        # bulk_create omija sygnały - nowych kierowców dopisujemy do indeksów wyszukiwania sami
+        drivers = list(Driver.objects.select_related('user', 'company').filter(user_id__in=user_ids.values()))
+        search.index_documents(search.driver_document(d) for d in drivers)
+        response_cache.invalidate_on_commit(CustomUser, Driver, FleetCompany)
+        if autocomplete_index.loaded:
+            entries = [driver_entry(d) for d in drivers]
+
+            def add_to_autocomplete():
+                for entry in entries:
+                    autocomplete_index.upsert(entry)
+            transaction.on_commit(add_to_autocomplete)
+
+    report['created'] = len(valid)
+    return report
@@ -0,0 +1,105 @@
+# fleet_core/pools.py
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+
+class PoolSaturated(Exception):
+    """Pula jest pełna (wszyscy workerzy zajęci i kolejka wyczerpana)."""
+
+
+class BoundedExecutor:
+    """
+    ThreadPoolExecutor z ograniczoną kolejką: max_workers zadań w toku + max_pending czekających.
+    Gdy limit jest wyczerpany, submit() od razu rzuca PoolSaturated zamiast kolejkować bez końca.
+    Haszowanie PBKDF2 (hashlib) zwalnia GIL, więc wątki dają realną równoległość.
+    """
+
+    def __init__(self, max_workers, max_pending, thread_name_prefix='fleet-pool'):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_pending
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    def submit(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise PoolSaturated()
+        try:
+            future = self._executor.submit(self._run, fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    @staticmethod
+    def _run(fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            # Wątki puli żyją poza cyklem żądania - sami sprzątamy połączenia DB
+            close_old_connections()
+
+    async def run(self, fn, *args, **kwargs):
+        """Wersja dla widoków async: czeka na wynik bez blokowania pętli zdarzeń."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+
+_login_pool = None
+_login_pool_lock = threading.Lock()
+
+
+def get_login_pool():
+    """Pula do haszowania haseł przy logowaniu (FLEET_LOGIN_WORKERS / FLEET_LOGIN_QUEUE)."""
+    global _login_pool
+    if _login_pool is None:
+        with _login_pool_lock:
+            if _login_pool is None:
+                workers = getattr(settings, 'FLEET_LOGIN_WORKERS', None) or os.cpu_count() or 2
+                pending = getattr(settings, 'FLEET_LOGIN_QUEUE', None)
+                _login_pool = BoundedExecutor(
+                    max_workers=workers,
+                    max_pending=workers * 4 if pending is None else pending,
+                    thread_name_prefix='fleet-login',
+                )
+    return _login_pool
+
+
+# --- HASZOWANIE HASEŁ W PROCESACH (masowy import kierowców) ---
+
+def _init_hash_worker():
+    # Przy starcie metodą 'spawn' proces potomny nie ma skonfigurowanego Django
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Server.settings')
+        django.setup()
+
+
+def _hash_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
+
+
+def hash_passwords(passwords, processes=None):
+    """
+    make_password() dla listy haseł równolegle w procesach (ProcessPoolExecutor).
+    Kolejność wyniku odpowiada kolejności wejścia.
+    """
+    passwords = list(passwords)
+    if not passwords:
+        return []
+    processes = processes or getattr(settings, 'FLEET_ONBOARD_PROCESSES', None) or os.cpu_count() or 2
+    processes = min(processes, len(passwords))
+    if processes == 1:
+        return [_hash_password(p) for p in passwords]
+    chunksize = max(1, len(passwords) // (processes * 4))
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_hash_worker) as pool:
+        return list(pool.map(_hash_password, passwords, chunksize=chunksize))
@@ -0,0 +1,140 @@
+# fleet_core/pricing.py
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import VehicleHandover, GlobalSettings, RateTier, next_row_version
+from .response_cache import response_cache
+
+PRICED_FIELDS = ('stawka_za_km', 'koszt_brakujacego_paliwa', 'calkowity_koszt')
+
+
+class RateTable:
+    """
+    Stawki w pamięci na czas jednego przeliczenia: domyślne z GlobalSettings + progi RateTier.
+    Kolejność dopasowania: typ i paliwo, sam typ, samo paliwo, domyślne.
+    """
+
+    def __init__(self, default_rate, default_fuel_penalty, tiers=()):
+        self.default = (Decimal(str(default_rate)), Decimal(str(default_fuel_penalty)))
+        self.tiers = {(typ, fuel): (Decimal(str(rate)), Decimal(str(penalty)))
+                      for typ, fuel, rate, penalty in tiers}
+
+    @classmethod
+    def load(cls):
+        defaults = GlobalSettings.objects.first() or GlobalSettings()
+        return cls(defaults.default_rate_km, defaults.default_fuel_penalty,
+                   RateTier.objects.values_list('typ_pojazdu', 'fuel_type', 'stawka_za_km', 'oplata_za_paliwo'))
+
+    def resolve(self, typ_pojazdu, fuel_type):
+        """(stawka za km, opłata za brakujące paliwo) dla pojazdu."""
+        for key in ((typ_pojazdu, fuel_type), (typ_pojazdu, ''), ('', fuel_type)):
+            if key in self.tiers:
+                return self.tiers[key]
+        return self.default
+
+
+def fuel_charge(paliwo_start, paliwo_stop, penalty):
+    """Opłata ryczałtowa, gdy pojazd wrócił z mniejszą ilością paliwa niż został wydany."""
+    if paliwo_stop in (None, '') or int(paliwo_stop) >= int(paliwo_start):
+        return Decimal('0.00')
+    return penalty
+
+
+def apply_rate_table(handover, returning, rates=None):
+    """
+    Stawki dla wydania zapisywanego bez nich (VehicleHandover.save) - przy wydaniu i przy zwrocie.
+    Pole z wartością domyślną 0.00 traktujemy jak niepodane: stawka za km z RateTable, a przy zwrocie
+    z mniejszą ilością paliwa - opłata za paliwo. Stawki podane przez klienta zostają bez zmian.
+    """
+    needs_rate = not Decimal(str(handover.stawka_za_km))
+    needs_fuel = (returning and not Decimal(str(handover.koszt_brakujacego_paliwa))
+                  and fuel_charge(handover.paliwo_start, handover.paliwo_stop, Decimal('1')))
+    if not (needs_rate or needs_fuel):
+        return
+    rate, penalty = (rates or RateTable.load()).resolve(handover.pojazd.typ_pojazdu, handover.pojazd.fuel_type)
+    if needs_rate:
+        handover.stawka_za_km = rate
+    if needs_fuel:
+        handover.koszt_brakujacego_paliwa = fuel_charge(handover.paliwo_start, handover.paliwo_stop, penalty)
+
+
+def select_handovers(open_only=False, date_from=None, date_to=None, vehicle_ids=None):
+    """Wydania do przeliczenia: otwarte (bez zwrotu), wydane w okresie, konkretnych pojazdów - łącznie."""
+    handovers = VehicleHandover.objects.all()
+    if open_only:
+        handovers = handovers.filter(data_zwrotu__isnull=True)
+    if date_from is not None:
+        handovers = handovers.filter(data_wydania__gte=date_from)
+    if date_to is not None:
+        handovers = handovers.filter(data_wydania__lte=date_to)
+    if vehicle_ids:
+        handovers = handovers.filter(pojazd_id__in=vehicle_ids)
+    return handovers
+
+
+def reprice(handovers, dry_run=True, fuel=False, rates=None, batch_size=None, max_changes=None):
+    """
+    Przelicza wydania wg bieżących stawek: nowa stawka za km, przy fuel=True także dopłata za paliwo,
+    i koszt całkowity (rozliczone wydania - z oboma przebiegami). Paczki po batch_size wierszy czytane
+    po kluczu (bez OFFSET) i zapisywane jednym bulk_update na paczkę; dry_run - tylko raport różnic.
+    W raporcie szczegóły co najwyżej max_changes zmian (FLEET_REPRICE_MAX_CHANGES) - liczniki i sumy
+    obejmują wszystkie wiersze, changes_truncated mówi, że lista jest niepełna.
+    """
+    rates = rates or RateTable.load()
+    batch_size = batch_size or getattr(settings, 'FLEET_REPRICE_BATCH', 500)
+    if max_changes is None:
+        max_changes = getattr(settings, 'FLEET_REPRICE_MAX_CHANGES', 200)
+    report = {'dry_run': dry_run, 'checked': 0, 'changed': 0, 'total_before': Decimal('0.00'),
+              'total_after': Decimal('0.00'), 'changes': [], 'changes_truncated': False}
+    columns = ('id', 'pojazd_id', 'pojazd__registration_number', 'pojazd__typ_pojazdu', 'pojazd__fuel_type',
+               'przebieg_start', 'przebieg_stop', 'paliwo_start', 'paliwo_stop', *PRICED_FIELDS)
+
+    last_id = 0
+    while True:
+        rows = list(handovers.filter(id__gt=last_id).order_by('id').values_list(*columns)[:batch_size])
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        changed = []
+        for (pk, vehicle_id, registration, typ, fuel_type, km_start, km_stop, fuel_start, fuel_stop,
+             rate, fuel_cost, total) in rows:
+            new_rate, penalty = rates.resolve(typ, fuel_type)
+            handover = VehicleHandover(id=pk, przebieg_start=km_start, przebieg_stop=km_stop, stawka_za_km=new_rate,
+                                       koszt_brakujacego_paliwa=fuel_charge(fuel_start, fuel_stop, penalty)
+                                       if fuel else fuel_cost)
+            # Jak w VehicleHandover.save: koszt liczymy tylko dla wydań z oboma przebiegami
+            handover.calkowity_koszt = handover.compute_total() if km_stop and km_start else total
+            report['checked'] += 1
+            report['total_before'] += total
+            report['total_after'] += handover.calkowity_koszt
+            before = (rate, fuel_cost, total)
+            after = tuple(getattr(handover, field) for field in PRICED_FIELDS)
+            if before == after:
+                continue
+            changed.append(handover)
+            if len(report['changes']) >= max_changes:
+                report['changes_truncated'] = True
+                continue
+            report['changes'].append({
+                'id': pk, 'vehicle': vehicle_id, 'registration_number': registration,
+                'before': dict(zip(PRICED_FIELDS, before)), 'after': dict(zip(PRICED_FIELDS, after)),
+                'delta': handover.calkowity_koszt - total,
+            })
+
+        report['changed'] += len(changed)
+        if changed and not dry_run:
+            # bulk_update omija save() - wersja wiersza i znacznik synchronizacji ręcznie
+            version, now = next_row_version(), timezone.now()
+            for handover in changed:
+                handover.row_version, handover.updated_at = version, now
+            with transaction.atomic():
+                VehicleHandover.objects.bulk_update(changed, [*PRICED_FIELDS, 'row_version', 'updated_at'])
+                response_cache.invalidate_on_commit(VehicleHandover)
+
+    report['delta'] = report['total_after'] - report['total_before']
+    return report
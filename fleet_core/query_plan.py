@@ -0,0 +1,58 @@
+# fleet_core/query_plan.py
+
+from django.db.models import Prefetch
+
+
+class QueryPlanMixin:
+    """
+    Dla ModelSerializerów: deklaracja relacji czytanych przez pola, żeby widok pobrał je z góry
+    (bez N+1). query_plan = {'pole': ('relacja', 'relacja__dalej', Prefetch(...))} - ścieżki jak
+    w select_related/prefetch_related; query_plan_always - relacje potrzebne zawsze (np. cache_version).
+    """
+
+    query_plan = {}
+    query_plan_always = ()
+
+    def related_paths(self):
+        """Ścieżki relacji dla pól, które trafią do odpowiedzi (bez write_only)."""
+        paths = list(self.query_plan_always)
+        for name, field in self.fields.items():
+            if not field.write_only:
+                paths.extend(self.query_plan.get(name, ()))
+        return paths
+
+
+def _single_valued(model, path):
+    """Czy ścieżka idzie tylko po FK/OneToOne - wtedy select_related (JOIN), inaczej prefetch_related."""
+    for name in path.split('__'):
+        field = model._meta.get_field(name)
+        if not (field.is_relation and (field.many_to_one or field.one_to_one)):
+            return False
+        model = field.related_model
+    return True
+
+
+def apply_query_plan(queryset, serializer):
+    """Dokłada do querysetu select_related/prefetch_related z planu serializera."""
+    if not isinstance(serializer, QueryPlanMixin):
+        return queryset
+    selects, prefetches = [], []
+    for path in dict.fromkeys(serializer.related_paths()):
+        if isinstance(path, Prefetch):
+            prefetches.append(path)
+        elif _single_valued(queryset.model, path):
+            selects.append(path)
+        else:
+            prefetches.append(path)
+    if selects:
+        queryset = queryset.select_related(*selects)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    return queryset
+
+
+class QueryPlanViewSetMixin:
+    """ViewSet: queryset list/retrieve/update dostaje relacje z planu serializera widoku."""
+
+    def filter_queryset(self, queryset):
+        return apply_query_plan(super().filter_queryset(queryset), self.get_serializer())
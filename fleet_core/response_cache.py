@@ -0,0 +1,175 @@
+# fleet_core/response_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+
+VERSION_KEY = 'fleet_core:model_version:{}'
+
+# Role, dla których widoki zawężają dane do użytkownika - klucz cache zawiera też id użytkownika
+USER_SCOPED_ROLES = ('DRIVER', 'USER')
+
+
+def _label(model):
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+class ResponseCache:
+    """
+    Cache wyrenderowanych odpowiedzi GET w pamięci procesu: LRU z limitem liczby wpisów i bajtów.
+    Każdy wpis pamięta wersje modeli, z których powstał. Wersje trzymamy w cache Django, więc zapis
+    w jednym workerze unieważnia wpisy we wszystkich (przy cache współdzielonym, np. Redis/Memcached).
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # klucz -> (treść, content_type, {model: wersja}, wygasa)
+        self._bytes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = self.misses = 0
+
+    def _limits(self):
+        return (
+            self.max_entries or getattr(settings, 'FLEET_RESPONSE_CACHE_ENTRIES', 1000),
+            self.max_bytes or getattr(settings, 'FLEET_RESPONSE_CACHE_BYTES', 64 * 1024 * 1024),
+            self.ttl or getattr(settings, 'FLEET_RESPONSE_CACHE_TTL', 300),
+        )
+
+    @staticmethod
+    def versions(labels):
+        keys = {label: VERSION_KEY.format(label) for label in labels}
+        stored = cache.get_many(keys.values())
+        return {label: stored.get(key, 0) for label, key in keys.items()}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        content, content_type, versions, expires = entry
+        if expires < time.monotonic() or self.versions(versions) != versions:
+            self._discard(key)
+            self.misses += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        self.hits += 1
+        return content, content_type
+
+    def set(self, key, content, content_type, versions):
+        max_entries, max_bytes, ttl = self._limits()
+        if len(content) > max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                self._bytes -= len(previous[0])
+            self._entries[key] = (content, content_type, versions, time.monotonic() + ttl)
+            self._bytes += len(content)
+            while self._entries and (len(self._entries) > max_entries or self._bytes > max_bytes):
+                _, (evicted, _, _, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def _discard(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._bytes -= len(entry[0])
+
+    def invalidate(self, *models):
+        """Podbija wersje modeli - wpisy z nich zbudowane przestają być ważne (też w innych workerach)."""
+        labels = {_label(m) for m in models}
+        for label in labels:
+            key = VERSION_KEY.format(label)
+            if not cache.add(key, 1, timeout=None):
+                try:
+                    cache.incr(key)
+                except ValueError:  # klucz wygasł między add() a incr()
+                    cache.set(key, 1, timeout=None)
+        # Lokalne wpisy zależne od tych modeli zwalniamy od razu, nie czekając na następny odczyt
+        with self._lock:
+            stale = [k for k, (_, _, versions, _) in self._entries.items() if labels & versions.keys()]
+        for key in stale:
+            self._discard(key)
+
+    def invalidate_on_commit(self, *models):
+        """
+        Unieważnienie od razu (nie serwujemy już starej odpowiedzi) i ponownie po commicie -
+        odpowiedź zbudowana w międzyczasie mogła jeszcze nie widzieć niezatwierdzonego zapisu.
+        """
+        self.invalidate(*models)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: self.invalidate(*models))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    @property
+    def size_bytes(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
+
+
+class CachedResponseMixin:
+    """
+    Cache odpowiedzi list() i retrieve() dla ViewSetów fleet_core (tylko JSON, status 200).
+    Klucz: rola (+ id użytkownika dla ról z danymi zawężonymi do siebie) i ścieżka z parametrami.
+    cache_models - modele, od których zależy odpowiedź (zapis do nich unieważnia wpis po commicie).
+    """
+
+    cache_models = ()
+
+    def _cache_key(self, request):
+        user = request.user
+        role = getattr(user, 'rola', None)
+        if not user.is_authenticated or role not in getattr(
+            settings, 'FLEET_RESPONSE_CACHE_ROLES', ('ADMIN', 'LOGISTYKA', 'SERWIS', 'KSIĘGOWOŚĆ', 'DRIVER', 'USER')
+        ):
+            return None
+        if getattr(request, 'accepted_renderer', None) is None or request.accepted_renderer.format != 'json':
+            return None  # Browsable API pokazuje dane użytkownika - nie cache'ujemy HTML
+        scope = f"{role}:{user.id}" if role in USER_SCOPED_ROLES else role
+        return f"{scope}|{request.get_full_path()}"
+
+    def _cached(self, request, handler, *args, **kwargs):
+        key = self._cache_key(request)
+        if key is None:
+            return handler(request, *args, **kwargs)
+        hit = response_cache.get(key)
+        if hit is not None:
+            response = HttpResponse(hit[0], content_type=hit[1])
+            response['X-Cache'] = 'HIT'
+            return response
+
+        labels = [_label(m) for m in self.cache_models]
+        # Wersje odczytane PRZED zapytaniem - zapis w trakcie budowania odpowiedzi unieważni wpis
+        versions = ResponseCache.versions(labels)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            def store(rendered):
+                response_cache.set(key, rendered.content, rendered['Content-Type'], versions)
+            response.add_post_render_callback(store)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,198 @@
+# fleet_core/scheduling.py
+
+import datetime
+from bisect import bisect_right
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Vehicle, Reservation, VehicleHandover
+from .response_cache import response_cache
+from .signals import bump_vehicle_row_version
+
+# Wydanie bez zwrotu zajmuje pojazd bezterminowo
+_OPEN_END = datetime.date.max.toordinal()
+# Wolny dzień bez żadnej rezerwacji po tej stronie - przegrywa z każdą luką między rezerwacjami
+_UNBOUNDED_SLACK = 10 ** 7
+
+UNASSIGNED_NO_DATES = 'Brak dat rezerwacji.'
+UNASSIGNED_NO_VEHICLE = 'Brak wolnego sprawnego pojazdu tego typu w terminie.'
+REJECTED_NOT_PENDING = 'Rezerwacja nie czeka już na przydział pojazdu.'
+REJECTED_VEHICLE = 'Pojazd niedostępny albo innego typu niż w rezerwacji.'
+REJECTED_BUSY = 'Pojazd zajęty w tym terminie.'
+
+
+class IntervalIndex:
+    """
+    Zajętość pojazdów w pamięci: per pojazd posortowane, rozłączne przedziały dni [start, koniec]
+    (numery dni, końce włącznie; nachodzące i stykające się scalone). Sprawdzenie terminu - bisect, O(log n).
+    """
+
+    def __init__(self):
+        self._starts = {}
+        self._ends = {}
+
+    @classmethod
+    def load(cls, vehicle_ids=None):
+        """Rezerwacje poza odrzuconymi (jak /vehicles/availability/) i wydania, także otwarte."""
+        reservations = Reservation.objects.filter(
+            assigned_vehicle__isnull=False, date_from__isnull=False, date_to__isnull=False
+        ).exclude(status='ODRZUCONE')
+        handovers = VehicleHandover.objects.all()
+        if vehicle_ids is not None:
+            reservations = reservations.filter(assigned_vehicle_id__in=vehicle_ids)
+            handovers = handovers.filter(pojazd_id__in=vehicle_ids)
+
+        intervals = {}
+        for vehicle_id, start, end in reservations.values_list('assigned_vehicle_id', 'date_from', 'date_to'):
+            intervals.setdefault(vehicle_id, []).append((start.toordinal(), end.toordinal()))
+        for vehicle_id, start, end in handovers.values_list('pojazd_id', 'data_wydania', 'data_zwrotu'):
+            intervals.setdefault(vehicle_id, []).append((start.toordinal(), end.toordinal() if end else _OPEN_END))
+
+        index = cls()
+        for vehicle_id, spans in intervals.items():
+            starts, ends = [], []
+            for start, end in sorted(spans):
+                if starts and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            index._starts[vehicle_id], index._ends[vehicle_id] = starts, ends
+        return index
+
+    def slack(self, vehicle_id, start, end):
+        """
+        Wolne dni wokół terminu (luka przed + luka po) albo None, gdy pojazd jest zajęty.
+        Im mniejsza wartość, tym ciaśniej termin wypełnia lukę w grafiku pojazdu.
+        """
+        starts, ends = self._starts.get(vehicle_id, ()), self._ends.get(vehicle_id, ())
+        i = bisect_right(starts, end)  # przedziały [0, i) zaczynają się najpóźniej w dniu końca terminu
+        if i and ends[i - 1] >= start:
+            return None
+        before = start - ends[i - 1] - 1 if i else _UNBOUNDED_SLACK
+        after = starts[i] - end - 1 if i < len(starts) else _UNBOUNDED_SLACK
+        return before + after
+
+    def add(self, vehicle_id, start, end):
+        """Zajmuje termin (sprawdzony wcześniej przez slack) i scala go z sąsiadującymi przedziałami."""
+        starts = self._starts.setdefault(vehicle_id, [])
+        ends = self._ends.setdefault(vehicle_id, [])
+        i = bisect_right(starts, end)
+        if i and ends[i - 1] + 1 == start:
+            i -= 1
+            start = starts[i]
+            del starts[i], ends[i]
+        if i < len(starts) and starts[i] == end + 1:
+            end = ends[i]
+            del starts[i], ends[i]
+        starts.insert(i, start)
+        ends.insert(i, end)
+
+
+def _eligible_vehicles():
+    """Pojazdy do przydziału per typ: aktywne i sprawne (nie NIESPRAWNY), w stałej kolejności."""
+    by_type = {}
+    for vehicle_id, typ, registration in (
+        Vehicle.objects.filter(is_active=True).exclude(status='NIESPRAWNY')
+        .order_by('id').values_list('id', 'typ_pojazdu', 'registration_number')
+    ):
+        by_type.setdefault(typ, []).append((vehicle_id, registration))
+    return by_type
+
+
+def _pending(reservation_ids=None):
+    pending = Reservation.objects.filter(status='OCZEKUJACE', assigned_vehicle__isnull=True)
+    if reservation_ids is not None:
+        pending = pending.filter(pk__in=reservation_ids)
+    return pending
+
+
+def propose_assignments(reservation_ids=None):
+    """
+    Propozycja przydziału pojazdów oczekującym rezerwacjom (bez zapisu). Rezerwacje po dacie rozpoczęcia
+    (dłuższe najpierw); każda dostaje pojazd swojego typu, którego wolną lukę wypełnia najciaśniej
+    (best fit) - rezerwacje skupiają się na już używanych pojazdach, a długie wolne okna zostają
+    w całości dla kolejnych. Zwraca {'assignments': [...], 'unassigned': [...]}.
+    """
+    vehicles = _eligible_vehicles()
+    index = IntervalIndex.load()
+    rows = list(_pending(reservation_ids).values_list('id', 'vehicle_type', 'date_from', 'date_to'))
+
+    assignments, unassigned = [], []
+    for pk, vehicle_type, date_from, date_to in rows:
+        if date_from is None or date_to is None or date_to < date_from:
+            unassigned.append({'reservation': pk, 'reason': UNASSIGNED_NO_DATES})
+    dated = sorted(
+        ((date_from.toordinal(), -date_to.toordinal(), pk, vehicle_type, date_from, date_to)
+         for pk, vehicle_type, date_from, date_to in rows
+         if date_from is not None and date_to is not None and date_to >= date_from),
+    )
+    for start, negative_end, pk, vehicle_type, date_from, date_to in dated:
+        end = -negative_end
+        best = None
+        for vehicle_id, registration in vehicles.get(vehicle_type, ()):
+            slack = index.slack(vehicle_id, start, end)
+            if slack is not None and (best is None or slack < best[0]):
+                best = (slack, vehicle_id, registration)
+                if slack == 0:
+                    break  # termin dokładnie wypełnia lukę - lepszego dopasowania nie będzie
+        if best is None:
+            unassigned.append({'reservation': pk, 'reason': UNASSIGNED_NO_VEHICLE})
+            continue
+        _, vehicle_id, registration = best
+        index.add(vehicle_id, start, end)
+        assignments.append({'reservation': pk, 'vehicle': vehicle_id, 'registration_number': registration,
+                            'vehicle_type': vehicle_type, 'date_from': date_from, 'date_to': date_to})
+    return {'assignments': assignments, 'unassigned': unassigned}
+
+
+def apply_assignments(assignments):
+    """
+    Zapisuje przydziały [{'reservation': id, 'vehicle': id}, ...] (np. zatwierdzoną propozycję).
+    Każdy jest sprawdzany ponownie na świeżym indeksie pod blokadą rezerwacji - w międzyczasie mogły
+    pojawić się nowe rezerwacje lub wydania. Zwraca {'assigned': [...], 'rejected': [...]}.
+    """
+    requested = {}
+    for item in assignments:
+        requested[int(item['reservation'])] = int(item['vehicle'])
+    applied, rejected = [], []
+
+    with transaction.atomic():
+        pending = {
+            r.pk: r for r in _pending(requested).select_for_update().only('id', 'vehicle_type', 'date_from', 'date_to')
+        }
+        vehicles = {vehicle_id: (typ, registration) for typ, entries in _eligible_vehicles().items()
+                    for vehicle_id, registration in entries}
+        index = IntervalIndex.load(vehicle_ids=set(requested.values()))
+
+        for pk, vehicle_id in requested.items():
+            reservation = pending.get(pk)
+            if reservation is None or reservation.date_from is None or reservation.date_to is None:
+                rejected.append({'reservation': pk, 'vehicle': vehicle_id, 'reason': REJECTED_NOT_PENDING})
+                continue
+            if vehicles.get(vehicle_id, (None,))[0] != reservation.vehicle_type:
+                rejected.append({'reservation': pk, 'vehicle': vehicle_id, 'reason': REJECTED_VEHICLE})
+                continue
+            start, end = reservation.date_from.toordinal(), reservation.date_to.toordinal()
+            if index.slack(vehicle_id, start, end) is None:
+                rejected.append({'reservation': pk, 'vehicle': vehicle_id, 'reason': REJECTED_BUSY})
+                continue
+            index.add(vehicle_id, start, end)
+            reservation.assigned_vehicle_id = vehicle_id
+            applied.append(reservation)
+
+        if applied:
+            # bulk_update omija sygnały - znacznik synchronizacji, wersje pojazdów i cache jak w signals.py
+            now = timezone.now()
+            for reservation in applied:
+                reservation.updated_at = now
+            Reservation.objects.bulk_update(applied, ['assigned_vehicle', 'updated_at'], batch_size=500)
+            bump_vehicle_row_version(*{r.assigned_vehicle_id for r in applied})
+            response_cache.invalidate_on_commit(Reservation, Vehicle)
+
+    return {
+        'assigned': [{'reservation': r.pk, 'vehicle': r.assigned_vehicle_id,
+                      'registration_number': vehicles[r.assigned_vehicle_id][1]} for r in applied],
+        'rejected': rejected,
+    }
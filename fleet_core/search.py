@@ -0,0 +1,204 @@
+# fleet_core/search.py
+
+import re
+
+from django.db import connection, transaction
+
+from .models import Vehicle, Driver, Reservation, VehicleHandover
+
+# Tabela indeksu: SQLite -> wirtualna tabela FTS5, MySQL -> zwykła tabela z indeksem FULLTEXT
+SEARCH_TABLE = 'fleet_search'
+
+ENTITY_VEHICLE = 'vehicle'
+ENTITY_DRIVER = 'driver'
+ENTITY_RESERVATION = 'reservation'
+ENTITY_HANDOVER = 'handover'
+ENTITIES = (ENTITY_VEHICLE, ENTITY_DRIVER, ENTITY_RESERVATION, ENTITY_HANDOVER)
+
+# SQLite: rowid dokumentu = id obiektu * ENTITY_SLOTS + numer typu (kolejność w ENTITIES, nowe typy na końcu).
+# Kolumny entity/object_id w FTS5 są UNINDEXED - WHERE po nich skanuje cały indeks, po rowid - nie.
+ENTITY_SLOTS = 8
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# unicode61 (remove_diacritics) nie rozkłada "ł" - zwijamy ją sami w treści i w zapytaniu
+_FOLD = str.maketrans('łŁ', 'lL')
+
+
+def _join(*parts):
+    return ' '.join(str(p) for p in parts if p)
+
+
+def index_row(document):
+    """Wiersz do tabeli indeksu: tytuł przycięty do 255 znaków, treść uzupełniona o wersję bez "ł"."""
+    entity, object_id, title, body = document
+    title, body = title or '', body or ''
+    folded = f"{title} {body}".translate(_FOLD)
+    if folded != f"{title} {body}":
+        body = f"{body} {folded}"
+    return entity, object_id, title[:255], body
+
+
+def document_rowid(entity, object_id):
+    return int(object_id) * ENTITY_SLOTS + ENTITIES.index(entity)
+
+
+# --- TREŚĆ DOKUMENTÓW INDEKSU (entity, id, title, body) ---
+
+def vehicle_document(v):
+    return ENTITY_VEHICLE, v.pk, v.registration_number, _join(v.vin, v.marka, v.model, v.uwagi)
+
+
+def driver_document(d):
+    user = d.user
+    name = _join(user.first_name, user.last_name) or user.username
+    return ENTITY_DRIVER, d.pk, name, _join(user.username, d.numer_prawa_jazdy, d.company.nazwa if d.company else '')
+
+
+def reservation_document(r):
+    return ENTITY_RESERVATION, r.pk, _join(r.first_name, r.last_name), _join(r.company, r.additional_info)
+
+
+def handover_document(h):
+    user = h.kierowca.user if h.kierowca_id else None
+    driver = _join(user.first_name, user.last_name) if user else ''
+    return ENTITY_HANDOVER, h.pk, _join(h.pojazd.registration_number, driver), _join(h.uwagi)
+
+
+DOCUMENT_SOURCES = {
+    ENTITY_VEHICLE: (lambda: Vehicle.objects.all(), vehicle_document),
+    ENTITY_DRIVER: (lambda: Driver.objects.select_related('user', 'company'), driver_document),
+    ENTITY_RESERVATION: (lambda: Reservation.objects.all(), reservation_document),
+    ENTITY_HANDOVER: (lambda: VehicleHandover.objects.select_related('pojazd', 'kierowca__user'), handover_document),
+}
+
+
+# --- AKTUALIZACJA INDEKSU ---
+
+def _key_filter(entity, object_ids):
+    """WHERE po kluczu dokumentów: rowid w SQLite, klucz główny (entity, object_id) w pozostałych bazach."""
+    placeholders = ', '.join(['%s'] * len(object_ids))
+    if connection.vendor == 'sqlite':
+        return f"rowid IN ({placeholders})", [document_rowid(entity, pk) for pk in object_ids]
+    return f"entity = %s AND object_id IN ({placeholders})", [entity, *object_ids]
+
+
+def _insert_sql():
+    if connection.vendor == 'sqlite':
+        return f"INSERT INTO {SEARCH_TABLE} (rowid, entity, object_id, title, body) VALUES (%s, %s, %s, %s, %s)"
+    return f"INSERT INTO {SEARCH_TABLE} (entity, object_id, title, body) VALUES (%s, %s, %s, %s)"
+
+
+def _insert_params(document):
+    row = index_row(document)
+    return [document_rowid(row[0], row[1]), *row] if connection.vendor == 'sqlite' else list(row)
+
+
+def index_documents(documents):
+    """Upsert dokumentów (DELETE + INSERT po kluczu - FTS5 nie ma klucza głównego)."""
+    documents = list(documents)
+    if not documents:
+        return
+    # Pojedyncze execute() zamiast executemany() - z sygnałów przychodzi zwykle jeden dokument,
+    # a panel SQL debug_toolbar nie umie zapisać executemany() na SQLite
+    with transaction.atomic(), connection.cursor() as cursor:
+        for document in documents:
+            where, params = _key_filter(document[0], [document[1]])
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {where}", params)
+            cursor.execute(_insert_sql(), _insert_params(document))
+
+
+def remove_documents(entity, object_ids, batch_size=500):
+    object_ids = list(object_ids)
+    with connection.cursor() as cursor:
+        for start in range(0, len(object_ids), batch_size):
+            where, params = _key_filter(entity, object_ids[start:start + batch_size])
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {where}", params)
+
+
+def rebuild_index(batch_size=2000, entities=ENTITIES):
+    """Pełna przebudowa indeksu (po imporcie bulk_create, który omija sygnały)."""
+    counts = {}
+    for entity in entities:
+        queryset_factory, to_document = DOCUMENT_SOURCES[entity]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE entity = %s", [entity])
+        batch, total = [], 0
+        for obj in queryset_factory().iterator(chunk_size=batch_size):
+            batch.append(to_document(obj))
+            if len(batch) >= batch_size:
+                _insert(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _insert(batch)
+            total += len(batch)
+        counts[entity] = total
+    return counts
+
+
+def _insert(documents):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(_insert_sql(), [_insert_params(document) for document in documents])
+
+
+# --- WYSZUKIWANIE ---
+
+def _fts5_query(text):
+    # Każde słowo jako prefiks w cudzysłowie ("wa12"*) - zapytanie użytkownika nie trafia do składni FTS5
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(text.translate(_FOLD)))
+
+
+def _mysql_query(text):
+    return ' '.join(f'+{token}*' for token in _TOKEN_RE.findall(text.translate(_FOLD)))
+
+
+def search(text, per_entity=10):
+    """
+    Wyniki pogrupowane po typie: {'vehicle': [(id, title, score), ...], ...}, od najlepszego.
+    SQLite: FTS5 + bm25, MySQL: FULLTEXT (BOOLEAN MODE), inne bazy: LIKE.
+    """
+    if not _TOKEN_RE.search(text or ''):
+        return {}
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        sql = (
+            # bm25() nie działa w funkcji okna - ranking liczymy w podzapytaniu, ROW_NUMBER piętro wyżej
+            f"SELECT entity, object_id, title, score FROM ("
+            f"  SELECT *, ROW_NUMBER() OVER (PARTITION BY entity ORDER BY score) AS rn FROM ("
+            f"    SELECT entity, object_id, title, bm25({SEARCH_TABLE}, 5.0, 1.0) AS score"
+            f"    FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+            f"  )"
+            f") WHERE rn <= %s ORDER BY entity, score"
+        )
+        params = [_fts5_query(text), per_entity]
+    elif vendor == 'mysql':
+        sql = (
+            f"SELECT entity, object_id, title, score FROM ("
+            f"  SELECT entity, object_id, title, MATCH(title, body) AGAINST (%s IN BOOLEAN MODE) AS score,"
+            f"         ROW_NUMBER() OVER (PARTITION BY entity"
+            f"                            ORDER BY MATCH(title, body) AGAINST (%s IN BOOLEAN MODE) DESC) AS rn"
+            f"  FROM {SEARCH_TABLE} WHERE MATCH(title, body) AGAINST (%s IN BOOLEAN MODE)"
+            f") ranked WHERE rn <= %s ORDER BY entity, score DESC"
+        )
+        query = _mysql_query(text)
+        params = [query, query, query, per_entity]
+    else:
+        like = f"%{text}%"
+        sql = (
+            f"SELECT entity, object_id, title, 0 FROM {SEARCH_TABLE} "
+            f"WHERE title LIKE %s OR body LIKE %s ORDER BY entity, title"
+        )
+        params = [like, like]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    grouped = {}
+    for entity, object_id, title, score in rows:
+        bucket = grouped.setdefault(entity, [])
+        if len(bucket) < per_entity:
+            # bm25 w SQLite jest ujemne (im mniejsze, tym lepsze) - odwracamy znak
+            bucket.append((int(object_id), title, round(-score if vendor == 'sqlite' else float(score), 4)))
+    return grouped
@@ -1,14 +1,21 @@
 # Master/Server/fleet_core/serializers.py
 
 from rest_framework import serializers
-from django.db.models import Q
+from django.db.models import Q, Prefetch
+from django.utils import timezone
 import datetime
 from .models import Vehicle, Driver, ServiceEvent, DamageEvent, FleetCompany, InsurancePolicy, VehicleHandover, \
-    Reservation, ReservationFile, VehicleDocument, GlobalSettings
+    Reservation, ReservationFile, VehicleDocument, GlobalSettings, CustomUser, OdometerReading
+from .object_cache import RowVersionCacheMixin, VersionedListSerializer
+from .query_plan import QueryPlanMixin
+from .odometer import record_reading, SOURCE_MANUAL
 
 
 # 1. SERIALIZER DLA POJAZDÓW
-class VehicleDto(serializers.ModelSerializer):
+class VehicleDto(QueryPlanMixin, RowVersionCacheMixin, serializers.ModelSerializer):
+    # Wydania i rezerwacje pojazdu podbijają jego row_version (signals.py); nazwiska i firmy - wersje modeli
+    cache_depends_on = (CustomUser, Driver, FleetCompany)
+    query_plan = {'company_name': ('company',), 'assigned_user_name': ('assigned_user',)}
     company_name = serializers.CharField(source='company.nazwa', read_only=True)
     fuel_type_display = serializers.CharField(source='get_fuel_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -25,11 +32,12 @@ class VehicleDto(serializers.ModelSerializer):
 
     class Meta:
         model = Vehicle
+        list_serializer_class = VersionedListSerializer
         fields = [
             'id', 'vin', 'registration_number', 'company', 'company_name',
             'is_active', 'przebieg', 'fuel_type', 'fuel_type_display',
             'marka', 'model', 'data_pierwszej_rejestracji', 'assigned_user', 'assigned_user_name',
-            'status', 'status_display', 'typ_pojazdu', 'typ_display', 'uwagi',
+            'status', 'status_display', 'open_damage_count', 'typ_pojazdu', 'typ_display', 'uwagi',
             'scan_registration_card', 'scan_policy_oc', 'scan_policy_ac',
             'scan_tech_inspection', 'scan_service_book', 'scan_purchase_invoice',
             'remove_scan_registration_card', 'remove_scan_policy_oc',
@@ -37,6 +45,10 @@ class VehicleDto(serializers.ModelSerializer):
             'remove_scan_service_book', 'remove_scan_purchase_invoice'
         ]
 
+    def cache_version(self, obj):
+        # assigned_user_name zależy od dzisiejszej daty (rezerwacje od-do)
+        return obj.row_version, datetime.date.today()
+
     def get_assigned_user_name(self, obj):
         """
         Sprawdza:
@@ -92,7 +104,9 @@ class VehicleDto(serializers.ModelSerializer):
         validated_data.pop('remove_scan_tech_inspection', None)
         validated_data.pop('remove_scan_service_book', None)
         validated_data.pop('remove_scan_purchase_invoice', None)
-        return super().create(validated_data)
+        vehicle = super().create(validated_data)
+        record_reading(vehicle.pk, datetime.date.today(), vehicle.przebieg, SOURCE_MANUAL)
+        return vehicle
 
     def update(self, instance, validated_data):
         files_to_check = [
@@ -109,12 +123,19 @@ class VehicleDto(serializers.ModelSerializer):
                 if file_field:
                     file_field.delete(save=False)
                     setattr(instance, field_name, None)
-        return super().update(instance, validated_data)
+        previous_km = instance.przebieg
+        instance = super().update(instance, validated_data)
+        if instance.przebieg != previous_km:
+            # Ręczna zmiana licznika trafia do dziennika odczytów
+            record_reading(instance.pk, datetime.date.today(), instance.przebieg, SOURCE_MANUAL)
+        return instance
 
 
 # POZOSTAŁE SERIALIZERY POZOSTAJĄ TAKIE SAME JAK POPRZEDNIO
 # (Skopiuj resztę klas: DriverDto, DamageEventDto itd. z poprzedniego pliku, bo tam są OK)
-class DriverDto(serializers.ModelSerializer):
+class DriverDto(QueryPlanMixin, serializers.ModelSerializer):
+    query_plan = {'user_name': ('user',), 'first_name': ('user',), 'last_name': ('user',), 'email': ('user',),
+                  'full_name': ('user',), 'company_name': ('company',)}
     first_name = serializers.ReadOnlyField(source='user.first_name', default='')
     last_name = serializers.ReadOnlyField(source='user.last_name', default='')
     user_name = serializers.ReadOnlyField(source='user.username', default='Brak loginu')
@@ -133,7 +154,15 @@ class DriverDto(serializers.ModelSerializer):
         return "Nieznany"
 
 
-class DamageEventDto(serializers.ModelSerializer):
+class DamageEventDto(QueryPlanMixin, RowVersionCacheMixin, serializers.ModelSerializer):
+    cache_depends_on = (VehicleDocument,)
+    query_plan = {
+        # Zdjęcia szkód pojazdu jednym zapytaniem dla całej listy (get_has_photos dopasowuje datę w Pythonie)
+        'has_photos': (Prefetch('pojazd__documents', to_attr='damage_photos',
+                                queryset=VehicleDocument.objects.filter(title__icontains='SZKODA')
+                                .only('id', 'vehicle_id', 'uploaded_at')),),
+    }
+    query_plan_always = ('pojazd',)  # cache_version i pola pojazd_*
     pojazd_rej = serializers.CharField(source='pojazd.registration_number', read_only=True)
     pojazd_marka = serializers.ReadOnlyField(source='pojazd.marka')
     pojazd_model = serializers.ReadOnlyField(source='pojazd.model')
@@ -142,15 +171,23 @@ class DamageEventDto(serializers.ModelSerializer):
 
     class Meta:
         model = DamageEvent
+        list_serializer_class = VersionedListSerializer
         fields = ['id', 'pojazd', 'pojazd_rej', 'pojazd_marka', 'pojazd_model', 'opis', 'data_zdarzenia',
                   'szacowany_koszt', 'zgloszony_do_ubezpieczyciela', 'status_naprawy', 'status_display', 'has_photos']
 
+    def cache_version(self, obj):
+        return obj.row_version, obj.pojazd.row_version
+
     def get_has_photos(self, obj):
+        photos = getattr(obj.pojazd, 'damage_photos', None)
+        if photos is not None:
+            return any(timezone.localtime(photo.uploaded_at).date() == obj.data_zdarzenia for photo in photos)
         return VehicleDocument.objects.filter(vehicle=obj.pojazd, title__icontains='SZKODA',
                                               uploaded_at__date=obj.data_zdarzenia).exists()
 
 
-class InsurancePolicyDto(serializers.ModelSerializer):
+class InsurancePolicyDto(QueryPlanMixin, serializers.ModelSerializer):
+    query_plan = {'pojazd_nr_rej': ('pojazd',), 'pojazd_vin': ('pojazd',)}
     pojazd_nr_rej = serializers.CharField(source='pojazd.registration_number', read_only=True)
     pojazd_vin = serializers.ReadOnlyField(source='pojazd.vin')
 
@@ -160,7 +197,11 @@ class InsurancePolicyDto(serializers.ModelSerializer):
                   'data_waznosci_ac', 'koszt']
 
 
-class VehicleHandoverDto(serializers.ModelSerializer):
+class VehicleHandoverDto(QueryPlanMixin, RowVersionCacheMixin, serializers.ModelSerializer):
+    cache_depends_on = (CustomUser, Driver, FleetCompany)
+    query_plan = {'imie': ('kierowca__user',), 'nazwisko': ('kierowca__user',), 'firma': ('kierowca__company',),
+                  'reservation_id': ('reservation',)}
+    query_plan_always = ('pojazd',)  # cache_version i pola pojazdu
     imie = serializers.ReadOnlyField(source='kierowca.user.first_name')
     nazwisko = serializers.ReadOnlyField(source='kierowca.user.last_name')
     firma = serializers.ReadOnlyField(source='kierowca.company.nazwa')
@@ -175,12 +216,16 @@ class VehicleHandoverDto(serializers.ModelSerializer):
 
     class Meta:
         model = VehicleHandover
+        list_serializer_class = VersionedListSerializer
         fields = ['id', 'kierowca', 'pojazd', 'reservation_id', 'imie', 'nazwisko', 'firma', 'marka', 'model',
                   'rejestracja', 'data_wydania', 'data_zwrotu', 'uwagi', 'przebieg_start', 'przebieg_stop', 'dystans',
                   'paliwo_start', 'paliwo_stop', 'stawka_za_km', 'koszt_brakujacego_paliwa', 'calkowity_koszt',
                   'scan_agreement', 'scan_handover_protocol', 'scan_return_protocol', 'remove_scan_agreement',
                   'remove_scan_handover_protocol', 'remove_scan_return_protocol']
 
+    def cache_version(self, obj):
+        return obj.row_version, obj.pojazd.row_version
+
     def get_dystans(self, obj):
         if obj.przebieg_stop and obj.przebieg_start: return obj.przebieg_stop - obj.przebieg_start
         return 0
@@ -213,18 +258,22 @@ class VehicleHandoverDto(serializers.ModelSerializer):
             if vehicle.assigned_user == instance.kierowca.user:
                 vehicle.assigned_user = None
                 vehicle.status = 'SPRAWNY'
-            if instance.przebieg_stop: vehicle.przebieg = instance.przebieg_stop
+            # Licznik tylko do przodu (jak VehicleHandover.save) - historia jest w dzienniku odczytów
+            if instance.przebieg_stop and instance.przebieg_stop > vehicle.przebieg:
+                vehicle.przebieg = instance.przebieg_stop
             vehicle.save()
         return instance
 
 
-class ServiceEventDto(serializers.ModelSerializer):
+class ServiceEventDto(QueryPlanMixin, serializers.ModelSerializer):
+    query_plan = {'pojazd_nr_rej': ('pojazd',), 'pojazd_vin': ('pojazd',)}
     pojazd_nr_rej = serializers.ReadOnlyField(source='pojazd.registration_number')
     pojazd_vin = serializers.ReadOnlyField(source='pojazd.vin')
 
     class Meta:
         model = ServiceEvent
-        fields = ['id', 'pojazd', 'pojazd_nr_rej', 'pojazd_vin', 'opis', 'data_serwisu', 'koszt', 'typ_zdarzenia']
+        fields = ['id', 'pojazd', 'pojazd_nr_rej', 'pojazd_vin', 'opis', 'data_serwisu', 'koszt', 'przebieg',
+                  'typ_zdarzenia']
 
 
 class ReservationFileDto(serializers.ModelSerializer):
@@ -233,7 +282,9 @@ class ReservationFileDto(serializers.ModelSerializer):
         fields = ['id', 'file', 'uploaded_at']
 
 
-class ReservationDto(serializers.ModelSerializer):
+class ReservationDto(QueryPlanMixin, serializers.ModelSerializer):
+    query_plan = {'assigned_vehicle_display': ('assigned_vehicle',), 'driver_display': ('driver__user',),
+                  'attachments': ('attachments',)}
     assigned_vehicle_display = serializers.ReadOnlyField(source='assigned_vehicle.registration_number')
     driver_display = serializers.SerializerMethodField()
     attachments = ReservationFileDto(many=True, read_only=True)
@@ -289,7 +340,8 @@ class ReservationDto(serializers.ModelSerializer):
         return data
 
 
-class VehicleDocumentDto(serializers.ModelSerializer):
+class VehicleDocumentDto(QueryPlanMixin, serializers.ModelSerializer):
+    query_plan = {'vehicle_reg': ('vehicle',)}
     vehicle_reg = serializers.ReadOnlyField(source='vehicle.registration_number')
 
     class Meta:
@@ -300,4 +352,25 @@ class VehicleDocumentDto(serializers.ModelSerializer):
 class GlobalSettingsDto(serializers.ModelSerializer):
     class Meta:
         model = GlobalSettings
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+class DriverOnboardingRowDto(serializers.Serializer):
+    """Jeden wiersz masowego importu kierowców (JSON lub arkusz .xlsx)."""
+    # Te same reguły loginu co w formularzach użytkownika (UnicodeUsernameValidator z modelu)
+    username = serializers.CharField(max_length=150, validators=[CustomUser.username_validator])
+    password = serializers.CharField(write_only=True)
+    email = serializers.EmailField(required=False, allow_blank=True, default='')
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    company_name = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    numer_prawa_jazdy = serializers.CharField(max_length=50, required=False, allow_blank=True, default='')
+    kategorie_prawa_jazdy = serializers.CharField(max_length=100, required=False, allow_blank=True, default='B')
+
+
+class OdometerReadingDto(serializers.ModelSerializer):
+    zrodlo_display = serializers.CharField(source='get_zrodlo_display', read_only=True)
+
+    class Meta:
+        model = OdometerReading
+        fields = ['id', 'pojazd', 'data_odczytu', 'przebieg', 'zrodlo', 'zrodlo_display', 'zrodlo_id']
+        read_only_fields = ['pojazd', 'zrodlo', 'zrodlo_id']
@@ -0,0 +1,325 @@
+# fleet_core/signals.py
+
+import datetime
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F
+from django.db.models.functions import Greatest
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete, odometer, search, sync
+from .events import broadcaster, EVENT_RESERVATION, EVENT_HANDOVER, EVENT_DAMAGE
+from .response_cache import response_cache
+from .authentication import revoke_user_tokens
+from .models import (
+    Vehicle, DamageEvent, CustomUser, Driver, Reservation, ReservationFile, VehicleHandover, ServiceEvent,
+    OPEN_DAMAGE_STATUSES, next_row_version,
+)
+
+
+# --- LICZNIK OTWARTYCH SZKÓD (Vehicle.open_damage_count) ---
+
+def vehicle_status_expression():
+    """
+    Status pojazdu wyliczany z licznika szkód (bez skanowania tabeli DamageEvent).
+    Otwarte szkody -> NIESPRAWNY, w przeciwnym razie WYPOZYCZONY (gdy przypisany) lub SPRAWNY.
+    """
+    return Case(
+        When(open_damage_count__gt=0, then=Value('NIESPRAWNY')),
+        When(assigned_user__isnull=False, then=Value('WYPOZYCZONY')),
+        default=Value('SPRAWNY'),
+    )
+
+
+def apply_open_damage_delta(vehicle_id, delta):
+    """Atomowa zmiana licznika (F-expression) i odświeżenie statusu pojazdu."""
+    if not vehicle_id:
+        return
+    vehicles = Vehicle.objects.filter(pk=vehicle_id)
+    with transaction.atomic():
+        if delta:
+            vehicles.update(open_damage_count=Greatest(F('open_damage_count') + delta, 0))
+        # Osobne UPDATE - MySQL w jednym UPDATE widziałby już nową wartość licznika
+        vehicles.update(status=vehicle_status_expression(), row_version=next_row_version(),
+                        updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=DamageEvent)
+def remember_previous_damage_state(sender, instance, raw=False, **kwargs):
+    if raw or not instance.pk or hasattr(instance, '_loaded_damage_state'):
+        return
+    # Obiekt nie pochodzi z from_db (np. serializer zbudował go ręcznie) - pytamy bazę
+    instance._loaded_damage_state = DamageEvent.objects.filter(pk=instance.pk).values_list(
+        'pojazd_id', 'status_naprawy'
+    ).first()
+
+
+@receiver(post_save, sender=DamageEvent)
+def update_open_damage_count_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_loaded_damage_state', None)
+    current = (instance.pojazd_id, instance.status_naprawy)
+    instance._loaded_damage_state = current
+
+    deltas = {}
+    if previous and previous[1] in OPEN_DAMAGE_STATUSES:
+        deltas[previous[0]] = deltas.get(previous[0], 0) - 1
+    if current[1] in OPEN_DAMAGE_STATUSES:
+        deltas[current[0]] = deltas.get(current[0], 0) + 1
+    # Pojazd bieżący zawsze dostaje odświeżony status (tak jak wcześniej w widoku)
+    deltas.setdefault(current[0], 0)
+
+    for vehicle_id, delta in deltas.items():
+        apply_open_damage_delta(vehicle_id, delta)
+
+
+@receiver(post_delete, sender=DamageEvent)
+def update_open_damage_count_on_delete(sender, instance, **kwargs):
+    state = getattr(instance, '_loaded_damage_state', (instance.pojazd_id, instance.status_naprawy))
+    apply_open_damage_delta(state[0], -1 if state[1] in OPEN_DAMAGE_STATUSES else 0)
+
+
+# --- UNIEWAŻNIANIE TOKENÓW JWT (claimy w tokenie muszą odpowiadać kontu) ---
+
+TOKEN_SENSITIVE_FIELDS = ('rola', 'is_active', 'is_staff', 'is_superuser', 'password')
+
+
+@receiver(pre_save, sender=CustomUser)
+def detect_token_sensitive_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._revoke_tokens = False
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not set(update_fields) & set(TOKEN_SENSITIVE_FIELDS):
+        return
+    previous = CustomUser.objects.filter(pk=instance.pk).values(*TOKEN_SENSITIVE_FIELDS).first()
+    if previous and any(previous[f] != getattr(instance, f) for f in TOKEN_SENSITIVE_FIELDS):
+        instance._revoke_tokens = True
+
+
+@receiver(post_save, sender=CustomUser)
+def revoke_tokens_after_change(sender, instance, created, raw=False, **kwargs):
+    if getattr(instance, '_revoke_tokens', False):
+        instance._revoke_tokens = False
+        transaction.on_commit(lambda: revoke_user_tokens(instance.pk))
+
+
+@receiver(post_delete, sender=CustomUser)
+def revoke_tokens_after_delete(sender, instance, **kwargs):
+    user_pk = instance.pk
+    transaction.on_commit(lambda: revoke_user_tokens(user_pk))
+
+
+# --- INDEKS WYSZUKIWARKI (fleet_core/search.py) ---
+
+SEARCH_SOURCES = {
+    Vehicle: (search.ENTITY_VEHICLE, search.vehicle_document),
+    Driver: (search.ENTITY_DRIVER, search.driver_document),
+    Reservation: (search.ENTITY_RESERVATION, search.reservation_document),
+    VehicleHandover: (search.ENTITY_HANDOVER, search.handover_document),
+}
+
+
+def update_search_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _, to_document = SEARCH_SOURCES[sender]
+    search.index_documents([to_document(instance)])
+
+
+def remove_from_search_index(sender, instance, **kwargs):
+    entity, _ = SEARCH_SOURCES[sender]
+    search.remove_documents(entity, [instance.pk])
+
+
+for _model in SEARCH_SOURCES:
+    post_save.connect(update_search_index, sender=_model, dispatch_uid=f"search_index_{_model.__name__}")
+    post_delete.connect(remove_from_search_index, sender=_model, dispatch_uid=f"search_remove_{_model.__name__}")
+
+
+@receiver(post_save, sender=CustomUser)
+def update_driver_search_on_user_change(sender, instance, created, raw=False, **kwargs):
+    # Imię/nazwisko kierowcy są w CustomUser - po zmianie odświeżamy wpis Driver
+    if raw or created:
+        return
+    driver = Driver.objects.select_related('user', 'company').filter(user_id=instance.pk).first()
+    if driver:
+        search.index_documents([search.driver_document(driver)])
+
+
+# --- PODPOWIEDZI (fleet_core/autocomplete.py - indeks w pamięci procesu) ---
+
+AUTOCOMPLETE_SOURCES = {
+    Vehicle: (autocomplete.ENTITY_VEHICLE, autocomplete.vehicle_entry),
+    Driver: (autocomplete.ENTITY_DRIVER, autocomplete.driver_entry),
+}
+
+
+def update_autocomplete(sender, instance, raw=False, **kwargs):
+    # Indeks jeszcze nie zbudowany - zbuduje się leniwie z aktualnych danych
+    if raw or not autocomplete.index.loaded:
+        return
+    entry = AUTOCOMPLETE_SOURCES[sender][1](instance)
+    transaction.on_commit(lambda: autocomplete.index.upsert(entry))
+
+
+def remove_from_autocomplete(sender, instance, **kwargs):
+    entity, pk = AUTOCOMPLETE_SOURCES[sender][0], instance.pk
+    transaction.on_commit(lambda: autocomplete.index.remove(entity, pk))
+
+
+for _model in AUTOCOMPLETE_SOURCES:
+    post_save.connect(update_autocomplete, sender=_model, dispatch_uid=f"autocomplete_{_model.__name__}")
+    post_delete.connect(remove_from_autocomplete, sender=_model, dispatch_uid=f"autocomplete_rm_{_model.__name__}")
+
+
+@receiver(post_save, sender=CustomUser)
+def update_driver_autocomplete_on_user_change(sender, instance, created, raw=False, **kwargs):
+    if raw or created or not autocomplete.index.loaded:
+        return
+    driver = Driver.objects.select_related('user').filter(user_id=instance.pk).first()
+    if driver:
+        entry = autocomplete.driver_entry(driver)
+        transaction.on_commit(lambda: autocomplete.index.upsert(entry))
+
+
+# --- CACHE ODPOWIEDZI (fleet_core/response_cache.py) ---
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_response_cache(sender, **kwargs):
+    # Każdy zapis modelu fleet_core unieważnia zależne odpowiedzi po zatwierdzeniu transakcji
+    if sender._meta.app_label == 'fleet_core':
+        response_cache.invalidate_on_commit(sender)
+
+
+# --- WERSJE WIERSZY POJAZDU (VehicleDto.assigned_user_name zależy od wydań i rezerwacji) ---
+# updated_at też - pojazd wchodzi/wychodzi z zakresu kierowcy w /api/sync/
+
+def bump_vehicle_row_version(*vehicle_ids):
+    vehicle_ids = {pk for pk in vehicle_ids if pk}
+    if vehicle_ids:
+        Vehicle.objects.filter(pk__in=vehicle_ids).update(row_version=next_row_version(), updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Reservation)
+def remember_previous_reservation_state(sender, instance, raw=False, **kwargs):
+    # Poprzedni pojazd (row_version) i status (zdarzenie dla /api/events/) - jednym zapytaniem
+    instance._previous_vehicle_id = instance._previous_status = None
+    if not raw and instance.pk:
+        instance._previous_vehicle_id, instance._previous_status = Reservation.objects.filter(
+            pk=instance.pk
+        ).values_list('assigned_vehicle_id', 'status').first() or (None, None)
+
+
+@receiver(post_save, sender=Reservation)
+@receiver(post_delete, sender=Reservation)
+def bump_vehicle_on_reservation_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_vehicle_row_version(instance.assigned_vehicle_id, getattr(instance, '_previous_vehicle_id', None))
+
+
+@receiver(post_save, sender=VehicleHandover)
+@receiver(post_delete, sender=VehicleHandover)
+def bump_vehicle_on_handover_change(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump_vehicle_row_version(instance.pojazd_id)
+
+
+# --- SYNCHRONIZACJA PRZYROSTOWA (fleet_core/sync.py, /api/sync/) ---
+
+def record_tombstone(sender, instance, **kwargs):
+    sync.tombstone_for(instance).save()
+
+
+for _model in sync.SYNC_MODELS.values():
+    post_delete.connect(record_tombstone, sender=_model, dispatch_uid=f"sync_tombstone_{_model.__name__}")
+
+
+@receiver(post_save, sender=ReservationFile)
+@receiver(post_delete, sender=ReservationFile)
+def touch_reservation_on_attachment_change(sender, instance, raw=False, **kwargs):
+    # Załączniki są częścią ReservationDto - zmiana oznacza zmienioną rezerwację
+    if not raw:
+        Reservation.objects.filter(pk=instance.reservation_id).update(updated_at=timezone.now())
+
+
+# --- ZDARZENIA DLA KLIENTÓW (fleet_core/events.py, SSE /api/events/) ---
+# Zakres jak w ViewSetach: kierowca dostaje zdarzenia o swoich obiektach, pozostałe role - wg listy ról.
+
+STAFF_ROLES = ('ADMIN', 'LOGISTYKA', 'SERWIS', 'KSIĘGOWOŚĆ')
+NON_DRIVER_ROLES = STAFF_ROLES + ('USER',)
+
+
+def publish_on_commit(kind, object_id, action, roles, user_ids, **extra):
+    # Po commicie - klient od razu pobiera wiersz, musi go już widzieć
+    transaction.on_commit(lambda: broadcaster.publish(kind, object_id, action, roles, user_ids, **extra))
+
+
+def vehicle_history_user_ids(vehicle_id):
+    """Konta kierowców, którzy widzą szkody pojazdu (views.get_all_history_vehicle_ids od drugiej strony)."""
+    user_ids = set(Reservation.objects.filter(assigned_vehicle_id=vehicle_id, driver__isnull=False)
+                   .values_list('driver__user_id', flat=True))
+    user_ids.update(VehicleHandover.objects.filter(pojazd_id=vehicle_id).values_list('kierowca__user_id', flat=True))
+    user_ids.update(Vehicle.objects.filter(pk=vehicle_id, assigned_user__isnull=False)
+                    .values_list('assigned_user_id', flat=True))
+    return user_ids
+
+
+@receiver(post_save, sender=Reservation)
+def publish_reservation_change(sender, instance, created, raw=False, **kwargs):
+    if raw or not (created or instance.status != getattr(instance, '_previous_status', None)):
+        return
+    publish_on_commit(EVENT_RESERVATION, instance.pk, 'created' if created else 'updated', NON_DRIVER_ROLES,
+                      [sync.driver_user_pk(instance.driver_id)], status=instance.status)
+
+
+@receiver(post_delete, sender=Reservation)
+def publish_reservation_delete(sender, instance, **kwargs):
+    publish_on_commit(EVENT_RESERVATION, instance.pk, 'deleted', NON_DRIVER_ROLES,
+                      [sync.driver_user_pk(instance.driver_id)])
+
+
+@receiver(post_save, sender=VehicleHandover)
+@receiver(post_delete, sender=VehicleHandover)
+def publish_handover_change(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    action = 'deleted' if kwargs['signal'] is post_delete else 'created' if created else 'updated'
+    publish_on_commit(EVENT_HANDOVER, instance.pk, action, STAFF_ROLES, [sync.driver_user_pk(instance.kierowca_id)])
+
+
+@receiver(post_save, sender=DamageEvent)
+@receiver(post_delete, sender=DamageEvent)
+def publish_damage_change(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    deleted = kwargs['signal'] is post_delete
+    action = 'deleted' if deleted else 'created' if created else 'updated'
+    extra = {} if deleted else {'status': instance.status_naprawy}
+    # Kierowcy pojazdu (3 zapytania) liczeni dopiero, gdy zdarzenie sprawdza subskrypcja/odtworzenie kierowcy
+    publish_on_commit(EVENT_DAMAGE, instance.pk, action, NON_DRIVER_ROLES,
+                      partial(vehicle_history_user_ids, instance.pojazd_id), **extra)
+
+
+# --- DZIENNIK ODCZYTÓW LICZNIKA (fleet_core/odometer.py) ---
+
+@receiver(post_save, sender=VehicleHandover)
+def record_handover_odometer(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    odometer.record_reading(instance.pojazd_id, instance.data_wydania, instance.przebieg_start,
+                            odometer.SOURCE_HANDOVER_START, instance.pk)
+    if instance.przebieg_stop:
+        odometer.record_reading(instance.pojazd_id, instance.data_zwrotu or datetime.date.today(),
+                                instance.przebieg_stop, odometer.SOURCE_HANDOVER_STOP, instance.pk)
+
+
+@receiver(post_save, sender=ServiceEvent)
+def record_service_odometer(sender, instance, raw=False, **kwargs):
+    if not raw:
+        odometer.record_reading(instance.pojazd_id, instance.data_serwisu, instance.przebieg,
+                                odometer.SOURCE_SERVICE, instance.pk)
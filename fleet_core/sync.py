@@ -0,0 +1,139 @@
+# fleet_core/sync.py
+
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Vehicle, DamageEvent, VehicleHandover, Reservation, VehicleDocument, Driver, SyncTombstone
+
+# Klucze jak w routerze API (/api/vehicles/, /api/damage_events/, ...)
+ENTITY_VEHICLE = 'vehicles'
+ENTITY_DAMAGE = 'damage_events'
+ENTITY_HANDOVER = 'handovers'
+ENTITY_RESERVATION = 'reservations'
+ENTITY_DOCUMENT = 'vehicle_documents'
+
+SYNC_MODELS = {
+    ENTITY_VEHICLE: Vehicle,
+    ENTITY_DAMAGE: DamageEvent,
+    ENTITY_HANDOVER: VehicleHandover,
+    ENTITY_RESERVATION: Reservation,
+    ENTITY_DOCUMENT: VehicleDocument,
+}
+ENTITY_BY_MODEL = {model: entity for entity, model in SYNC_MODELS.items()}
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+# --- TOKENY (mikrosekundy od epoki; dla klienta nieprzezroczysty napis) ---
+
+def make_token(moment):
+    return str((moment - _EPOCH) // _MICROSECOND)
+
+
+def parse_token(token):
+    """Token -> datetime (UTC); None dla pustego tokenu (pełna synchronizacja)."""
+    if not token:
+        return None
+    try:
+        value = int(token)
+    except (TypeError, ValueError):
+        raise InvalidToken(token)
+    if value < 0:
+        raise InvalidToken(token)
+    return _EPOCH + value * _MICROSECOND
+
+
+def next_token(started):
+    """
+    Token na następną synchronizację - cofnięty o FLEET_SYNC_SAFETY_SECONDS. Transakcja, która ustawiła
+    updated_at przed startem odczytu, a zatwierdziła się po nim, trafi do następnej paczki; klient
+    dostaje wtedy część wierszy drugi raz (nadpisuje je u siebie).
+    """
+    return make_token(started - datetime.timedelta(seconds=getattr(settings, 'FLEET_SYNC_SAFETY_SECONDS', 5)))
+
+
+def needs_reset(since, now=None):
+    """Token starszy niż przechowywane ślady usunięć - klient musi pobrać wszystko od nowa."""
+    if since is None:
+        return False
+    retention = datetime.timedelta(days=getattr(settings, 'FLEET_SYNC_TOMBSTONE_DAYS', 30))
+    return since < (now or timezone.now()) - retention
+
+
+# --- ŚLADY USUNIĘĆ ---
+
+def tombstone_for(instance):
+    """Ślad usunięcia z zakresem widoczności: pojazd (szkody, dokumenty) lub konto kierowcy."""
+    entity = ENTITY_BY_MODEL[type(instance)]
+    vehicle_id = user_pk = None
+    if isinstance(instance, Vehicle):
+        vehicle_id = instance.pk
+    elif isinstance(instance, DamageEvent):
+        vehicle_id = instance.pojazd_id
+    elif isinstance(instance, VehicleDocument):
+        vehicle_id = instance.vehicle_id
+    elif isinstance(instance, VehicleHandover):
+        vehicle_id = instance.pojazd_id
+        user_pk = driver_user_pk(instance.kierowca_id)
+    elif isinstance(instance, Reservation):
+        vehicle_id = instance.assigned_vehicle_id
+        user_pk = driver_user_pk(instance.driver_id)
+    return SyncTombstone(entity=entity, object_id=instance.pk, vehicle_id=vehicle_id, user_pk=user_pk)
+
+
+# Pola zakresu widoczności śladu (pojazd, konto kierowcy) - jak w tombstone_for, do zapytań zbiorczych
+_SCOPE_FIELDS = {
+    Vehicle: ('id', None),
+    DamageEvent: ('pojazd_id', None),
+    VehicleDocument: ('vehicle_id', None),
+    VehicleHandover: ('pojazd_id', 'kierowca__user_id'),
+    Reservation: ('assigned_vehicle_id', 'driver__user_id'),
+}
+
+
+def tombstones_for_ids(model, ids):
+    """Ślady jak tombstone_for dla wielu wierszy jednym zapytaniem (usuwanie z pominięciem sygnałów)."""
+    entity, now = ENTITY_BY_MODEL[model], timezone.now()
+    vehicle_field, user_field = _SCOPE_FIELDS[model]
+    fields = ['id', vehicle_field] + ([user_field] if user_field else [])
+    return [
+        SyncTombstone(entity=entity, object_id=row[0], vehicle_id=row[1], user_pk=row[2] if user_field else None,
+                      deleted_at=now)
+        for row in model.objects.filter(pk__in=ids).values_list(*fields)
+    ]
+
+
+def driver_user_pk(driver_id):
+    """Id konta kierowcy (zakres widoczności śladów i zdarzeń)."""
+    if not driver_id:
+        return None
+    return Driver.objects.filter(pk=driver_id).values_list('user_id', flat=True).first()
+
+
+def deleted_since(since, entities=None):
+    """Ślady usunięć od tokenu: {entity: [(object_id, vehicle_id, user_pk), ...]}."""
+    tombstones = SyncTombstone.objects.all()
+    if since is not None:
+        tombstones = tombstones.filter(deleted_at__gte=since)
+    if entities is not None:
+        tombstones = tombstones.filter(entity__in=entities)
+    result = {}
+    for entity, object_id, vehicle_id, user_pk in tombstones.order_by('deleted_at').values_list(
+        'entity', 'object_id', 'vehicle_id', 'user_pk'
+    ):
+        result.setdefault(entity, []).append((object_id, vehicle_id, user_pk))
+    return result
+
+
+def prune_tombstones(now=None):
+    """Usuwa ślady starsze niż FLEET_SYNC_TOMBSTONE_DAYS. Zwraca liczbę usuniętych."""
+    retention = datetime.timedelta(days=getattr(settings, 'FLEET_SYNC_TOMBSTONE_DAYS', 30))
+    deleted, _ = SyncTombstone.objects.filter(deleted_at__lt=(now or timezone.now()) - retention).delete()
+    return deleted
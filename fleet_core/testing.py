@@ -0,0 +1,32 @@
+# fleet_core/testing.py
+
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    Pomocnik do testów: endpoint nie może przekroczyć zadeklarowanego budżetu zapytań SQL.
+
+    query_budgets = {'vehicle-list': 5}  # nazwa route -> maks. liczba zapytań
+    """
+    query_budgets = {}
+
+    @contextmanager
+    def assertMaxQueries(self, budget, using='default'):
+        with CaptureQueriesContext(connections[using]) as ctx:
+            yield ctx
+        if len(ctx.captured_queries) > budget:
+            queries = '\n'.join(f"{i}. {q['sql']}" for i, q in enumerate(ctx.captured_queries, start=1))
+            self.fail(f"Przekroczono budżet zapytań: {len(ctx.captured_queries)} > {budget}\n{queries}")
+
+    def assertWithinQueryBudget(self, response, route_name=None):
+        """Sprawdza nagłówek X-DB-Queries ustawiany przez QueryStatsMiddleware."""
+        route_name = route_name or response.resolver_match.url_name
+        self.assertIn(route_name, self.query_budgets, f"Brak budżetu zapytań dla '{route_name}'.")
+        self.assertIn('X-DB-Queries', response, "Brak nagłówka X-DB-Queries (QueryStatsMiddleware).")
+        used = int(response['X-DB-Queries'])
+        budget = self.query_budgets[route_name]
+        self.assertLessEqual(used, budget, f"'{route_name}': {used} zapytań, budżet {budget}.")
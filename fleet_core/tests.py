@@ -1,3 +1,1146 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import decimal
+import gzip
+import io
+import json
+import logging
+import os
+import random
+import runpy
+import tempfile
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.db import connection
+from django.db.utils import ConnectionHandler
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .authentication import FleetRefreshToken, deny_list
+from .autocomplete import index as autocomplete_index
+from .compression import CompressionMiddleware
+from .management.commands.benchmark_api import collect_routes
+from .management.commands.recount_open_damages import recount_open_damages
+from .events import broadcaster, EVENT_RESERVATION
+from .admin import EstimatedCountPaginator
+from .analytics import occupancy_matrix
+from .archive import archive_history
+from .benchmark import compare_reports
+from .db_profile import sqlite_pragma
+from .db_router import ReplicaRouter, ReplicaRoutingMiddleware, read_from_replica
+from .log import JsonFormatter, RequestIdFilter, SamplingFilter, request_id_var
+from .models import (
+    CustomUser, Vehicle, DamageEvent, Driver, FleetCompany, Reservation, VehicleHandover, ServiceEvent,
+    OdometerReading, GlobalSettings, RateTier, InsurancePolicy, VehicleDocument, ReservationFile,
+    ArchivedHandover, ArchivedReservation, ArchivedReservationFile, SyncTombstone,
+)
+from .pools import BoundedExecutor, hash_passwords
+from .pricing import RateTable
+from .renderers import OrjsonRenderer, msgpack, orjson
+from .object_cache import representation_cache
+from .response_cache import ResponseCache, response_cache
+from .scheduling import IntervalIndex
+from . import search as search_index
+from .search import search as full_text_search
+from .sync import make_token as sync_token
+from .testing import QueryBudgetMixin
+
+
+class OpenDamageCountTests(TestCase):
+    def setUp(self):
+        self.vehicle = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA1')
+
+    def _damage(self, status='ZGLOSZONA'):
+        return DamageEvent.objects.create(pojazd=self.vehicle, opis='Rysa', data_zdarzenia=datetime.date.today(),
+                                          status_naprawy=status)
+
+    def _state(self):
+        self.vehicle.refresh_from_db()
+        return self.vehicle.open_damage_count, self.vehicle.status
+
+    def test_create_close_and_delete_update_count_and_status(self):
+        first, second = self._damage(), self._damage('W_NAPRAWIE')
+        self._damage('ZAMKNIETA')
+        self.assertEqual(self._state(), (2, 'NIESPRAWNY'))
+
+        first.status_naprawy = 'ZAMKNIETA'
+        first.save()
+        self.assertEqual(self._state(), (1, 'NIESPRAWNY'))
+        second.delete()
+        self.assertEqual(self._state(), (0, 'SPRAWNY'))
+
+    def test_recount_repairs_drifted_count_and_stale_status(self):
+        self._damage()
+        other = Vehicle.objects.create(vin='VIN00000000000002', registration_number='WA2')
+        # Licznik rozjechany / licznik dobry, ale status nieaktualny
+        Vehicle.objects.filter(pk=self.vehicle.pk).update(open_damage_count=5, status='SPRAWNY')
+        Vehicle.objects.filter(pk=other.pk).update(status='NIESPRAWNY')
+
+        self.assertEqual(recount_open_damages(batch_size=1), 2)
+        self.assertEqual(self._state(), (1, 'NIESPRAWNY'))
+        other.refresh_from_db()
+        self.assertEqual((other.open_damage_count, other.status), (0, 'SPRAWNY'))
+        self.assertEqual(recount_open_damages(), 0)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    query_budgets = {
+        'vehicle-list': 8,
+        'damage_event-list': 8,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create_user(username='logistyka', password='x', rola='LOGISTYKA')
+        for i in range(3):
+            vehicle = Vehicle.objects.create(vin=f"WVWZZZ1JZXW00000{i}", registration_number=f"WA{i:05d}")
+            DamageEvent.objects.create(pojazd=vehicle, opis='Rysa', data_zdarzenia=datetime.date.today())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_headers_present_for_api(self):
+        response = self.client.get(reverse('damage_event-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-DB-Queries']), 0)
+        self.assertGreaterEqual(float(response['X-DB-Time']), 0)
+        self.assertWithinQueryBudget(response)
+
+    def test_budget_exceeded_fails(self):
+        with self.assertRaises(AssertionError):
+            with self.assertMaxQueries(0):
+                Vehicle.objects.count()
+
+    @override_settings(FLEET_SLOW_QUERY_MS=0, FLEET_EXPLAIN_THRESHOLD_MS=0)
+    def test_slow_query_log_with_explain(self):
+        with self.assertLogs('fleet_core.slow_queries', level='WARNING') as logs:
+            self.client.get(reverse('vehicle-list'))
+        self.assertIn('EXPLAIN', logs.output[0])
+
+
+class BenchmarkApiTests(TestCase):
+    def setUp(self):
+        call_command('seed_fleet', companies=2, vehicles=3, drivers=2, handovers=4, reservations=4, damages=1,
+                     services=1, policies=1, documents=1, readings=9, stdout=io.StringIO())
+
+    def test_seed_writes_increasing_odometer_readings(self):
+        self.assertEqual(OdometerReading.objects.count(), 9)
+        for vehicle_id in Vehicle.objects.values_list('id', flat=True):
+            km = list(OdometerReading.objects.filter(pojazd_id=vehicle_id).order_by('data_odczytu', 'id')
+                      .values_list('przebieg', flat=True))
+            self.assertEqual(km, sorted(km))
+
+    def test_routes_use_action_methods_and_include_function_views(self):
+        routes = {name: (method, url) for name, method, url, _ in collect_routes(datetime.date.today())}
+        self.assertEqual(routes['handover-reprice'], ('post', reverse('handover-reprice')))
+        self.assertEqual(routes['reservation-auto-assign'], ('post', reverse('reservation-auto-assign')))
+        self.assertEqual(routes['vehicle-odometer'][0], 'get')
+        self.assertTrue({'search', 'autocomplete', 'sync', 'events', 'metrics'} <= routes.keys())
+
+    def test_post_actions_run_without_writing(self):
+        only = ['driver-onboard', 'handover-reprice', 'reservation-auto-assign', 'events', 'vehicle-mileage']
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            call_command('benchmark_api', iterations=1, role='ADMIN', only=only, output=output, stdout=io.StringIO())
+            with open(output, encoding='utf-8') as f:
+                report = json.load(f)
+        self.assertEqual({name: row['status'] for name, row in report['routes'].items()}, dict.fromkeys(only, 200))
+        self.assertFalse(CustomUser.objects.filter(username='bench_onboard').exists())
+
+    def test_forbidden_routes_reported_apart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'bench.json')
+            call_command('benchmark_api', iterations=1, role='LOGISTYKA', only=['handover-reprice', 'vehicle-list'],
+                         output=output, stdout=io.StringIO())
+            with open(output, encoding='utf-8') as f:
+                report = json.load(f)
+        self.assertEqual(list(report['routes']), ['vehicle-list'])
+        self.assertEqual(report['failed']['handover-reprice']['status'], 403)
+
+        # Wiersz 403 ze starszego raportu nie trafia do porównania
+        old = {'routes': {'vehicle-list': {'p95': 2.0, 'status': 200}, 'handover-reprice': {'p95': 1.0, 'status': 403}}}
+        new = {'routes': {'vehicle-list': {'p95': 3.0, 'status': 200}, 'handover-reprice': {'p95': 9.0, 'status': 200}}}
+        self.assertEqual([row['route'] for row in compare_reports(old, new)], ['vehicle-list'])
+
+
+class MetricsTests(TestCase):
+    def test_metrics_exposition(self):
+        user = CustomUser.objects.create_user(username='ksiegowa', password='x', rola='KSIĘGOWOŚĆ')
+        client = APIClient()
+        client.force_authenticate(user)
+        client.get(reverse('vehicle-availability'))
+
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('fleet_http_requests_total{method="GET",route="vehicle-availability",status="200"}', body)
+        self.assertIn('fleet_http_request_duration_seconds_bucket{method="GET",route="vehicle-availability",le="+Inf"}', body)
+        self.assertIn('fleet_http_db_queries_count{route="vehicle-availability"}', body)
+
+
+class StructuredLoggingTests(TestCase):
+    def test_json_record_with_request_id(self):
+        record = logging.makeLogRecord({
+            'name': 'fleet_core.views', 'levelno': logging.INFO, 'levelname': 'INFO',
+            'msg': 'Utworzono przekazanie %s', 'args': (7,), 'reservation_id': 3,
+        })
+        token = request_id_var.set('abc123')
+        try:
+            RequestIdFilter().filter(record)
+        finally:
+            request_id_var.reset(token)
+        payload = json.loads(JsonFormatter().format(record))
+        self.assertEqual(payload['message'], 'Utworzono przekazanie 7')
+        self.assertEqual(payload['request_id'], 'abc123')
+        self.assertEqual(payload['reservation_id'], 3)
+
+    def test_sampling_keeps_warnings(self):
+        sampling = SamplingFilter(rates={'fleet_core.views': 0.0})
+        debug = logging.makeLogRecord({'name': 'fleet_core.views', 'levelno': logging.DEBUG})
+        warning = logging.makeLogRecord({'name': 'fleet_core.views', 'levelno': logging.WARNING})
+        other = logging.makeLogRecord({'name': 'fleet_core.signals', 'levelno': logging.DEBUG})
+        self.assertFalse(sampling.filter(debug))
+        self.assertTrue(sampling.filter(warning))
+        self.assertTrue(sampling.filter(other))
+
+    def test_request_id_header(self):
+        response = self.client.get(reverse('mobile-app'), HTTP_X_REQUEST_ID='req-1')
+        self.assertEqual(response['X-Request-ID'], 'req-1')
+
+
+class ClaimsAuthenticationTests(TransactionTestCase):
+    # Logowanie haszuje hasło w puli wątków (osobne połączenie DB) - dane muszą być zatwierdzone
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username='kierowca', password='haslo-123', rola='DRIVER',
+                                                   first_name='Jan', last_name='Nowak')
+        deny_list.invalidate()
+
+    def login(self):
+        response = self.client.post(reverse('login'), {'username': 'kierowca', 'password': 'haslo-123'})
+        self.assertEqual(response.status_code, 200)
+        return APIClient(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+
+    def test_no_user_query_on_authenticated_read(self):
+        client = self.login()
+        client.get(reverse('reservation-list'))  # pierwsze żądanie ładuje deny-listę
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse('reservation-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'fleet_core_customuser' in q['sql']])
+
+    def test_role_change_revokes_tokens(self):
+        client = self.login()
+        self.assertEqual(client.get(reverse('reservation-list')).status_code, 200)
+        self.user.rola = 'USER'
+        self.user.save()
+        self.assertEqual(client.get(reverse('reservation-list')).status_code, 401)
+
+    def test_token_issued_right_after_revocation_is_valid(self):
+        # Np. authenticate() przehaszowuje hasło (save(update_fields=['password'])) tuż przed wydaniem tokenu
+        self.user.rola = 'USER'
+        self.user.save()
+        refresh = FleetRefreshToken.for_user(self.user)
+        self.assertFalse(deny_list.is_revoked(refresh))
+        self.assertFalse(deny_list.is_revoked(refresh.access_token))
+        client = self.login()
+        self.assertEqual(client.get(reverse('reservation-list')).status_code, 200)
+
+    def test_login_returns_503_when_pool_saturated(self):
+        full_pool = BoundedExecutor(max_workers=1, max_pending=-1)
+        with mock.patch('fleet_core.views.get_login_pool', return_value=full_pool):
+            response = self.client.post(reverse('login'), {'username': 'kierowca', 'password': 'haslo-123'},
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+
+class DriverOnboardingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='log', password='x', rola='LOGISTYKA'))
+        self.rows = [
+            {'username': 'k1', 'password': 'Haslo-1', 'first_name': 'Jan', 'company_name': 'Trans'},
+            {'username': 'k2', 'password': 'Haslo-2', 'company_name': 'Trans'},
+            {'username': 'k3', 'password': 'Haslo-3', 'company_name': 'Nowa'},
+        ]
+
+    @mock.patch('fleet_core.onboarding.hash_passwords', side_effect=lambda pw: [f"hash:{p}" for p in pw])
+    def test_bulk_creates_users_drivers_and_companies(self, _):
+        response = self.client.post(reverse('driver-onboard'), self.rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(Driver.objects.filter(user__username__in=['k1', 'k2', 'k3']).count(), 3)
+        self.assertEqual(FleetCompany.objects.filter(nazwa='Trans').count(), 1)
+        # bulk_create omija sygnały - import sam dopisuje kierowców do indeksu wyszukiwarki
+        self.assertEqual(len(full_text_search('trans')['driver']), 2)
+
+    def test_dry_run_and_row_errors(self):
+        rows = self.rows + [{'username': 'k1', 'password': 'x'}, {'username': 'log', 'password': 'x'}, {}]
+        response = self.client.post(reverse('driver-onboard') + '?dry_run=1', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['row'] for e in response.data['errors']], [4, 5, 6])
+        self.assertFalse(CustomUser.objects.filter(username='k1').exists())
+
+    def test_username_rules_match_user_model(self):
+        rows = [{'username': 'jan kowalski', 'password': 'x'}, {'username': 'jan#1', 'password': 'x'}]
+        response = self.client.post(reverse('driver-onboard') + '?dry_run=1', rows, format='json')
+        self.assertEqual([e['row'] for e in response.data['errors']], [1, 2])
+
+    def test_hashes_passwords_in_worker_processes(self):
+        # Prawdziwa pula 'spawn' - inicjalizacja Django w procesie potomnym i przesyłanie wyników
+        hashes = hash_passwords(['Haslo-1', 'Haslo-2', 'Haslo-3'], processes=2)
+        self.assertEqual(len(hashes), 3)
+        for password, encoded in zip(['Haslo-1', 'Haslo-2', 'Haslo-3'], hashes):
+            self.assertTrue(check_password(password, encoded))
+        self.assertFalse(check_password('Haslo-1', hashes[1]))
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.driver_user = CustomUser.objects.create_user(username='kowal', password='x', rola='DRIVER',
+                                                          first_name='Łukasz', last_name='Kowalski')
+        Driver.objects.create(user=self.driver_user, numer_prawa_jazdy='PJ-1')
+        self.vehicle = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA12345',
+                                              marka='Skoda', model='Octavia')
+        Vehicle.objects.create(vin='VIN00000000000002', registration_number='WA99999', marka='Skoda')
+
+    def search(self, user, q):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('search'), {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_results_grouped_and_kept_in_sync(self):
+        admin = CustomUser.objects.create_user(username='adm', password='x', rola='ADMIN')
+        results = self.search(admin, 'skoda')
+        self.assertEqual(len(results['vehicle']), 2)
+        # Bez polskich znaków i po prefiksie
+        self.assertEqual([r['title'] for r in self.search(admin, 'lukasz kowal')['driver']], ['Łukasz Kowalski'])
+
+        self.vehicle.registration_number = 'KR55555'
+        self.vehicle.save()
+        self.assertEqual([r['id'] for r in self.search(admin, 'kr555')['vehicle']], [self.vehicle.pk])
+        self.vehicle.delete()
+        self.assertEqual(len(self.search(admin, 'skoda')['vehicle']), 1)
+
+    def test_driver_sees_only_own_objects(self):
+        self.vehicle.assigned_user = self.driver_user
+        self.vehicle.save()
+        results = self.search(self.driver_user, 'skoda')
+        self.assertEqual([r['id'] for r in results['vehicle']], [self.vehicle.pk])
+
+    @skipIf(connection.vendor != 'sqlite', "rowid dokumentów tylko w FTS5")
+    def test_upsert_and_delete_by_rowid(self):
+        self.vehicle.save()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT rowid FROM fleet_search WHERE entity = 'vehicle' AND object_id = %s",
+                           [self.vehicle.pk])
+            self.assertEqual(cursor.fetchall(), [(search_index.document_rowid('vehicle', self.vehicle.pk),)])
+            cursor.execute("EXPLAIN QUERY PLAN DELETE FROM fleet_search WHERE rowid IN (%s)", [1])
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        # Filtr po rowid trafia do FTS5 (INDEX 0:=...), a nie pełny skan (INDEX 0:)
+        self.assertNotRegex(plan, r'INDEX 0:$')
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete_index.invalidate()
+        cache.clear()
+        self.client = APIClient()
+        self.driver_user = CustomUser.objects.create_user(username='kowal', password='x', rola='DRIVER',
+                                                          first_name='Łukasz', last_name='Kowalski')
+        self.driver = Driver.objects.create(user=self.driver_user, numer_prawa_jazdy='PJ-1')
+        self.mine = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA 12345',
+                                           assigned_user=self.driver_user)
+        Vehicle.objects.create(vin='VIN00000000000002', registration_number='WA12999')
+        self.admin = CustomUser.objects.create_user(username='adm', password='x', rola='ADMIN')
+
+    def complete(self, user, q, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('autocomplete'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(hit['type'], hit['label']) for hit in response.data]
+
+    def test_prefix_without_db_and_incremental_updates(self):
+        self.assertEqual(len(self.complete(self.admin, 'wa12')), 2)  # leniwe zbudowanie indeksu
+        self.client.force_authenticate(self.admin)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('autocomplete'), {'q': 'luk'})
+        self.assertEqual(self.complete(self.admin, 'luk'), [('driver', 'Łukasz Kowalski')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Vehicle.objects.create(vin='VIN00000000000003', registration_number='KR777')
+            self.mine.delete()
+        self.assertEqual(self.complete(self.admin, 'wa1', type='vehicle'), [('vehicle', 'WA12999')])
+        self.assertEqual(self.complete(self.admin, 'kr7'), [('vehicle', 'KR777')])
+
+    def test_driver_scope(self):
+        self.assertEqual(self.complete(self.driver_user, 'wa'), [('vehicle', 'WA 12345')])
+        self.assertEqual(self.complete(self.driver_user, 'adm'), [])
+        self.assertEqual(self.complete(self.driver_user, 'kowal'), [('driver', 'Łukasz Kowalski')])
+
+    def test_driver_scope_matches_vehicle_viewset(self):
+        # Kierowca ma auto z trwającej rezerwacji i otwartego wydania, nie tylko przypisane na stałe
+        today = datetime.date.today()
+        reserved = Vehicle.objects.create(vin='VIN00000000000004', registration_number='KR 10001')
+        handed_over = Vehicle.objects.create(vin='VIN00000000000005', registration_number='KR 10002')
+        Vehicle.objects.create(vin='VIN00000000000006', registration_number='KR 10003')
+        Reservation.objects.create(first_name='Łukasz', last_name='Kowalski', company='ACME', driver=self.driver,
+                                   date_from=today, date_to=today, assigned_vehicle=reserved, status='ZATWIERDZONE')
+        VehicleHandover.objects.create(kierowca=self.driver, pojazd=handed_over, data_wydania=today)
+        self.assertEqual(self.complete(self.driver_user, 'kr1'), [('vehicle', 'KR 10001'), ('vehicle', 'KR 10002')])
+        self.client.force_authenticate(self.driver_user)
+        with self.assertNumQueries(0):  # zakres pojazdów z cache
+            self.client.get(reverse('autocomplete'), {'q': 'kr1'})
+
+    def test_user_role_sees_all_vehicles(self):
+        user = CustomUser.objects.create_user(username='pracownik', password='x', rola='USER')
+        self.assertEqual(len(self.complete(user, 'wa12')), 2)
+
+
+@mock.patch('fleet_core.db_router.replica_alias', return_value='replica')
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.user = CustomUser.objects.create_user(username='log', password='x', rola='LOGISTYKA')
+        token = FleetRefreshToken.for_user(self.user).access_token
+        self.factory = RequestFactory(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        def view(request):
+            db = self.router.db_for_read(Vehicle)
+            if request.method == 'POST':
+                self.router.db_for_write(Vehicle)
+            return HttpResponse(db)
+        self.middleware = ReplicaRoutingMiddleware(view)
+
+    def test_default_outside_replica_context(self, _):
+        self.assertEqual(self.router.db_for_read(Vehicle), 'default')
+        with read_from_replica():
+            # TestCase trzyma otwartą transakcję - odczyt musi zostać na głównej
+            self.assertEqual(self.router.db_for_read(Vehicle), 'default')
+
+    def test_get_uses_replica_until_user_writes(self, _):
+        with mock.patch('fleet_core.db_router.connections') as conns:
+            conns.__getitem__.return_value.in_atomic_block = False
+            self.assertEqual(self.middleware(self.factory.get('/api/vehicles/')).content, b'replica')
+            self.middleware(self.factory.post('/api/vehicles/'))
+            # read-your-writes: po zapisie ten sam użytkownik czyta z bazy głównej
+            self.assertEqual(self.middleware(self.factory.get('/api/vehicles/')).content, b'default')
+            other = RequestFactory().get('/api/vehicles/')
+            self.assertEqual(self.middleware(other).content, b'replica')
+
+
+class DbProfileTests(TransactionTestCase):
+    # Wątki benchmarku otwierają własne połączenia - dane muszą być zatwierdzone
+    def test_production_profile_sets_pragmas_on_new_connection(self):
+        with mock.patch.dict(os.environ, {'FLEET_DB_PROFILE': 'production'}):
+            production = runpy.run_path(os.path.join(settings.BASE_DIR, 'Server', 'settings.py'))
+        with tempfile.TemporaryDirectory() as tmp, \
+                override_settings(FLEET_SQLITE_PRAGMAS=production['FLEET_SQLITE_PRAGMAS']):
+            db = {**production['DATABASES']['default'], 'NAME': os.path.join(tmp, 'profile.sqlite3')}
+            conn = ConnectionHandler({'default': db})['default']
+            try:
+                self.assertEqual(sqlite_pragma(conn, 'journal_mode'), 'wal')
+                self.assertEqual(sqlite_pragma(conn, 'busy_timeout'), 5000)
+                self.assertEqual(sqlite_pragma(conn, 'synchronous'), 1)  # NORMAL
+            finally:
+                conn.close()
+
+    def test_benchmark_db_touches_only_its_own_vehicles(self):
+        vehicle = Vehicle.objects.create(vin='WVWZZZ1JZXW000001', registration_number='WX1234A', uwagi='notatka')
+        with tempfile.TemporaryDirectory() as tmp:
+            call_command('benchmark_db', readers=1, writers=1, seconds=0.2, vehicles=5,
+                         output=os.path.join(tmp, 'bench_db.json'), stdout=io.StringIO())
+        vehicle.refresh_from_db()
+        self.assertEqual(vehicle.uwagi, 'notatka')
+        self.assertEqual(list(Vehicle.objects.values_list('pk', flat=True)), [vehicle.pk])
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        response_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='ks', password='x', rola='KSIĘGOWOŚĆ'))
+        self.vehicle = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA12345')
+
+    def test_repeat_get_served_from_cache_until_write(self):
+        url = reverse('vehicle-list')
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(len(response.json()), 1)
+
+        Vehicle.objects.create(vin='VIN00000000000002', registration_number='WA99999')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+
+    def test_driver_responses_keyed_by_user(self):
+        driver = CustomUser.objects.create_user(username='k', password='x', rola='DRIVER')
+        self.client.get(reverse('vehicle-list'))
+        self.client.force_authenticate(driver)
+        response = self.client.get(reverse('vehicle-list'))
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json(), [])
+
+    def test_lru_size_cap(self):
+        cache = ResponseCache(max_entries=2, max_bytes=10)
+        cache.set('a', b'1234', 'application/json', {})
+        cache.set('b', b'1234', 'application/json', {})
+        cache.get('a')
+        cache.set('c', b'1234', 'application/json', {})  # 12 B > 10 B -> wypada najdawniej użyty 'b'
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertEqual(len(cache), 2)
+
+
+class RepresentationCacheTests(TestCase):
+    def setUp(self):
+        representation_cache.clear()
+        response_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='log', password='x', rola='LOGISTYKA'))
+        self.vehicles = [
+            Vehicle.objects.create(vin=f"VIN0000000000000{i}", registration_number=f"WA1000{i}") for i in range(3)
+        ]
+
+    def test_only_changed_rows_are_serialized(self):
+        from .serializers import VehicleDto
+        url = reverse('vehicle-list')
+        with mock.patch.object(VehicleDto, 'get_assigned_user_name', autospec=True, return_value='-') as method:
+            self.client.get(url)
+            self.assertEqual(method.call_count, 3)
+
+            self.vehicles[0].uwagi = 'nowa uwaga'
+            self.vehicles[0].save()
+            response = self.client.get(url)
+            self.assertEqual(method.call_count, 4)  # tylko zmieniony pojazd
+        self.assertEqual({v['uwagi'] for v in response.json()}, {'nowa uwaga', None})
+
+    def test_row_version_grows_without_clock_progress(self):
+        vehicle, stale = self.vehicles[2], Vehicle.objects.get(pk=self.vehicles[2].pk)
+        versions = [vehicle.row_version]
+        # Ten sam takt zegara, potem zegar cofnięty (NTP) - wersja i tak rośnie
+        for now in (versions[0], versions[0], versions[0] - 10 ** 9):
+            with mock.patch('fleet_core.models.time.time_ns', return_value=now):
+                stale.save()
+            versions.append(stale.row_version)
+        self.assertEqual(versions, sorted(set(versions)))
+        vehicle.refresh_from_db()
+        self.assertEqual(vehicle.row_version, versions[-1])
+
+    def test_queryset_update_paths_bump_row_version(self):
+        vehicle = self.vehicles[1]
+        before = vehicle.row_version
+        DamageEvent.objects.create(pojazd=vehicle, opis='Rysa', data_zdarzenia=datetime.date.today())
+        vehicle.refresh_from_db()
+        self.assertNotEqual(vehicle.row_version, before)
+        self.assertEqual(vehicle.status, 'NIESPRAWNY')
+
+
+class RendererTests(TestCase):
+    data = {
+        'koszt': decimal.Decimal('1234.50'), 'dzien': datetime.date(2026, 1, 2),
+        'kiedy': datetime.datetime(2026, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc),
+        'nazwa': gettext_lazy('Zgłoszona'), 'lista': [1, 2.5, None, 'ąę'],
+    }
+
+    @skipIf(orjson is None, "orjson nie jest zainstalowany")
+    def test_orjson_matches_drf_json(self):
+        self.assertEqual(OrjsonRenderer().render(self.data), JSONRenderer().render(self.data))
+        data = {'opis': 'linia\u2028druga\u2029', 'lista': [1]}
+        self.assertEqual(OrjsonRenderer().render(data), JSONRenderer().render(data))
+        for indent in (2, 4):
+            self.assertEqual(OrjsonRenderer().render(data, renderer_context={'indent': indent}),
+                             JSONRenderer().render(data, renderer_context={'indent': indent}))
+        self.assertEqual(OrjsonRenderer().render({'x': float('nan')}), b'{"x":null}')
+
+    @skipIf(msgpack is None, "msgpack nie jest zainstalowany")
+    def test_msgpack_selected_by_accept_header(self):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user(username='k', password='x', rola='LOGISTYKA'))
+        Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA12345')
+        response = client.get(reverse('vehicle-list'), HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)[0]['registration_number'], 'WA12345')
+
+
+class CompressionTests(TestCase):
+    def middleware(self, response):
+        return CompressionMiddleware(lambda request: response)
+
+    def request(self, accept_encoding='gzip, br;q=0'):
+        return RequestFactory().get('/api/vehicles/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_large_json_gzipped_with_weak_etag(self):
+        body = json.dumps([{'registration_number': f"WA{i:05d}"} for i in range(500)]).encode()
+        response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = '"abc"'
+        response = self.middleware(response)(self.request())
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['ETag'], 'W/"abc"')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), body)
+
+    def test_streaming_compressed_incrementally(self):
+        chunks = [f"{i},WA{i:05d}\n".encode() * 50 for i in range(20)]
+        response = self.middleware(StreamingHttpResponse(iter(chunks), content_type='text/csv'))(self.request())
+        parts = list(response.streaming_content)
+        self.assertGreater(len(parts), 1)
+        self.assertEqual(gzip.decompress(b''.join(parts)), b''.join(chunks))
+
+    def test_skips_small_scans_and_refused_encodings(self):
+        small = self.middleware(HttpResponse(b'{}', content_type='application/json'))(self.request())
+        self.assertFalse(small.has_header('Content-Encoding'))
+        pdf = self.middleware(HttpResponse(b'%PDF' * 1000, content_type='application/pdf'))(self.request())
+        self.assertFalse(pdf.has_header('Content-Encoding'))
+        refused = self.middleware(HttpResponse(b'x' * 5000))(self.request('gzip;q=0, br;q=0'))
+        self.assertFalse(refused.has_header('Content-Encoding'))
+
+
+@override_settings(FLEET_SYNC_SAFETY_SECONDS=0)
+class SyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user(username='k', password='x', rola='DRIVER')
+        self.driver = Driver.objects.create(user=self.user, numer_prawa_jazdy='PJ-1')
+        other = Driver.objects.create(user=CustomUser.objects.create_user(username='o', password='x', rola='DRIVER'))
+        self.vehicle = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA12345')
+        self.other_vehicle = Vehicle.objects.create(vin='VIN00000000000002', registration_number='WA99999')
+        VehicleHandover.objects.create(kierowca=self.driver, pojazd=self.vehicle, data_wydania=datetime.date.today())
+        self.reservation = Reservation.objects.create(first_name='A', last_name='B', company='X',
+                                                      vehicle_type='OSOBOWE', driver=self.driver)
+        self.other_reservation = Reservation.objects.create(first_name='C', last_name='D', company='X',
+                                                            vehicle_type='OSOBOWE', driver=other)
+        DamageEvent.objects.create(pojazd=self.other_vehicle, opis='obca', data_zdarzenia=datetime.date.today())
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None):
+        response = self.client.get(reverse('sync'), {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_full_then_delta_scoped_to_driver(self):
+        full = self.sync()
+        self.assertEqual([v['id'] for v in full['changes']['vehicles']], [self.vehicle.pk])
+        self.assertEqual([r['id'] for r in full['changes']['reservations']], [self.reservation.pk])
+        self.assertNotIn('damage_events', full['changes'])
+        self.assertEqual(full['vehicle_ids'], [self.vehicle.pk])
+
+        self.assertEqual(self.sync(full['token'])['changes'], {})
+
+        damage = DamageEvent.objects.create(pojazd=self.vehicle, opis='rysa', data_zdarzenia=datetime.date.today())
+        reservation_id = self.reservation.pk
+        self.reservation.delete()
+        self.other_reservation.delete()
+        delta = self.sync(full['token'])
+        self.assertEqual([d['id'] for d in delta['changes']['damage_events']], [damage.pk])
+        # Szkoda zmieniła status pojazdu - pojazd też jest w paczce
+        self.assertEqual([v['id'] for v in delta['changes']['vehicles']], [self.vehicle.pk])
+        self.assertEqual(delta['deleted'], {'reservations': [reservation_id]})
+        self.assertFalse(delta['reset'])
+
+    def test_invalid_and_expired_tokens(self):
+        self.assertEqual(self.client.get(reverse('sync'), {'since': 'abc'}).status_code, 400)
+        expired = sync_token(timezone.now() - datetime.timedelta(days=365))
+        response = self.sync(expired)
+        self.assertTrue(response['reset'])
+        self.assertEqual([v['id'] for v in response['changes']['vehicles']], [self.vehicle.pk])
+
+
+class EventsTests(TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.user = CustomUser.objects.create_user(username='k', password='x', rola='DRIVER')
+        self.driver = Driver.objects.create(user=self.user, numer_prawa_jazdy='PJ-1')
+        self.vehicle = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA12345')
+
+    def subscribe(self, role, user_id):
+        subscription = broadcaster.subscribe(role, user_id, loop=self.loop)
+        self.addCleanup(broadcaster.unsubscribe, subscription)
+        return subscription
+
+    def received(self, subscription):
+        self.loop.run_until_complete(asyncio.sleep(0))  # call_soon_threadsafe -> kolejka
+        events = []
+        while not subscription.queue.empty():
+            events.append(subscription.queue.get_nowait().payload)
+        return events
+
+    def test_events_scoped_per_role_and_user(self):
+        own, other, staff, employee = (self.subscribe('DRIVER', str(self.user.pk)), self.subscribe('DRIVER', '999'),
+                                       self.subscribe('LOGISTYKA', '1'), self.subscribe('USER', '2'))
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.create(first_name='A', last_name='B', company='X',
+                                                     vehicle_type='OSOBOWE', driver=self.driver)
+            reservation.additional_info = 'bez zmiany statusu'
+            reservation.save()
+            VehicleHandover.objects.create(kierowca=self.driver, pojazd=self.vehicle,
+                                           data_wydania=datetime.date.today())
+
+        self.assertEqual([(e['type'], e['action']) for e in self.received(own)],
+                         [('reservation', 'created'), ('handover', 'created')])
+        self.assertEqual(self.received(other), [])
+        self.assertEqual(len(self.received(staff)), 2)
+        # Pracownik (USER) widzi rezerwacje, ale wydania tylko swoje
+        self.assertEqual([e['type'] for e in self.received(employee)], ['reservation'])
+        self.assertEqual(self.received(own), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.status = 'ZATWIERDZONE'
+            reservation.save()
+        self.assertEqual(self.received(own), [{'type': 'reservation', 'id': reservation.pk, 'action': 'updated',
+                                               'url': f'/api/reservations/{reservation.pk}/',
+                                               'status': 'ZATWIERDZONE'}])
+
+    def test_damage_audience_looked_up_only_for_drivers(self):
+        staff = self.subscribe('LOGISTYKA', '1')
+        start = broadcaster.last_id
+        with mock.patch('fleet_core.signals.vehicle_history_user_ids', return_value={self.user.pk}) as lookup:
+            with self.captureOnCommitCallbacks(execute=True):
+                DamageEvent.objects.create(pojazd=self.vehicle, opis='Rysa', data_zdarzenia=datetime.date.today())
+            self.assertEqual([e['type'] for e in self.received(staff)], ['damage_event'])
+            lookup.assert_not_called()
+
+            missed, _ = broadcaster.replay('DRIVER', self.user.pk, start)
+            self.assertEqual([e.payload['type'] for e in missed], ['damage_event'])
+            broadcaster.replay('DRIVER', 999, start)
+            lookup.assert_called_once_with(self.vehicle.pk)
+
+    def test_reconnect_matches_missed_events_outside_lock(self):
+        start = broadcaster.last_id
+
+        def lookup(vehicle_id):
+            # Zapis w trakcie odtwarzania zaległych nie czeka na blokadę broadcastera
+            self.assertFalse(broadcaster._lock.locked())
+            broadcaster.publish(EVENT_RESERVATION, 8, 'created', user_ids=[self.user.pk])
+            return {self.user.pk}
+
+        with mock.patch('fleet_core.signals.vehicle_history_user_ids', side_effect=lookup):
+            with self.captureOnCommitCallbacks(execute=True):
+                DamageEvent.objects.create(pojazd=self.vehicle, opis='Rysa', data_zdarzenia=datetime.date.today())
+            subscription = broadcaster.subscribe('DRIVER', self.user.pk, last_event_id=start, loop=self.loop)
+            self.addCleanup(broadcaster.unsubscribe, subscription)
+        # Zaległe przed zdarzeniem opublikowanym w trakcie, bez duplikatów
+        self.assertEqual([e['type'] for e in self.received(subscription)], ['damage_event', 'reservation'])
+        self.assertFalse(subscription.overflowed)
+
+    def test_wsgi_replays_missed_events(self):
+        token = str(FleetRefreshToken.for_user(self.user).access_token)
+        start = broadcaster.last_id
+        broadcaster.publish(EVENT_RESERVATION, 1, 'updated', roles=('ADMIN',))
+        event = broadcaster.publish(EVENT_RESERVATION, 2, 'updated', user_ids=[self.user.pk])
+        response = self.client.get(reverse('events'), {'token': token}, HTTP_LAST_EVENT_ID=str(start))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertIn(f"id: {event.id}\nevent: reservation\n", body)
+        self.assertNotIn('"id":1,', body)
+        self.assertTrue(body.endswith(f"id: {event.id}\n\n"))
+        self.assertEqual(self.client.get(reverse('events')).status_code, 401)
+
+    async def test_asgi_stream_pushes_events(self):
+        token = str(FleetRefreshToken.for_user(self.user).access_token)
+        response = await AsyncClient().get(reverse('events'), headers={'Authorization': f'Bearer {token}'})
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b'retry: '))
+        broadcaster.publish(EVENT_RESERVATION, 7, 'created', user_ids=[self.user.pk])
+        self.assertIn(b'"id":7', await asyncio.wait_for(anext(chunks), timeout=2))
+        await chunks.aclose()
+
+
+class UtilizationTests(TestCase):
+    def test_occupancy_matches_day_by_day_loop(self):
+        rng = random.Random(1)
+        intervals = [(rng.randrange(4), start, start + rng.randrange(6))
+                     for start in (rng.randrange(-5, 25) for _ in range(40))]
+        expected = [[False] * 20 for _ in range(4)]
+        for row, start, end in intervals:
+            for day in range(max(start, 0), min(end, 19) + 1):
+                expected[row][day] = True
+        rows, starts, ends = zip(*intervals)
+        self.assertEqual(occupancy_matrix(rows, starts, ends, 4, 20).tolist(), expected)
+
+    def test_report_per_type_and_month(self):
+        driver = Driver.objects.create(user=CustomUser.objects.create_user(username='k', password='x', rola='DRIVER'))
+        car = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA1', typ_pojazdu='OSOBOWE')
+        suv = Vehicle.objects.create(vin='VIN00000000000002', registration_number='WA2', typ_pojazdu='SUV')
+        VehicleHandover.objects.create(kierowca=driver, pojazd=car, data_wydania=datetime.date(2025, 1, 1),
+                                       data_zwrotu=datetime.date(2025, 1, 10))
+        # Nakłada się na wydanie - dni liczone raz; odrzucona rezerwacja nie zajmuje pojazdu
+        for status, day_from, day_to in (('ZATWIERDZONE', 5, 15), ('ODRZUCONE', 20, 31)):
+            Reservation.objects.create(first_name='A', last_name='B', company='X', vehicle_type='OSOBOWE',
+                                       assigned_vehicle=car, status=status,
+                                       date_from=datetime.date(2025, 1, day_from), date_to=datetime.date(2025, 1, day_to))
+        VehicleHandover.objects.create(kierowca=driver, pojazd=suv, data_wydania=datetime.date(2025, 12, 1))
+
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user(username='l', password='x', rola='LOGISTYKA'))
+        report = client.get(reverse('vehicle-utilization'), {'year': 2025}).json()
+        self.assertEqual(len(report['months']), 12)
+        groups = {g['key']: g for g in report['groups']}
+        self.assertEqual(groups['OSOBOWE']['utilization'][0], 48.4)  # 15 z 31 dni
+        self.assertEqual(groups['SUV']['utilization'][11], 100.0)
+        self.assertEqual(report['total']['utilization'][0], 24.2)
+        self.assertEqual(report['total']['year'], round(46 * 100 / 730, 1))
+
+        client.force_authenticate(driver.user)
+        self.assertEqual(client.get(reverse('vehicle-utilization')).status_code, 403)
+
+
+class OdometerTests(TestCase):
+    def setUp(self):
+        driver = Driver.objects.create(user=CustomUser.objects.create_user(username='k', password='x', rola='DRIVER'))
+        self.vehicle = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA1', przebieg=10000)
+        self.handover = VehicleHandover.objects.create(
+            kierowca=driver, pojazd=self.vehicle, data_wydania=datetime.date(2026, 1, 1), przebieg_start=10000,
+            data_zwrotu=datetime.date(2026, 1, 31), przebieg_stop=12000)
+        VehicleHandover.objects.create(kierowca=driver, pojazd=self.vehicle, data_wydania=datetime.date(2026, 2, 15),
+                                       przebieg_start=12000, data_zwrotu=datetime.date(2026, 2, 28),
+                                       przebieg_stop=14500)
+        ServiceEvent.objects.create(pojazd=self.vehicle, opis='olej', data_serwisu=datetime.date(2026, 3, 10),
+                                    przebieg=15000)
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='l', password='x', rola='LOGISTYKA'))
+
+    def test_readings_appended_once_per_source(self):
+        self.handover.uwagi = 'bez zmiany licznika'
+        self.handover.save()
+        self.assertEqual(OdometerReading.objects.filter(pojazd=self.vehicle).count(), 5)
+        reading = OdometerReading.objects.first()
+        with self.assertRaises(ValueError):
+            reading.save()
+
+    def test_monthly_km_and_daily_average(self):
+        response = self.client.post(reverse('vehicle-odometer', args=[self.vehicle.pk]),
+                                    {'przebieg': 15500, 'data_odczytu': '2026-04-01'})
+        self.assertEqual(response.status_code, 201)
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.przebieg, 15500)
+
+        monthly = self.client.get(reverse('vehicle-mileage-monthly'), {'year': 2026}).json()
+        self.assertEqual(monthly[0]['months'], {'2026-01': 2000, '2026-02': 2500, '2026-03': 500, '2026-04': 500})
+        average = self.client.get(reverse('vehicle-mileage'), {'from': '2026-01-01', 'to': '2026-04-01'}).json()
+        self.assertEqual((average[0]['km'], average[0]['days'], average[0]['avg_daily_km']), (5500, 90, 61.1))
+        self.assertFalse(average[0]['over_limit'])
+
+
+class RepricingTests(TestCase):
+    def setUp(self):
+        GlobalSettings.objects.create(default_rate_km=decimal.Decimal('0.60'), default_fuel_penalty=decimal.Decimal('80'))
+        RateTier.objects.create(typ_pojazdu='DOSTAWCZE', stawka_za_km=decimal.Decimal('0.85'),
+                                oplata_za_paliwo=decimal.Decimal('120'))
+        driver = Driver.objects.create(user=CustomUser.objects.create_user(username='k', password='x', rola='DRIVER'))
+        self.car = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA1', typ_pojazdu='OSOBOWE')
+        self.van = Vehicle.objects.create(vin='VIN00000000000002', registration_number='WA2', typ_pojazdu='DOSTAWCZE')
+        self.closed = VehicleHandover.objects.create(
+            kierowca=driver, pojazd=self.van, data_wydania=datetime.date(2026, 3, 1), przebieg_start=1000,
+            data_zwrotu=datetime.date(2026, 3, 5), przebieg_stop=2001, stawka_za_km=decimal.Decimal('0.35'),
+            paliwo_start='100', paliwo_stop='50', koszt_brakujacego_paliwa=decimal.Decimal('50'))
+        self.open = VehicleHandover.objects.create(kierowca=driver, pojazd=self.car,
+                                                   data_wydania=datetime.date(2026, 9, 1), przebieg_start=500,
+                                                   stawka_za_km=decimal.Decimal('0.50'))
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='f', password='x', rola='KSIĘGOWOŚĆ'))
+
+    def test_total_is_exact_decimal(self):
+        self.closed.refresh_from_db()
+        self.assertEqual(self.closed.calkowity_koszt, decimal.Decimal('400.35'))
+
+    def test_most_specific_tier_wins(self):
+        rates = RateTable('0.50', '50', [('DOSTAWCZE', '', '0.80', '100'), ('DOSTAWCZE', 'ELECTRIC', '0.40', '0'),
+                                         ('', 'LPG', '0.45', '60')])
+        self.assertEqual(rates.resolve('DOSTAWCZE', 'ELECTRIC'), (decimal.Decimal('0.40'), decimal.Decimal('0')))
+        self.assertEqual(rates.resolve('DOSTAWCZE', 'DIESEL')[0], decimal.Decimal('0.80'))
+        self.assertEqual(rates.resolve('OSOBOWE', 'LPG')[0], decimal.Decimal('0.45'))
+        self.assertEqual(rates.resolve('OSOBOWE', 'DIESEL')[0], decimal.Decimal('0.50'))
+
+    def test_dry_run_reports_then_apply_writes(self):
+        url = reverse('handover-reprice')
+        version = VehicleHandover.objects.get(pk=self.closed.pk).row_version
+
+        report = self.client.post(url, {'fuel': True}, format='json').json()
+        self.assertEqual((report['dry_run'], report['checked'], report['changed']), (True, 2, 2))
+        change = next(c for c in report['changes'] if c['id'] == self.closed.pk)
+        self.assertEqual(decimal.Decimal(str(change['after']['calkowity_koszt'])), decimal.Decimal('970.85'))
+        self.assertEqual(VehicleHandover.objects.get(pk=self.closed.pk).calkowity_koszt, decimal.Decimal('400.35'))
+
+        # Tylko otwarte: zwrócone wydanie zostaje bez zmian
+        report = self.client.post(url + '?apply=1', {'open': True}, format='json').json()
+        self.assertEqual(report['changed'], 1)
+        self.assertEqual(VehicleHandover.objects.get(pk=self.open.pk).stawka_za_km, decimal.Decimal('0.60'))
+        closed = VehicleHandover.objects.get(pk=self.closed.pk)
+        self.assertEqual((closed.stawka_za_km, closed.row_version), (decimal.Decimal('0.35'), version))
+
+        self.client.post(url + '?apply=1', {'vehicle_ids': [self.van.pk], 'fuel': True}, format='json')
+        closed = VehicleHandover.objects.get(pk=self.closed.pk)
+        self.assertEqual((closed.koszt_brakujacego_paliwa, closed.calkowity_koszt),
+                         (decimal.Decimal('120.00'), decimal.Decimal('970.85')))
+        self.assertNotEqual(closed.row_version, version)
+
+    def test_new_handover_priced_from_rate_table(self):
+        driver = Driver.objects.get()
+        handover = VehicleHandover.objects.create(kierowca=driver, pojazd=self.van,
+                                                  data_wydania=datetime.date(2026, 10, 1), przebieg_start=3000)
+        self.assertEqual(handover.stawka_za_km, decimal.Decimal('0.85'))
+
+        # Zwrot z mniejszą ilością paliwa - opłata z progu; stawka podana przez klienta zostaje
+        handover.przebieg_stop, handover.paliwo_stop = 3100, '75'
+        handover.save()
+        handover.refresh_from_db()
+        self.assertEqual((handover.koszt_brakujacego_paliwa, handover.calkowity_koszt),
+                         (decimal.Decimal('120.00'), decimal.Decimal('205.00')))
+        supplied = VehicleHandover.objects.create(kierowca=driver, pojazd=self.car,
+                                                  data_wydania=datetime.date(2026, 10, 1),
+                                                  stawka_za_km=decimal.Decimal('0.40'))
+        self.assertEqual(supplied.stawka_za_km, decimal.Decimal('0.40'))
+
+    @override_settings(FLEET_REPRICE_MAX_CHANGES=1)
+    def test_report_lists_at_most_max_changes(self):
+        report = self.client.post(reverse('handover-reprice'), {'fuel': True}, format='json').json()
+        self.assertEqual((report['changed'], len(report['changes']), report['changes_truncated']), (2, 1, True))
+        self.assertEqual(decimal.Decimal(str(report['total_after'])), decimal.Decimal('970.85'))
+
+    def test_requires_finance_role(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(username='l', password='x', rola='LOGISTYKA'))
+        self.assertEqual(self.client.post(reverse('handover-reprice'), {}, format='json').status_code, 403)
+
+
+class AutoAssignTests(TestCase):
+    def setUp(self):
+        self.busy = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA1', typ_pojazdu='SUV')
+        self.idle = Vehicle.objects.create(vin='VIN00000000000002', registration_number='WA2', typ_pojazdu='SUV')
+        Vehicle.objects.create(vin='VIN00000000000003', registration_number='WA3', typ_pojazdu='SUV',
+                               status='NIESPRAWNY')
+        self._reservation(datetime.date(2026, 11, 1), datetime.date(2026, 11, 5), vehicle=self.busy,
+                          status='ZATWIERDZONE')
+        self._reservation(datetime.date(2026, 11, 11), datetime.date(2026, 11, 20), vehicle=self.busy,
+                          status='PRZYJETE')
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='l', password='x', rola='LOGISTYKA'))
+
+    def _reservation(self, date_from, date_to, vehicle=None, status='OCZEKUJACE', vehicle_type='SUV'):
+        return Reservation.objects.create(first_name='Jan', last_name='Nowak', company='ACME', date_from=date_from,
+                                          date_to=date_to, vehicle_type=vehicle_type, assigned_vehicle=vehicle,
+                                          status=status)
+
+    def test_interval_index_merges_and_checks_overlap(self):
+        index = IntervalIndex()
+        index.add(1, 10, 15)
+        index.add(1, 20, 25)
+        self.assertIsNone(index.slack(1, 15, 18))
+        self.assertEqual(index.slack(1, 16, 19), 0)
+        index.add(1, 16, 19)
+        self.assertEqual((index._starts[1], index._ends[1]), ([10], [25]))
+        self.assertEqual(index.slack(2, 1, 5), 2 * 10 ** 7)
+
+    def test_best_fit_fills_gaps_before_idle_vehicle(self):
+        gap = self._reservation(datetime.date(2026, 11, 6), datetime.date(2026, 11, 10))
+        overlapping = self._reservation(datetime.date(2026, 11, 8), datetime.date(2026, 11, 12))
+        undated = self._reservation(None, None)
+        other_type = self._reservation(datetime.date(2026, 11, 6), datetime.date(2026, 11, 7), vehicle_type='KOMBI')
+
+        url = reverse('reservation-auto-assign')
+        proposal = self.client.post(url, {}, format='json').json()
+        self.assertEqual({a['reservation']: a['vehicle'] for a in proposal['assignments']},
+                         {gap.pk: self.busy.pk, overlapping.pk: self.idle.pk})
+        self.assertEqual({u['reservation'] for u in proposal['unassigned']}, {undated.pk, other_type.pk})
+        self.assertFalse(Reservation.objects.filter(pk=gap.pk, assigned_vehicle__isnull=False).exists())
+
+        # W międzyczasie ktoś wydał drugi pojazd - ta część propozycji zostaje odrzucona
+        driver = Driver.objects.create(user=CustomUser.objects.create_user(username='k', password='x', rola='DRIVER'))
+        VehicleHandover.objects.create(kierowca=driver, pojazd=self.idle, data_wydania=datetime.date(2026, 11, 1))
+        result = self.client.post(url, {'assignments': proposal['assignments']}, format='json').json()
+        self.assertEqual([a['reservation'] for a in result['assigned']], [gap.pk])
+        self.assertEqual([r['reservation'] for r in result['rejected']], [overlapping.pk])
+        gap.refresh_from_db()
+        self.assertEqual(gap.assigned_vehicle_id, self.busy.pk)
+
+    def test_apply_writes_proposal(self):
+        reservation = self._reservation(datetime.date(2026, 11, 6), datetime.date(2026, 11, 10))
+        url = reverse('reservation-auto-assign')
+        self.client.post(url, {'reservation_ids': [reservation.pk]}, format='json')
+        self.assertIsNone(Reservation.objects.get(pk=reservation.pk).assigned_vehicle_id)
+        result = self.client.post(url + '?apply=1', {'reservation_ids': [reservation.pk]}, format='json').json()
+        self.assertEqual([a['reservation'] for a in result['assigned']], [reservation.pk])
+        self.assertIsNotNone(Reservation.objects.get(pk=reservation.pk).assigned_vehicle_id)
+
+    def test_requires_dispatcher_role(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(username='f', password='x', rola='KSIĘGOWOŚĆ'))
+        self.assertEqual(self.client.post(reverse('reservation-auto-assign'), {}, format='json').status_code, 403)
+
+
+@override_settings(FLEET_OBJECT_CACHE_ENABLED=False)
+class QueryPlanTests(TestCase):
+    # Liczba zapytań listy nie może rosnąć z liczbą wierszy (pojazdy: assigned_user_name liczone per wiersz)
+    ROUTES = ('driver-list', 'damage_event-list', 'policy-list', 'service_event-list', 'handover-list',
+              'reservation-list', 'vehicle_document-list')
+
+    def setUp(self):
+        self.company = FleetCompany.objects.create(nazwa='ACME', nip='1234567890')
+        self.rows = 0
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='l', password='x', rola='LOGISTYKA'))
+
+    def _add_rows(self, count):
+        for _ in range(count):
+            i = self.rows = self.rows + 1
+            user = CustomUser.objects.create_user(username=f'k{i}', password='x', first_name='Jan', last_name=f'N{i}')
+            driver = Driver.objects.create(user=user, company=self.company)
+            vehicle = Vehicle.objects.create(vin=f'VIN{i:014d}', registration_number=f'WA{i}')
+            today = datetime.date.today()
+            DamageEvent.objects.create(pojazd=vehicle, opis='Rysa', data_zdarzenia=today)
+            VehicleDocument.objects.create(vehicle=vehicle, title='SZKODA zdjęcie', file='x.jpg')
+            InsurancePolicy.objects.create(pojazd=vehicle, numer_polisy=f'P{i}', ubezpieczyciel='PZU',
+                                           data_waznosci_oc=today)
+            ServiceEvent.objects.create(pojazd=vehicle, opis='olej', data_serwisu=today)
+            reservation = Reservation.objects.create(first_name='Jan', last_name='N', company='ACME', driver=driver,
+                                                     date_from=today, date_to=today, vehicle_type='OSOBOWE',
+                                                     assigned_vehicle=vehicle)
+            VehicleHandover.objects.create(kierowca=driver, pojazd=vehicle, reservation=reservation,
+                                           data_wydania=today)
+
+    def _count_queries(self, route):
+        response_cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse(route))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.json()
+
+    def test_query_count_independent_of_rows(self):
+        self._add_rows(2)
+        small = {route: self._count_queries(route)[0] for route in self.ROUTES}
+        self._add_rows(5)
+        for route in self.ROUTES:
+            with self.subTest(route=route):
+                count, data = self._count_queries(route)
+                self.assertEqual(len(data), 7)
+                self.assertEqual(count, small[route])
+
+    def test_prefetched_fields_match_per_row_lookups(self):
+        self._add_rows(1)
+        damage = self._count_queries('damage_event-list')[1][0]
+        self.assertTrue(damage['has_photos'])
+        self.assertEqual(damage['pojazd_rej'], 'WA1')
+        reservation = self._count_queries('reservation-list')[1][0]
+        self.assertEqual((reservation['driver_display'], reservation['attachments']), ('Jan N1', []))
+
+
+class AdminScalingTests(TestCase):
+    def setUp(self):
+        self.admin_user = CustomUser.objects.create_superuser(username='root', password='x', email='r@x.pl')
+        self.client.force_login(self.admin_user)
+        self.rows = 0
+
+    def _add_handovers(self, count):
+        for _ in range(count):
+            i = self.rows = self.rows + 1
+            driver = Driver.objects.create(user=CustomUser.objects.create_user(username=f'k{i}', password='x'))
+            vehicle = Vehicle.objects.create(vin=f'VIN{i:014d}', registration_number=f'WA{i}')
+            VehicleHandover.objects.create(kierowca=driver, pojazd=vehicle, data_wydania=datetime.date(2026, 1, i))
+
+    def _changelist_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin:fleet_core_vehiclehandover_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_queries_independent_of_rows(self):
+        self._add_handovers(2)
+        small = self._changelist_queries()
+        self._add_handovers(6)
+        self.assertEqual(self._changelist_queries(), small)
+
+    @override_settings(FLEET_ADMIN_EXACT_COUNT=3)
+    def test_count_capped_for_large_filtered_lists(self):
+        self._add_handovers(5)
+        handovers = VehicleHandover.objects.order_by('id')
+        self.assertEqual(EstimatedCountPaginator(handovers.filter(przebieg_start=0), 2).count, 3)
+        self.assertEqual(EstimatedCountPaginator(handovers.filter(pojazd__registration_number='WA1'), 2).count, 1)
+
+    def test_change_form_uses_autocomplete_instead_of_full_select(self):
+        self._add_handovers(3)
+        handover = VehicleHandover.objects.first()
+        response = self.client.get(reverse('admin:fleet_core_vehiclehandover_change', args=[handover.pk]))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertNotContains(response, 'WA3 (VIN')
+
+
+class ArchiveTests(TestCase):
+    cutoff = datetime.date(2025, 1, 1)
+
+    def setUp(self):
+        self.driver = Driver.objects.create(
+            user=CustomUser.objects.create_user(username='k', password='x', rola='DRIVER'))
+        self.car = Vehicle.objects.create(vin='VIN00000000000001', registration_number='WA1', typ_pojazdu='OSOBOWE')
+        self.old = self._handover(datetime.date(2024, 3, 1), datetime.date(2024, 3, 10))
+        self.recent = self._handover(datetime.date(2024, 12, 20), datetime.date(2025, 1, 5))
+        self.finished = self._reservation('ZATWIERDZONE', datetime.date(2024, 3, 1), datetime.date(2024, 3, 10))
+        ReservationFile.objects.create(reservation=self.finished, file='umowy/a.pdf')
+        self.rejected = self._reservation('ODRZUCONE', datetime.date(2024, 5, 1), datetime.date(2024, 5, 2))
+        self.pending = self._reservation('OCZEKUJACE', datetime.date(2024, 6, 1), datetime.date(2024, 6, 2))
+        # Wskazywana przez wydanie, które zostaje w tabeli bieżącej - zostaje razem z nim
+        self.referenced = self._reservation('PRZYJETE', datetime.date(2024, 12, 1), datetime.date(2024, 12, 5))
+        self.recent.reservation = self.referenced
+        self.recent.save()
+
+    def _handover(self, issued, returned):
+        return VehicleHandover.objects.create(kierowca=self.driver, pojazd=self.car, data_wydania=issued,
+                                              data_zwrotu=returned)
+
+    def _reservation(self, status, date_from, date_to):
+        return Reservation.objects.create(first_name='Jan', last_name='Nowak', company='ACME', date_from=date_from,
+                                          date_to=date_to, vehicle_type='OSOBOWE', assigned_vehicle=self.car,
+                                          driver=self.driver, status=status)
+
+    def test_dry_run_counts_without_moving(self):
+        self.assertEqual(archive_history(self.cutoff, dry_run=True), {'handovers': 1, 'reservations': 2})
+        self.assertEqual(VehicleHandover.objects.count(), 2)
+        self.assertFalse(ArchivedHandover.objects.exists())
+
+    def test_moves_closed_rows_with_attachments(self):
+        version = Vehicle.objects.get(pk=self.car.pk).row_version
+        self.assertEqual(archive_history(self.cutoff, batch_size=1), {'handovers': 1, 'reservations': 2})
+        self.assertEqual(list(VehicleHandover.objects.values_list('id', flat=True)), [self.recent.pk])
+        self.assertEqual(set(Reservation.objects.values_list('id', flat=True)), {self.pending.pk, self.referenced.pk})
+
+        archived = ArchivedHandover.objects.get()
+        self.assertEqual((archived.pk, archived.data_zwrotu), (self.old.pk, self.old.data_zwrotu))
+        self.assertEqual(set(ArchivedReservation.objects.values_list('id', flat=True)),
+                         {self.finished.pk, self.rejected.pk})
+        self.assertEqual(ArchivedReservationFile.objects.get().reservation_id, self.finished.pk)
+        self.assertFalse(ReservationFile.objects.exists())
+        self.assertEqual(archive_history(self.cutoff), {'handovers': 0, 'reservations': 0})
+
+        # Telefony usuwają przeniesione wiersze jak usunięte (/api/sync/), VehicleDto przelicza się na nowo
+        self.assertEqual(set(SyncTombstone.objects.values_list('entity', 'object_id', 'vehicle_id', 'user_pk')), {
+            ('handovers', self.old.pk, self.car.pk, self.driver.user_id),
+            ('reservations', self.finished.pk, self.car.pk, self.driver.user_id),
+            ('reservations', self.rejected.pk, self.car.pk, self.driver.user_id),
+        })
+        self.assertGreater(Vehicle.objects.get(pk=self.car.pk).row_version, version)
+
+    def test_history_and_reports_read_archive(self):
+        archive_history(self.cutoff)
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user(username='l', password='x', rola='LOGISTYKA'))
+        events = client.get(reverse('vehicle-history', args=[self.car.pk])).json()
+        self.assertEqual(sorted(e['date'] for e in events if e['type'] in ('HANDOVER', 'RETURN'))[:2],
+                         ['2024-03-01', '2024-03-10'])
+
+        report = client.get(reverse('vehicle-utilization'), {'year': 2024}).json()
+        self.assertEqual(report['total']['utilization'][2], round(10 * 100 / 31, 1))
 
-# Create your tests here.
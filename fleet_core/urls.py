@@ -12,6 +12,10 @@ from .views import (
     ReservationViewSet,
     login_view,
     register_view,
+    search_view,
+    autocomplete_view,
+    sync_view,
+    events_view,
     ServiceEventViewSet,
     VehicleDocumentViewSet,
     GlobalSettingsViewSet,
@@ -35,6 +39,10 @@ urlpatterns = [
     # Ścieżki do logowania i rejestracji
     path('login/', login_view, name='login'),
     path('register/', register_view, name='register'),
+    path('search/', search_view, name='search'),
+    path('autocomplete/', autocomplete_view, name='autocomplete'),
+    path('sync/', sync_view, name='sync'),
+    path('events/', events_view, name='events'),
 
     # NOWA ŚCIEŻKA DLA APLIKACJI MOBILNEJ:
     path('mobile/', mobile_app_view, name='mobile-app'),
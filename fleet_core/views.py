@@ -4,25 +4,53 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.shortcuts import render
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.db.models import Q
+from asgiref.sync import sync_to_async
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+from django.utils import timezone
+import asyncio
 import datetime
+import json
+import logging
 
 # Importy Serializerów
 from .serializers import (
     VehicleDto, DriverDto, DamageEventDto, InsurancePolicyDto,
     VehicleHandoverDto, ServiceEventDto, ReservationDto,
-    VehicleDocumentDto, GlobalSettingsDto
+    VehicleDocumentDto, GlobalSettingsDto, OdometerReadingDto
 )
 
+from .authentication import FleetRefreshToken, ClaimsJWTAuthentication
+from . import events as fleet_events
+from .onboarding import onboard_drivers, rows_from_spreadsheet
+from .pools import get_login_pool, PoolSaturated
+from . import search as fleet_search
+from . import sync as fleet_sync
+from .autocomplete import index as autocomplete_index, OWN_SCOPE_ROLES
+from .response_cache import CachedResponseMixin
+from .query_plan import QueryPlanViewSetMixin
+from .analytics import utilization_report, GROUP_BY_CHOICES
+from .odometer import record_manual_reading, monthly_km, daily_average
+from .pricing import reprice, select_handovers
+from .scheduling import propose_assignments, apply_assignments
+from .archive import HANDOVER_MODELS, RESERVATION_MODELS
+
 # Importy Modeli
 from .models import (
     Vehicle, Driver, DamageEvent, InsurancePolicy, CustomUser,
-    VehicleHandover, ServiceEvent, Reservation, VehicleDocument,
+    VehicleHandover, ServiceEvent, Reservation, ReservationFile, VehicleDocument,
     GlobalSettings, FleetCompany
 )
 
+logger = logging.getLogger(__name__)
+
 
 # --- FUNKCJA 1: Tylko AKTUALNE auta (Dla zakładki "Pojazdy") ---
 def get_driver_vehicle_ids(user):
@@ -33,12 +61,12 @@ def get_driver_vehicle_ids(user):
     vehicle_ids = set()
 
     # 1. Przypisane na stałe
-    assigned = Vehicle.objects.filter(assigned_user=user).values_list('id', flat=True)
+    assigned = Vehicle.objects.filter(assigned_user_id=user.id).values_list('id', flat=True)
     vehicle_ids.update(assigned)
 
     # 2. Aktywne rezerwacje (Dziś mieści się w dacie)
     reserved = Reservation.objects.filter(
-        driver__user=user,
+        driver__user_id=user.id,
         status__in=['ZATWIERDZONE', 'PRZYJETE', 'OCZEKUJACE'],
         date_from__lte=today,
         date_to__gte=today
@@ -47,7 +75,7 @@ def get_driver_vehicle_ids(user):
 
     # 3. Aktywne wydania (Brak daty zwrotu lub zwrot w przyszłości)
     handed_over = VehicleHandover.objects.filter(
-        kierowca__user=user
+        kierowca__user_id=user.id
     ).filter(
         Q(data_zwrotu__isnull=True) | Q(data_zwrotu__gte=today)
     ).values_list('pojazd_id', flat=True)
@@ -67,24 +95,28 @@ def get_all_history_vehicle_ids(user):
     # 1. Aktualne (te co wyżej)
     vehicle_ids.update(get_driver_vehicle_ids(user))
 
-    # 2. Stare/Zakończone rezerwacje
-    past_reservations = Reservation.objects.filter(
-        driver__user=user
-    ).values_list('assigned_vehicle_id', flat=True)
-    vehicle_ids.update(past_reservations)
+    # 2. Stare/Zakończone rezerwacje (także z archiwum)
+    for model in RESERVATION_MODELS:
+        past_reservations = model.objects.filter(
+            driver__user_id=user.id
+        ).values_list('assigned_vehicle_id', flat=True)
+        vehicle_ids.update(past_reservations)
 
-    # 3. Zakończone wydania (Auta oddane)
-    past_handovers = VehicleHandover.objects.filter(
-        kierowca__user=user
-    ).values_list('pojazd_id', flat=True)
-    vehicle_ids.update(past_handovers)
+    # 3. Zakończone wydania (Auta oddane, także z archiwum)
+    for model in HANDOVER_MODELS:
+        past_handovers = model.objects.filter(
+            kierowca__user_id=user.id
+        ).values_list('pojazd_id', flat=True)
+        vehicle_ids.update(past_handovers)
 
     return list(vehicle_ids)
 
 
 # 1. WIDOK DLA POJAZDÓW
-class VehicleViewSet(viewsets.ModelViewSet):
+class VehicleViewSet(QueryPlanViewSetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = VehicleDto
+    # Status pojazdu zmienia się też przez szkody/wydania, zakres kierowcy - przez rezerwacje i wydania
+    cache_models = (Vehicle, FleetCompany, CustomUser, DamageEvent, Reservation, VehicleHandover)
 
     def get_queryset(self):
         user = self.request.user
@@ -117,7 +149,10 @@ class VehicleViewSet(viewsets.ModelViewSet):
     def history(self, request, pk=None):
         vehicle = self.get_object()
         events = []
-        for h in vehicle.handovers.all():
+        # Wydania z tabeli bieżącej i z archiwum (fleet_core/archive.py)
+        handovers = [*vehicle.handovers.select_related('kierowca__user'),
+                     *vehicle.archived_handovers.select_related('kierowca__user')]
+        for h in handovers:
             kierowca_str = "Nieznany"
             if h.kierowca and h.kierowca.user:
                 kierowca_str = f"{h.kierowca.user.first_name} {h.kierowca.user.last_name}"
@@ -176,15 +211,86 @@ class VehicleViewSet(viewsets.ModelViewSet):
                          'status': v.status, 'is_available': not is_busy, 'busy_info': busy_info})
         return Response(data)
 
+    # Raport wykorzystania: /api/vehicles/utilization/?year=2026&group_by=typ_pojazdu|company|vehicle
+    @action(detail=False, methods=['get'])
+    def utilization(self, request):
+        if getattr(request.user, 'rola', None) in ('DRIVER', 'USER'):
+            return Response({'detail': 'Brak uprawnień do raportu.'}, status=403)
+        group_by = request.query_params.get('group_by', 'typ_pojazdu')
+        if group_by not in GROUP_BY_CHOICES:
+            return Response({'detail': f"Parametr group_by: {', '.join(GROUP_BY_CHOICES)}."}, status=400)
+        try:
+            year = int(request.query_params.get('year', datetime.date.today().year))
+            datetime.date(year, 1, 1)
+        except ValueError:
+            return Response({'detail': 'Parametr year musi być rokiem.'}, status=400)
+        return Response(utilization_report(year, group_by=group_by))
+
+    # Dziennik licznika pojazdu: GET - ostatnie odczyty i km per miesiąc (12 mies.),
+    # POST {"przebieg": 123456, "data_odczytu": "2026-10-01"} - odczyt ręczny
+    @action(detail=True, methods=['get', 'post'])
+    def odometer(self, request, pk=None):
+        vehicle = self.get_object()
+        if request.method == 'POST':
+            if getattr(request.user, 'rola', None) == 'KSIĘGOWOŚĆ':
+                return Response({'detail': 'Brak uprawnień do zapisu.'}, status=403)
+            serializer = OdometerReadingDto(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            reading = record_manual_reading(vehicle, serializer.validated_data['przebieg'],
+                                            serializer.validated_data['data_odczytu'])
+            if reading is None:
+                return Response({'detail': 'Przebieg musi być większy od zera.'}, status=400)
+            return Response(OdometerReadingDto(reading).data, status=201)
+
+        today = datetime.date.today()
+        start = (today.replace(day=1) - datetime.timedelta(days=335)).replace(day=1)
+        readings = vehicle.odometer_readings.order_by('-data_odczytu', '-id')[:100]
+        return Response({
+            'readings': OdometerReadingDto(readings, many=True).data,
+            'monthly_km': monthly_km(start, today, vehicle_ids=[vehicle.pk]).get(vehicle.pk, {}),
+        })
+
+    # Średni dzienny przebieg floty: /api/vehicles/mileage/?from=2026-07-01&to=2026-09-30 (domyślnie 90 dni)
+    @action(detail=False, methods=['get'])
+    def mileage(self, request):
+        if getattr(request.user, 'rola', None) in ('DRIVER', 'USER'):
+            return Response({'detail': 'Brak uprawnień do raportu.'}, status=403)
+        try:
+            end = datetime.date.fromisoformat(request.query_params.get('to') or datetime.date.today().isoformat())
+            start = datetime.date.fromisoformat(
+                request.query_params.get('from') or (end - datetime.timedelta(days=90)).isoformat())
+        except ValueError:
+            return Response({'detail': 'Daty from/to w formacie RRRR-MM-DD.'}, status=400)
+        return Response(daily_average(start, end))
+
+    # Kilometry per miesiąc dla floty: /api/vehicles/mileage/monthly/?year=2026
+    @action(detail=False, methods=['get'], url_path='mileage/monthly')
+    def mileage_monthly(self, request):
+        if getattr(request.user, 'rola', None) in ('DRIVER', 'USER'):
+            return Response({'detail': 'Brak uprawnień do raportu.'}, status=403)
+        try:
+            year = int(request.query_params.get('year', datetime.date.today().year))
+            start, end = datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+        except ValueError:
+            return Response({'detail': 'Parametr year musi być rokiem.'}, status=400)
+        by_vehicle = monthly_km(start, end)
+        registrations = dict(Vehicle.objects.filter(pk__in=by_vehicle).values_list('id', 'registration_number'))
+        return Response([
+            {'vehicle': vehicle_id, 'registration_number': registrations.get(vehicle_id), 'months': months,
+             'km': sum(months.values())}
+            for vehicle_id, months in by_vehicle.items()
+        ])
+
 
 # 2. WIDOK SZKÓD
 # 2. WIDOK SZKÓD (Z AUTOMATYCZNĄ ZMIANĄ STATUSU POJAZDU)
-class DamageEventViewSet(viewsets.ModelViewSet):
+class DamageEventViewSet(QueryPlanViewSetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = DamageEventDto
+    cache_models = (DamageEvent, Vehicle, Reservation, VehicleHandover)
 
     def get_queryset(self):
         user = self.request.user
-        queryset = DamageEvent.objects.all().order_by('-data_zdarzenia')
+        queryset = DamageEvent.objects.order_by('-data_zdarzenia')
 
         if user.is_authenticated and hasattr(user, 'rola') and user.rola == 'DRIVER':
             history_ids = get_all_history_vehicle_ids(user)
@@ -192,56 +298,58 @@ class DamageEventViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-    # --- METODA POMOCNICZA AKTUALIZUJĄCA STATUS ---
-    def _update_vehicle_status(self, vehicle):
-        # Sprawdzamy, czy auto ma jakiekolwiek OTWARTE szkody
-        ma_aktywne_szkody = DamageEvent.objects.filter(
-            pojazd=vehicle,
-            status_naprawy__in=['ZGLOSZONA', 'W_NAPRAWIE']
-        ).exists()
+    # Status pojazdu (licznik otwartych szkód) aktualizują sygnały w fleet_core/signals.py
+    # przy dodaniu, edycji i usunięciu szkody.
 
-        if ma_aktywne_szkody:
-            vehicle.status = 'NIESPRAWNY'
-        else:
-            # Jeśli nie ma szkód, przywracamy status (Sprawny lub Wypożyczony)
-            if vehicle.assigned_user:
-                vehicle.status = 'WYPOZYCZONY'
-            else:
-                vehicle.status = 'SPRAWNY'
-
-        vehicle.save()
-
-    # Uruchamia się przy DODAWANIU szkody
-    def perform_create(self, serializer):
-        damage = serializer.save()
-        self._update_vehicle_status(damage.pojazd)
 
-    # Uruchamia się przy EDYCJI szkody (np. zmiana statusu na ZAMKNIETA)
-    def perform_update(self, serializer):
-        damage = serializer.save()
-        self._update_vehicle_status(damage.pojazd)
-
-
-class DriverViewSet(viewsets.ModelViewSet):
+class DriverViewSet(QueryPlanViewSetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Driver.objects.all()
     serializer_class = DriverDto
+    cache_models = (Driver, CustomUser, FleetCompany)
+
+    # Masowy import kierowców: JSON (lista wierszy) lub arkusz .xlsx w polu 'file'; ?dry_run=1 tylko waliduje
+    @action(detail=False, methods=['post'])
+    def onboard(self, request):
+        user = request.user
+        if getattr(user, 'rola', None) not in ('ADMIN', 'LOGISTYKA') and not user.is_staff:
+            return Response({'detail': 'Brak uprawnień do importu kierowców.'}, status=403)
+
+        uploaded = request.FILES.get('file')
+        if uploaded is not None:
+            try:
+                rows = rows_from_spreadsheet(uploaded)
+            except Exception as e:
+                return Response({'detail': f"Nie można odczytać arkusza: {e}"}, status=400)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            rows = request.data.get('rows')
+        if not isinstance(rows, list) or not rows:
+            return Response({'detail': 'Wymagana lista wierszy (JSON) lub plik .xlsx.'}, status=400)
 
+        dry_run = str(request.query_params.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        report = onboard_drivers(rows, dry_run=dry_run)
+        if report['errors']:
+            return Response(report, status=400)
+        return Response(report, status=200 if dry_run else 201)
 
-class InsurancePolicyViewSet(viewsets.ModelViewSet):
+
+class InsurancePolicyViewSet(QueryPlanViewSetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = InsurancePolicy.objects.all()
     serializer_class = InsurancePolicyDto
+    cache_models = (InsurancePolicy, Vehicle)
 
 
-class VehicleHandoverViewSet(viewsets.ModelViewSet):
+class VehicleHandoverViewSet(QueryPlanViewSetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = VehicleHandoverDto
     permission_classes = [permissions.AllowAny]
+    cache_models = (VehicleHandover, Vehicle, Driver, CustomUser, FleetCompany, Reservation)
 
     def get_queryset(self):
         user = self.request.user
-        queryset = VehicleHandover.objects.select_related('kierowca__user', 'kierowca__company',
-                                                          'pojazd').all().order_by('-data_wydania')
+        queryset = VehicleHandover.objects.all().order_by('-data_wydania')
         if user.is_authenticated and hasattr(user, 'rola') and user.rola in ['DRIVER', 'USER']:
-            queryset = queryset.filter(kierowca__user=user)
+            queryset = queryset.filter(kierowca__user_id=user.id)
         vehicle_id = self.request.query_params.get('vehicle')
         if vehicle_id:
             queryset = queryset.filter(pojazd_id=vehicle_id)
@@ -260,46 +368,70 @@ class VehicleHandoverViewSet(viewsets.ModelViewSet):
                 vehicle.status = 'WYPOZYCZONY'
         vehicle.save()
 
+    # Przeliczenie wg bieżących stawek (GlobalSettings + RateTier): POST {"open": true, "date_from": "2026-01-01",
+    # "date_to": "2026-06-30", "vehicle_ids": [1, 2], "fuel": false}. Domyślnie tylko raport różnic
+    # (jak reprice_handovers) - zapis z ?apply=1
+    @action(detail=False, methods=['post'])
+    def reprice(self, request):
+        user = request.user
+        if getattr(user, 'rola', None) not in ('ADMIN', 'KSIĘGOWOŚĆ') and not user.is_staff:
+            return Response({'detail': 'Brak uprawnień do przeliczania rozliczeń.'}, status=403)
+        try:
+            date_from, date_to = (
+                datetime.date.fromisoformat(request.data[key]) if request.data.get(key) else None
+                for key in ('date_from', 'date_to')
+            )
+            vehicle_ids = [int(pk) for pk in request.data.get('vehicle_ids') or []]
+        except (TypeError, ValueError):
+            return Response({'detail': 'Daty w formacie RRRR-MM-DD, vehicle_ids - lista liczb.'}, status=400)
+        handovers = select_handovers(open_only=bool(request.data.get('open')), date_from=date_from,
+                                     date_to=date_to, vehicle_ids=vehicle_ids)
+        apply = str(request.query_params.get('apply', '')).lower() in ('1', 'true', 'yes')
+        return Response(reprice(handovers, dry_run=not apply, fuel=bool(request.data.get('fuel'))))
 
-class ServiceEventViewSet(viewsets.ModelViewSet):
+
+class ServiceEventViewSet(QueryPlanViewSetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = ServiceEvent.objects.all()
     serializer_class = ServiceEventDto
+    cache_models = (ServiceEvent, Vehicle)
 
 
 # --- ULEPSZONA KLASA REZERWACJI ---
-class ReservationViewSet(viewsets.ModelViewSet):
+class ReservationViewSet(QueryPlanViewSetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = ReservationDto
+    cache_models = (Reservation, ReservationFile, Vehicle, Driver, CustomUser, VehicleHandover)
 
     def get_queryset(self):
         user = self.request.user
         if user.is_authenticated and hasattr(user, 'rola') and user.rola == 'DRIVER':
-            return Reservation.objects.filter(driver__user=user)
+            return Reservation.objects.filter(driver__user_id=user.id)
         return Reservation.objects.all().order_by('-created_at')
 
     def _create_handover_if_approved(self, instance):
-        """Wspólna logika dla create i update z dokładnymi logami"""
-        print(f"--- DEBUG REZERWACJI ID={instance.id} ---")
-        print(f"Status: {instance.status}")
-        print(f"Pojazd: {instance.assigned_vehicle}")
-        print(f"Kierowca: {instance.driver}")
+        """Wspólna logika dla create i update (diagnostyka na poziomie DEBUG loggera fleet_core.views)"""
+        log_ctx = {
+            'reservation_id': instance.id, 'reservation_status': instance.status,
+            'vehicle_id': instance.assigned_vehicle_id, 'driver_id': instance.driver_id,
+        }
+        logger.debug("Rezerwacja %s: sprawdzam utworzenie przekazania", instance.id, extra=log_ctx)
 
         # 1. Sprawdzenie statusu
         if instance.status != 'ZATWIERDZONE':
-            print("DEBUG: Status nie jest ZATWIERDZONE. Pomijam tworzenie przekazania.")
+            logger.debug("Status nie jest ZATWIERDZONE. Pomijam tworzenie przekazania.", extra=log_ctx)
             return
 
         # 2. Sprawdzenie danych
         if not instance.assigned_vehicle:
-            print("DEBUG: BŁĄD - Brak przypisanego POJAZDU! Przekazanie nie zostanie utworzone.")
+            logger.warning("Brak przypisanego POJAZDU - przekazanie nie zostanie utworzone.", extra=log_ctx)
             return
 
         if not instance.driver:
-            print("DEBUG: BŁĄD - Brak przypisanego KIEROWCY! Przekazanie nie zostanie utworzone.")
+            logger.warning("Brak przypisanego KIEROWCY - przekazanie nie zostanie utworzone.", extra=log_ctx)
             return
 
         # 3. Sprawdzenie duplikatów
         if VehicleHandover.objects.filter(reservation=instance).exists():
-            print("DEBUG: Przekazanie dla tej rezerwacji już istnieje.")
+            logger.debug("Przekazanie dla tej rezerwacji już istnieje.", extra=log_ctx)
             return
 
         # 4. Próba utworzenia
@@ -307,7 +439,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
             # Pobieramy aktualny przebieg auta, żeby wpisać go jako startowy
             start_mileage = int(instance.assigned_vehicle.przebieg) if instance.assigned_vehicle else 0
 
-            VehicleHandover.objects.create(
+            handover = VehicleHandover.objects.create(
                 kierowca=instance.driver,
                 pojazd=instance.assigned_vehicle,
                 reservation=instance,
@@ -316,9 +448,10 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 przebieg_start=start_mileage,  # <-- Dodano automatyczny przebieg
                 uwagi=f"Automatycznie z rezerwacji (ID: {instance.id})."
             )
-            print(f"DEBUG: SUKCES! Utworzono przekazanie.")
-        except Exception as e:
-            print(f"DEBUG: WYJĄTEK przy tworzeniu przekazania: {e}")
+            logger.info("Utworzono przekazanie %s z rezerwacji %s", handover.id, instance.id,
+                        extra={**log_ctx, 'handover_id': handover.id})
+        except Exception:
+            logger.exception("Wyjątek przy tworzeniu przekazania z rezerwacji %s", instance.id, extra=log_ctx)
 
     def perform_create(self, serializer):
         instance = serializer.save()
@@ -328,9 +461,35 @@ class ReservationViewSet(viewsets.ModelViewSet):
         instance = serializer.save()
         self._create_handover_if_approved(instance)
 
+    # Automatyczny przydział pojazdów oczekującym rezerwacjom (jak reprice - domyślnie bez zapisu):
+    # bez parametrów - tylko propozycja (opcjonalnie {"reservation_ids": [...]}),
+    # {"assignments": [{"reservation": 1, "vehicle": 2}, ...]} - zapis zatwierdzonej propozycji,
+    # ?apply=1 - propozycja od razu zapisana
+    @action(detail=False, methods=['post'], url_path='auto-assign')
+    def auto_assign(self, request):
+        user = request.user
+        if getattr(user, 'rola', None) not in ('ADMIN', 'LOGISTYKA') and not user.is_staff:
+            return Response({'detail': 'Brak uprawnień do przydziału pojazdów.'}, status=403)
+        assignments = request.data.get('assignments')
+        try:
+            if assignments is None:
+                reservation_ids = request.data.get('reservation_ids')
+                if reservation_ids is not None:
+                    reservation_ids = [int(pk) for pk in reservation_ids]
+                proposal = propose_assignments(reservation_ids)
+                if str(request.query_params.get('apply', '')).lower() not in ('1', 'true', 'yes'):
+                    return Response(proposal)
+                assignments = proposal['assignments']
+            result = apply_assignments(assignments)
+        except (TypeError, ValueError, KeyError):
+            return Response({'detail': 'reservation_ids - lista liczb; assignments - lista '
+                                       '{"reservation": id, "vehicle": id}.'}, status=400)
+        return Response(result)
+
 # --- BRAKUJĄCA KLASA (DODANA) ---
-class VehicleDocumentViewSet(viewsets.ModelViewSet):
+class VehicleDocumentViewSet(QueryPlanViewSetMixin, CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = VehicleDocumentDto
+    cache_models = (VehicleDocument, Vehicle)
 
     def get_queryset(self):
         queryset = VehicleDocument.objects.all().order_by('-uploaded_at')
@@ -354,24 +513,286 @@ class GlobalSettingsViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
+# --- WYSZUKIWARKA (indeks FTS5 / MySQL FULLTEXT) ---
+def _driver_visible_ids(user):
+    """Identyfikatory obiektów, które kierowca może zobaczyć w wynikach wyszukiwania."""
+    return {
+        fleet_search.ENTITY_VEHICLE: set(get_all_history_vehicle_ids(user)),
+        fleet_search.ENTITY_DRIVER: set(Driver.objects.filter(user_id=user.id).values_list('id', flat=True)),
+        fleet_search.ENTITY_RESERVATION: set(
+            Reservation.objects.filter(driver__user_id=user.id).values_list('id', flat=True)
+        ),
+        fleet_search.ENTITY_HANDOVER: set(
+            VehicleHandover.objects.filter(kierowca__user_id=user.id).values_list('id', flat=True)
+        ),
+    }
+
+
+@api_view(['GET'])
+def search_view(request):
+    """Wyszukiwanie pełnotekstowe: /api/search/?q=wa12&limit=10, wyniki pogrupowane po typie."""
+    query = request.query_params.get('q', '').strip()
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+    except ValueError:
+        return Response({'detail': 'Parametr limit musi być liczbą.'}, status=400)
+    if len(query) < 2:
+        return Response({'query': query, 'results': {}})
+
+    user = request.user
+    if getattr(user, 'rola', None) == 'DRIVER':
+        # Kierowca widzi tylko swoje obiekty - pobieramy więcej trafień i filtrujemy
+        visible = _driver_visible_ids(user)
+        grouped = {
+            entity: [hit for hit in hits if hit[0] in visible.get(entity, ())][:limit]
+            for entity, hits in fleet_search.search(query, per_entity=limit * 5).items()
+        }
+        grouped = {entity: hits for entity, hits in grouped.items() if hits}
+    else:
+        grouped = fleet_search.search(query, per_entity=limit)
+
+    results = {
+        entity: [{'id': object_id, 'title': title, 'score': score} for object_id, title, score in hits]
+        for entity, hits in grouped.items()
+    }
+    return Response({'query': query, 'results': results})
+
+
+AUTOCOMPLETE_SCOPE_KEY = 'fleet_core:autocomplete_vehicles:{}'
+
+
+def autocomplete_vehicle_ids(user):
+    """get_driver_vehicle_ids dla podpowiedzi - chwilę w cache, bo zapytanie przychodzi z każdym znakiem."""
+    key = AUTOCOMPLETE_SCOPE_KEY.format(user.id)
+    vehicle_ids = cache.get(key)
+    if vehicle_ids is None:
+        vehicle_ids = get_driver_vehicle_ids(user)
+        cache.set(key, vehicle_ids, getattr(settings, 'FLEET_AUTOCOMPLETE_SCOPE_TTL', 30))
+    return vehicle_ids
+
+
+@api_view(['GET'])
+def autocomplete_view(request):
+    """Podpowiedzi z indeksu w pamięci (bez bazy): /api/autocomplete/?q=wa1&type=vehicle&limit=10."""
+    entity = request.query_params.get('type') or None
+    if entity not in (None, 'vehicle', 'driver'):
+        return Response({'detail': 'Parametr type: vehicle lub driver.'}, status=400)
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+    except ValueError:
+        return Response({'detail': 'Parametr limit musi być liczbą.'}, status=400)
+
+    user = request.user
+    owner_id = vehicle_ids = None
+    if getattr(user, 'rola', None) in OWN_SCOPE_ROLES:
+        owner_id, vehicle_ids = user.id, autocomplete_vehicle_ids(user)
+    hits = autocomplete_index.complete(request.query_params.get('q', ''), entity=entity, limit=limit,
+                                       owner_id=owner_id, vehicle_ids=vehicle_ids)
+    return Response([{'type': hit_type, 'id': pk, 'label': label} for hit_type, pk, label in hits])
+
+
+# --- SYNCHRONIZACJA PRZYROSTOWA (aplikacja mobilna) ---
+def _sync_querysets(user, since):
+    """Zapytania o zmienione wiersze - ten sam zakres widoczności co w ViewSetach."""
+    querysets = {
+        fleet_sync.ENTITY_VEHICLE: Vehicle.objects.select_related('company', 'assigned_user'),
+        fleet_sync.ENTITY_DAMAGE: DamageEvent.objects.select_related('pojazd'),
+        fleet_sync.ENTITY_HANDOVER: VehicleHandover.objects.select_related(
+            'kierowca__user', 'kierowca__company', 'pojazd'),
+        fleet_sync.ENTITY_RESERVATION: Reservation.objects.select_related(
+            'assigned_vehicle', 'driver__user').prefetch_related('attachments'),
+        fleet_sync.ENTITY_DOCUMENT: VehicleDocument.objects.select_related('vehicle'),
+    }
+    role = getattr(user, 'rola', None)
+    scope = None
+    if role == 'DRIVER':
+        scope = get_driver_vehicle_ids(user)
+        history_ids = get_all_history_vehicle_ids(user)
+        querysets[fleet_sync.ENTITY_VEHICLE] = querysets[fleet_sync.ENTITY_VEHICLE].filter(id__in=scope)
+        querysets[fleet_sync.ENTITY_DAMAGE] = querysets[fleet_sync.ENTITY_DAMAGE].filter(pojazd_id__in=history_ids)
+        querysets[fleet_sync.ENTITY_DOCUMENT] = querysets[fleet_sync.ENTITY_DOCUMENT].filter(vehicle_id__in=history_ids)
+        querysets[fleet_sync.ENTITY_RESERVATION] = querysets[fleet_sync.ENTITY_RESERVATION].filter(
+            driver__user_id=user.id)
+    if role in ('DRIVER', 'USER'):
+        querysets[fleet_sync.ENTITY_HANDOVER] = querysets[fleet_sync.ENTITY_HANDOVER].filter(kierowca__user_id=user.id)
+
+    if since is not None:
+        for entity, queryset in querysets.items():
+            changed = Q(updated_at__gte=since)
+            if role == 'DRIVER' and entity == fleet_sync.ENTITY_DAMAGE:
+                # Nowa rezerwacja/wydanie podbija updated_at pojazdu - jego starsze szkody też stają się widoczne
+                changed |= Q(pojazd__updated_at__gte=since)
+            elif role == 'DRIVER' and entity == fleet_sync.ENTITY_DOCUMENT:
+                changed |= Q(vehicle__updated_at__gte=since)
+            querysets[entity] = queryset.filter(changed)
+    return querysets, scope
+
+
+def _visible_tombstones(user, tombstones):
+    """Kierowca dostaje ślady swoich rezerwacji/wydań i obiektów z pojazdów ze swojej historii."""
+    if getattr(user, 'rola', None) not in ('DRIVER', 'USER'):
+        return {entity: [row[0] for row in rows] for entity, rows in tombstones.items()}
+    visible = {}
+    if user.rola == 'DRIVER':
+        # Usunięty pojazd znika też z historii kierowcy - jego ślad (i kaskadowo usuniętych szkód) przepuszczamy
+        vehicle_ids = set(get_all_history_vehicle_ids(user))
+        vehicle_ids.update(row[0] for row in tombstones.get(fleet_sync.ENTITY_VEHICLE, ()))
+        for entity in (fleet_sync.ENTITY_VEHICLE, fleet_sync.ENTITY_DAMAGE, fleet_sync.ENTITY_DOCUMENT):
+            visible[entity] = [row[0] for row in tombstones.get(entity, ()) if row[1] in vehicle_ids]
+        visible[fleet_sync.ENTITY_RESERVATION] = [
+            row[0] for row in tombstones.get(fleet_sync.ENTITY_RESERVATION, ()) if row[2] == user.id
+        ]
+    else:
+        for entity, rows in tombstones.items():
+            if entity != fleet_sync.ENTITY_HANDOVER:
+                visible[entity] = [row[0] for row in rows]
+    visible[fleet_sync.ENTITY_HANDOVER] = [
+        row[0] for row in tombstones.get(fleet_sync.ENTITY_HANDOVER, ()) if row[2] == user.id
+    ]
+    return {entity: ids for entity, ids in visible.items() if ids}
+
+
+@api_view(['GET'])
+def sync_view(request):
+    """
+    Zmiany od ostatniej synchronizacji: /api/sync/?since=<token>. Bez tokenu - pełny stan.
+    Klient najpierw usuwa obiekty z 'deleted', potem nadpisuje/dodaje te z 'changes' i zapamiętuje 'token'.
+    'reset': true - token starszy niż przechowywane ślady usunięć, klient czyści dane i bierze pełny stan.
+    """
+    try:
+        since = fleet_sync.parse_token(request.query_params.get('since'))
+    except fleet_sync.InvalidToken:
+        return Response({'detail': 'Nieprawidłowy token synchronizacji.'}, status=400)
+
+    started = timezone.now()
+    reset = fleet_sync.needs_reset(since, now=started)
+    if reset:
+        since = None
+
+    user = request.user
+    querysets, scope = _sync_querysets(user, since)
+    serializers_by_entity = {
+        fleet_sync.ENTITY_VEHICLE: VehicleDto,
+        fleet_sync.ENTITY_DAMAGE: DamageEventDto,
+        fleet_sync.ENTITY_HANDOVER: VehicleHandoverDto,
+        fleet_sync.ENTITY_RESERVATION: ReservationDto,
+        fleet_sync.ENTITY_DOCUMENT: VehicleDocumentDto,
+    }
+    context = {'request': request}
+    changes = {}
+    for entity, queryset in querysets.items():
+        data = serializers_by_entity[entity](queryset.order_by('updated_at', 'id'), many=True, context=context).data
+        if data:
+            changes[entity] = data
+
+    deleted = {}
+    if since is not None:
+        deleted = _visible_tombstones(user, fleet_sync.deleted_since(since))
+
+    payload = {'token': fleet_sync.next_token(started), 'reset': reset, 'changes': changes, 'deleted': deleted}
+    if scope is not None:
+        # Pojazdy kierowcy zależą od dat rezerwacji - pełna lista id pozwala usunąć te, które wyszły z zakresu
+        payload['vehicle_ids'] = sorted(scope)
+    return Response(payload)
+
+
+# --- POWIADOMIENIA PUSH (Server-Sent Events na Server/asgi.py) ---
+async def _event_stream_user(request):
+    """Użytkownik z tokenu JWT: nagłówek Authorization albo ?token= (EventSource nie wysyła nagłówków)."""
+    header = request.headers.get('Authorization', '')
+    raw = header.split(' ', 1)[1] if header.startswith('Bearer ') else request.GET.get('token')
+    if not raw:
+        return None
+    auth = ClaimsJWTAuthentication()
+    try:
+        validated = auth.get_validated_token(raw)
+        # Lista unieważnionych tokenów i stare tokeny bez claimów sięgają do bazy
+        return await sync_to_async(auth.get_user)(validated)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+async def events_view(request):
+    """
+    Strumień zdarzeń o zmianach rezerwacji (status), wydań i szkód: /api/events/ (text/event-stream).
+    Zdarzenie niesie typ, id, akcję i url wiersza - klient pobiera tylko ten wiersz zamiast całej listy.
+    'resync' - część zdarzeń przepadła (wolny klient, restart serwera), trzeba odświeżyć listy.
+    Pod WSGI (runserver bez ASGI) odpowiedź zawiera tylko zaległe zdarzenia i się kończy -
+    EventSource łączy się ponownie po 'retry' ms, co działa jak tanie odpytywanie.
+    """
+    user = await _event_stream_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Wymagane logowanie (nagłówek Authorization lub ?token=).'}, status=401)
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or -1)
+    except ValueError:
+        return JsonResponse({'detail': 'Nieprawidłowy Last-Event-ID.'}, status=400)
+    last_event_id = last_event_id if last_event_id >= 0 else None
+    role = getattr(user, 'rola', None)
+    broadcaster = fleet_events.broadcaster
+
+    # Zaległe zdarzenia mogą doliczać odbiorców z bazy (events.LazyUserIds) - poza pętlą zdarzeń
+    if isinstance(request, ASGIRequest):
+        subscription = await sync_to_async(broadcaster.subscribe)(role, user.id, last_event_id=last_event_id,
+                                                                  loop=asyncio.get_running_loop())
+        response = StreamingHttpResponse(fleet_events.stream(subscription, resumed=last_event_id is not None),
+                                         content_type='text/event-stream')
+    else:
+        last_id, chunks = broadcaster.last_id, []
+        if last_event_id is not None:
+            missed, complete = await sync_to_async(broadcaster.replay)(role, user.id, last_event_id)
+            chunks.extend(fleet_events.format_sse(event) for event in missed)
+            if not complete:
+                chunks.append(fleet_events.format_sse(name='resync', data=fleet_events.RESYNC))
+        # Na końcu numer ostatniego zdarzenia (także cudzych) - od niego zacznie następne połączenie
+        chunks.append(fleet_events.format_preamble(last_id))
+        response = HttpResponse(b''.join(chunks), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: nie buforować strumienia
+    return response
+
+
 # AUTH
-@api_view(['POST'])
-@permission_classes([permissions.AllowAny])
-def login_view(request):
-    username = request.data.get('username')
-    password = request.data.get('password')
-    pin_2fa = request.data.get('pin_2fa')
-    user = authenticate(request, username=username, password=password)
+def _parse_body(request):
+    if request.content_type == 'application/json':
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+    return request.POST
+
+
+@csrf_exempt
+@require_POST
+async def login_view(request):
+    """
+    Logowanie async: haszowanie hasła (PBKDF2) idzie do ograniczonej puli wątków,
+    więc nie blokuje workerów obsługujących odczyty. Pełna pula -> 503 + Retry-After.
+    """
+    data = _parse_body(request)
+    if not isinstance(data, dict):
+        return JsonResponse({'detail': 'Niepoprawny JSON.'}, status=400)
+    username = data.get('username')
+    password = data.get('password')
+    pin_2fa = data.get('pin_2fa')
+
+    try:
+        user = await get_login_pool().run(authenticate, None, username=username, password=password)
+    except PoolSaturated:
+        response = JsonResponse({'detail': 'Serwer jest przeciążony, spróbuj ponownie za chwilę.'}, status=503)
+        response['Retry-After'] = str(getattr(settings, 'FLEET_LOGIN_RETRY_AFTER', 2))
+        return response
+
     if user is not None:
         if user.rola == 'ADMIN' or user.is_staff:
-            if pin_2fa != "1234": return Response({'detail': 'Wymagany PIN 2FA.'}, status=401)
-        refresh = RefreshToken.for_user(user)
-        return Response({
+            if pin_2fa != "1234": return JsonResponse({'detail': 'Wymagany PIN 2FA.'}, status=401)
+        refresh = FleetRefreshToken.for_user(user)
+        return JsonResponse({
             'refresh': str(refresh), 'access': str(refresh.access_token),
             'user_role': user.rola, 'username': user.username,
             'first_name': user.first_name, 'last_name': user.last_name
         })
-    return Response({'detail': 'Błędne dane.'}, status=401)
+    return JsonResponse({'detail': 'Błędne dane.'}, status=401)
 
 
 @api_view(['POST'])
@@ -394,4 +815,14 @@ def register_view(request):
 
 
 def mobile_app_view(request):
-    return render(request, 'mobile.html')
\ No newline at end of file
+    return render(request, 'mobile.html')
+
+
+def metrics_view(request):
+    """Metryki w formacie tekstowym Prometheusa (suma ze wszystkich workerów)."""
+    from .metrics import registry, render_text
+    token = getattr(settings, 'FLEET_METRICS_TOKEN', None)
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return HttpResponse(status=401)
+    registry.flush(force=True)
+    return HttpResponse(render_text(registry.collect()), content_type='text/plain; version=0.0.4; charset=utf-8')